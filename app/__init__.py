@@ -1,66 +1,130 @@
-from flask import Flask, request
+from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
-from flask_cors import CORS
 from config import Config
+from app.db_routing import RoutingSession
 import re
-import logging
-import sys
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 login_manager = LoginManager()
 
 def create_app():
     app = Flask(__name__)
     app.config.from_object(Config)
     
-    # Configure logging
-    logging.basicConfig(
-        level=app.config['LOG_LEVEL'],
-        format=app.config['LOG_FORMAT'],
-        handlers=[
-            logging.StreamHandler(sys.stdout),
-            logging.FileHandler('app.log')
-        ]
-    )
+    # Configure logging: records go through an in-memory queue, a listener thread does the I/O
+    from app.logging_setup import configure_logging
+    configure_logging(app)
     
     # Create logger for the application
     app.logger.setLevel(app.config['LOG_LEVEL'])
     app.logger.info("🚀 Flask application starting up...")
     
     # Enable CORS for React frontend
+    from flask_cors import CORS
     CORS(app, supports_credentials=True)
     app.logger.info("✅ CORS enabled for React frontend")
 
     db.init_app(app)
     app.logger.info("📊 Database initialized")
+
+    # Read-only views marked @replica_reads may read from READ_REPLICA_BINDS
+    from app.db_routing import init_db_routing
+    init_db_routing(app, db)
     
     login_manager.init_app(app)
-    login_manager.login_view = 'api.login'
+    login_manager.login_view = 'main.login'
     app.logger.info("🔐 Login manager initialized")
 
+    from app.cache import cache
+    cache.init_app(app)
+    app.logger.info(f"🗄️ Result cache initialized ({app.config['CACHE_BACKEND']})")
+
+    from app.template_registry import template_registry
+    template_registry.init_app(app)
+    app.logger.info("📋 Template registry initialized")
+
+    from app.user_cache import user_cache
+    user_cache.init_app(app)
+    app.logger.info("👤 User loader cache initialized")
+
+    from app.media_cache import media_cache
+    media_cache.init_app(app)
+    app.logger.info("🖼️ Template media cache initialized")
+
     # Add custom Jinja2 filter for regex
     @app.template_filter('regex_findall')
     def regex_findall_filter(text, pattern):
         return re.findall(pattern, text)
 
+    from app.latency import format_duration
+    app.add_template_filter(format_duration, 'duration')
+
+    from app import graph_api
+    graph_api.init_app(app)
+
     from app.routes import main as main_blueprint
     app.register_blueprint(main_blueprint)
     app.logger.info("🌐 Main routes blueprint registered")
 
+    if app.config['API_ROUTES_ENABLED']:
+        from app.api_routes import api as api_blueprint
+        app.register_blueprint(api_blueprint, url_prefix='/api')
+        app.logger.info("🔌 API routes blueprint registered")
+
     from app.admin_routes import admin as admin_blueprint
     app.register_blueprint(admin_blueprint)
     app.logger.info("👑 Admin routes blueprint registered")
 
-    # Add request logging middleware
-    @app.before_request
-    def log_request_info():
-        app.logger.info(f"📥 {request.method} {request.url} - IP: {request.remote_addr}")
+    from app.commands import register_commands
+    register_commands(app)
+    app.logger.info("🛠️ CLI commands registered")
+
+    # Per-endpoint latency, SQL and Graph call metrics, served on /metrics
+    from app.metrics import init_metrics
+    init_metrics(app)
+
+    # Slow-query and N+1 detection
+    from app.query_profiler import query_profiler
+    query_profiler.init_app(app)
 
-    @app.after_request
-    def log_response_info(response):
-        app.logger.info(f"📤 Response: {response.status_code} for {request.method} {request.url}")
-        return response
+    # Sampled, structured access log (one record per request)
+    from app.logging_setup import register_access_log
+    register_access_log(app)
 
     app.logger.info("✨ Flask application setup complete!")
     return app
+
+
+def create_worker_app():
+    """App for background processes (scheduler, queue consumers, `flask` cron commands).
+
+    Sets up config, logging, the database and the Graph client (with its caches) only: no blueprints, Jinja filters,
+    CORS, login or request hooks, so UI modules (forms, flask_wtf, razorpay) are never imported.
+    Run commands with it via `flask --app 'app:create_worker_app()' <command>`.
+    """
+    app = Flask(__name__)
+    app.config.from_object(Config)
+
+    from app.logging_setup import configure_logging
+    configure_logging(app)
+    app.logger.setLevel(app.config['LOG_LEVEL'])
+
+    db.init_app(app)
+
+    # Sends and status changes still invalidate cached pages when the cache is shared (redis)
+    from app.cache import cache
+    cache.init_app(app)
+
+    from app import graph_api
+    graph_api.init_app(app)
+
+    # Header image media ids, for bulk and scheduled sends run from workers
+    from app.media_cache import media_cache
+    media_cache.init_app(app)
+
+    from app.commands import register_commands
+    register_commands(app)
+
+    app.logger.info("⚙️ Worker application setup complete")
+    return app
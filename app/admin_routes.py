@@ -1,9 +1,17 @@
 import logging
-from flask import Blueprint, render_template, redirect, url_for, request, flash
-from app.models import User, Upload, SubscriptionPlan, UserSubscription, Payment, MessageHistory, Template
+from flask import Blueprint, render_template, redirect, url_for, request, flash, jsonify
+from sqlalchemy.orm import joinedload
+from app.models import User, Upload, UserSubscription, Payment, MessageHistory, Template
 from app import db
-from datetime import datetime, timedelta
-from sqlalchemy import func, and_
+from app.platform_metrics import dashboard_metrics, analytics_metrics
+from app.cache import cache
+from app.template_registry import template_registry
+from app.user_cache import user_cache
+from app.media_cache import media_cache
+from app.db_routing import replica_reads
+from app.query_profiler import query_profiler
+from app.graph_telemetry import graph_telemetry
+from app.signals import template_status_changed
 
 # Create logger for admin routes
 logger = logging.getLogger(__name__)
@@ -28,39 +36,29 @@ def admin_login():
     return render_template('admin_login.html')
 
 @admin.route('/admin/dashboard')
+@replica_reads
 def admin_dashboard():
     logger.info("👑 Admin dashboard accessed")
-    # Get key metrics for dashboard
-    total_users = User.query.count()
-    active_subscriptions = UserSubscription.query.filter_by(status='active').count()
-    total_revenue = db.session.query(func.sum(Payment.amount)).filter_by(status='completed').scalar() or 0
-    messages_sent_today = MessageHistory.query.filter(
-        MessageHistory.created_at >= datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
-    ).count()
+    # Key metrics come from the materialized platform aggregates
+    metrics = dashboard_metrics()
     
-    logger.info(f"📊 Dashboard metrics - Users: {total_users}, Active Subs: {active_subscriptions}, Revenue: ${total_revenue}, Messages Today: {messages_sent_today}")
+    logger.info(f"📊 Dashboard metrics - Users: {metrics['total_users']}, Active Subs: {metrics['active_subscriptions']}, Revenue: ${metrics['total_revenue']}, Messages Today: {metrics['messages_sent_today']}")
     
     # Recent activity
     recent_users = User.query.order_by(User.created_at.desc()).limit(5).all()
     recent_payments = Payment.query.filter_by(status='completed').order_by(Payment.created_at.desc()).limit(5).all()
     
-    # Monthly stats
-    current_month = datetime.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-    monthly_revenue = db.session.query(func.sum(Payment.amount)).filter(
-        and_(Payment.status == 'completed', Payment.created_at >= current_month)
-    ).scalar() or 0
-    
-    monthly_users = User.query.filter(User.created_at >= current_month).count()
-    
     return render_template('admin_dashboard.html', 
-                         total_users=total_users,
-                         active_subscriptions=active_subscriptions,
-                         total_revenue=total_revenue,
-                         messages_sent_today=messages_sent_today,
+                         total_users=metrics['total_users'],
+                         active_subscriptions=metrics['active_subscriptions'],
+                         total_revenue=metrics['total_revenue'],
+                         messages_sent_today=metrics['messages_sent_today'],
                          recent_users=recent_users,
                          recent_payments=recent_payments,
-                         monthly_revenue=monthly_revenue,
-                         monthly_users=monthly_users)
+                         monthly_revenue=metrics['monthly_revenue'],
+                         monthly_users=metrics['monthly_users'],
+                         unique_recipients_30d=metrics['unique_recipients_30d'],
+                         last_refreshed=metrics['last_refreshed'])
 
 @admin.route('/admin/users')
 def admin_users():
@@ -68,7 +66,8 @@ def admin_users():
     search = request.args.get('search', '')
     status_filter = request.args.get('status', '')
     
-    query = User.query
+    # Plan badges and limits come from each row's Entitlements; load subscription and plan with the page
+    query = User.query.options(joinedload(User.subscription).joinedload(UserSubscription.plan))
     
     if search:
         query = query.filter(User.email.contains(search) | User.business_name.contains(search))
@@ -145,6 +144,7 @@ def approve_template(template_id):
     template = Template.query.get_or_404(template_id)
     template.status = 'Approved'
     db.session.commit()
+    template_status_changed.send(user_id=template.user_id)
     flash(f'Template "{template.name}" approved successfully!', 'success')
     return redirect(url_for('admin.admin_templates'))
 
@@ -153,40 +153,39 @@ def reject_template(template_id):
     template = Template.query.get_or_404(template_id)
     template.status = 'Rejected'
     db.session.commit()
+    template_status_changed.send(user_id=template.user_id)
     flash(f'Template "{template.name}" rejected.', 'warning')
     return redirect(url_for('admin.admin_templates'))
 
 @admin.route('/admin/analytics')
+@replica_reads
 def admin_analytics():
-    # Revenue analytics
-    revenue_by_month = db.session.query(
-        func.date_format(Payment.created_at, '%Y-%m').label('month'),
-        func.sum(Payment.amount).label('revenue')
-    ).filter_by(status='completed').group_by('month').order_by('month').all()
-    
-    # User growth
-    user_growth = db.session.query(
-        func.date_format(User.created_at, '%Y-%m').label('month'),
-        func.count(User.id).label('users')
-    ).group_by('month').order_by('month').all()
-    
-    # Plan distribution
-    plan_distribution = db.session.query(
-        SubscriptionPlan.name,
-        func.count(UserSubscription.id).label('count')
-    ).join(UserSubscription, SubscriptionPlan.id == UserSubscription.plan_id)\
-     .filter(UserSubscription.status == 'active')\
-     .group_by(SubscriptionPlan.name).all()
-    
-    # Message volume
-    message_volume = db.session.query(
-        func.date_format(MessageHistory.created_at, '%Y-%m-%d').label('date'),
-        func.count(MessageHistory.id).label('messages')
-    ).filter(MessageHistory.created_at >= datetime.now() - timedelta(days=30))\
-     .group_by('date').order_by('date').all()
+    # Revenue, user growth, plan distribution and message volume are all materialized
+    metrics = analytics_metrics()
     
     return render_template('admin_analytics.html',
-                         revenue_by_month=revenue_by_month,
-                         user_growth=user_growth,
-                         plan_distribution=plan_distribution,
-                         message_volume=message_volume)
+                         revenue_by_month=metrics['revenue_by_month'],
+                         user_growth=metrics['user_growth'],
+                         plan_distribution=metrics['plan_distribution'],
+                         message_volume=metrics['message_volume'],
+                         last_refreshed=metrics['last_refreshed'])
+
+@admin.route('/admin/cache-stats')
+def cache_stats():
+    stats = cache.stats_dict()
+    stats['template_registry'] = template_registry.stats_dict()
+    stats['user_cache'] = user_cache.stats_dict()
+    stats['media_cache'] = media_cache.stats_dict()
+    return jsonify(stats)
+
+@admin.route('/admin/query-report')
+def query_report():
+    return jsonify(query_profiler.report())
+
+@admin.route('/admin/graph-health')
+def graph_health():
+    # Rolling 1m/5m/15m Graph API stats per endpoint and per phone number (in this process)
+    telemetry = graph_telemetry.snapshot()
+    if request.args.get('format') == 'json':
+        return jsonify(telemetry)
+    return render_template('admin_graph_health.html', telemetry=telemetry)
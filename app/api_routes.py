@@ -3,23 +3,23 @@ from flask import Blueprint, request, jsonify, session, current_app
 from flask_login import login_user, logout_user, login_required, current_user
 from werkzeug.security import generate_password_hash, check_password_hash
 from werkzeug.utils import secure_filename
-import os
 import json
-import requests
-from app import db
-from app.models import User, Upload, Template, MessageHistory
-from app.forms import RegisterForm, LoginForm, UploadForm, WhatsAppMessageForm, TemplateForm
-from app import login_manager
+from app import db, graph_api, upload_storage
+from app.models import User, Upload, Template, TemplateVersion, MessageHistory
+from app.message_columns import normalize_e164, normalize_status
+from app.rollups import record_sent, record_status_change
+from app.reach import record_recipients
+from app.latency import record_transition
+from app.cache import cache, DASHBOARD
+from app.template_registry import template_registry
+from app.signals import message_sent, message_status_changed
+from app.logging_setup import redact_headers
 
 # Create logger for API routes
 logger = logging.getLogger(__name__)
 
 api = Blueprint('api', __name__)
 
-@login_manager.user_loader
-def load_user(user_id):
-    return User.query.get(int(user_id))
-
 @api.route('/register', methods=['POST'])
 def register():
     data = request.get_json()
@@ -72,7 +72,7 @@ def dashboard():
     uploads = Upload.query.filter_by(user_id=current_user.id).all()
     docs_uploaded = len(uploads) >= 2
     
-    templates = Template.query.filter_by(user_id=current_user.id, status='Approved').all()
+    templates = template_registry.for_user(current_user.id)
     message_history = MessageHistory.query.filter_by(user_id=current_user.id).order_by(MessageHistory.created_at.desc()).limit(10).all()
     
     can_send = current_user.onboarding_status == 'Verified'
@@ -114,21 +114,27 @@ def upload_documents():
                 filename = secure_filename(file.filename)
                 filetype = 'PAN' if file_key == 'pan_file' else 'GST'
                 
-                # Save file
-                file_path = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
-                file.save(file_path)
+                # Stream into content-addressed storage (checks the file really is a PDF/PNG/JPEG)
+                try:
+                    stored = upload_storage.store(file.stream)
+                except upload_storage.InvalidUpload as e:
+                    db.session.rollback()
+                    return jsonify({'error': f'{filetype} document rejected: {e}'}), 400
                 
                 # Create upload record
                 upload = Upload(
                     filename=filename,
                     filetype=filetype,
-                    user_id=current_user.id
+                    user_id=current_user.id,
+                    sha256=stored.sha256,
+                    size=stored.size
                 )
                 db.session.add(upload)
                 uploads.append(upload)
     
     if uploads:
         db.session.commit()
+        cache.invalidate(current_user.id, DASHBOARD)
         return jsonify({'message': 'Documents uploaded successfully', 'uploads': len(uploads)})
     
     return jsonify({'error': 'No valid files uploaded'}), 400
@@ -167,7 +173,7 @@ def onboarding_callback():
         'code': code
     }
     
-    response = requests.post(token_url, data=token_data)
+    response = graph_api.post(token_url, data=token_data)
     if response.status_code != 200:
         return jsonify({'error': 'Failed to get access token'}), 400
     
@@ -178,7 +184,7 @@ def onboarding_callback():
     waba_url = "https://graph.facebook.com/v18.0/me/whatsapp_business_accounts"
     headers = {'Authorization': f'Bearer {access_token}'}
     
-    waba_response = requests.get(waba_url, headers=headers)
+    waba_response = graph_api.get(waba_url, headers=headers)
     if waba_response.status_code == 200:
         waba_data = waba_response.json()
         if waba_data.get('data'):
@@ -186,7 +192,7 @@ def onboarding_callback():
             
             # Get phone number ID
             phone_url = f"https://graph.facebook.com/v18.0/{waba_id}/phone_numbers"
-            phone_response = requests.get(phone_url, headers=headers)
+            phone_response = graph_api.get(phone_url, headers=headers)
             
             if phone_response.status_code == 200:
                 phone_data = phone_response.json()
@@ -312,8 +318,9 @@ def create_template():
         }
         
         try:
-            meta_response = requests.post(meta_url, json=meta_template_data, headers=headers)
-            print(f"Meta response: {meta_response.json()}")
+            meta_response = graph_api.post(meta_url, json=meta_template_data, headers=headers)
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Meta template response %s: %s", meta_response.status_code, meta_response.text)
             if meta_response.status_code == 200:
                 meta_data = meta_response.json()
                 template.meta_template_id = meta_data.get('id')
@@ -344,10 +351,14 @@ def send_message():
     if not template or template.user_id != current_user.id:
         return jsonify({'error': 'Template not found'}), 404
     
+    recipient = normalize_e164(data.get('recipient'))
+    if recipient is None:
+        return jsonify({'error': 'recipient must be a phone number with country code, e.g. 919876543210'}), 400
+    
     # Send message via WhatsApp API
     message_data = {
         'messaging_product': 'whatsapp',
-        'to': data['recipient'],
+        'to': recipient,
         'type': 'template',
         'template': {
             'name': template.name,
@@ -357,19 +368,18 @@ def send_message():
         }
     }
     
-    print(f"message_data :: {message_data}")
     
     url = f"https://graph.facebook.com/v18.0/{current_user.phone_number_id}/messages"
     headers = {
         'Authorization': f'Bearer {current_user.whatsapp_access_token}',
         'Content-Type': 'application/json'
     }
-    print(f"url :: {url}")
-    print(f"headers :: {headers}")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("📤 POST %s headers=%s payload=%s", url, redact_headers(headers), message_data)
     try:
-        response = requests.post(url, json=message_data, headers=headers)
-        print(f"Response status: {response.status_code}")
-        print(f"Response body: {response.text}")
+        response = graph_api.post(url, json=message_data, headers=headers)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("📥 Response %s: %s", response.status_code, response.text)
         
         if response.status_code == 200:
             result = response.json()
@@ -377,13 +387,17 @@ def send_message():
             # Save message history
             message = MessageHistory(
                 user_id=current_user.id,
-                recipient=data['recipient'],
+                recipient=recipient,
                 template_id=template.id,
+                template_version_id=TemplateVersion.id_for(template.id, template.content),
                 meta_message_id=result.get('messages', [{}])[0].get('id'),
                 status='sent'
             )
             db.session.add(message)
+            record_sent([message])
+            record_recipients([message])
             db.session.commit()
+            message_sent.send(user_id=current_user.id)
             
             return jsonify({'message': 'Message sent successfully'})
         else:
@@ -394,31 +408,26 @@ def send_message():
 
 @api.route('/webhook/meta', methods=['POST', 'GET'])
 def meta_webhook():
-    print(f"Webhook called with method: {request.method}")
-    print(f"Request args: {dict(request.args)}")
     
     # Handle webhook verification (GET request)
     if request.method == 'GET':
-        print("Handling webhook verification...")
         if request.args.get('hub.mode') == 'subscribe':
             verify_token = request.args.get('hub.verify_token')
             challenge = request.args.get('hub.challenge')
-            print(f"Verify token: {verify_token}")
-            print(f"Challenge: {challenge}")
             
             if verify_token == '12345':
-                print("Webhook verification successful")
+                logger.info("✅ Webhook verification successful")
                 return challenge
             else:
-                print("Webhook verification failed - invalid token")
+                logger.warning("❌ Webhook verification failed - invalid token")
                 return 'Forbidden', 403
         return 'OK', 200
     
     # Handle webhook data (POST request)
     if request.method == 'POST':
-        print("Handling webhook POST request...")
         data = request.get_json()
-        print(f"Webhook data received: {data}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("📨 Webhook payload: %s", data)
         
         # Handle status updates
         if data and data.get('entry'):
@@ -429,16 +438,21 @@ def meta_webhook():
                             message_id = status.get('id')
                             message_status = status.get('status')
                             
-                            print(f"Message status update: {message_id} -> {message_status}")
                             
                             # Update message history
                             message = MessageHistory.query.filter_by(meta_message_id=message_id).first()
                             if message:
+                                # Bucket and store the status the way the status_code column reads it back
+                                message_status = normalize_status(message_status)
+                                record_status_change(message, message.status, message_status)
+                                record_transition(message, message_status, status.get('timestamp'),
+                                                  change['value'].get('metadata', {}).get('phone_number_id'))
                                 message.status = message_status
                                 db.session.commit()
-                                print(f"Updated message {message_id} status to {message_status}")
+                                message_status_changed.send(user_id=message.user_id)
+                                logger.debug("Updated message %s status to %s", message_id, message_status)
                             else:
-                                print(f"Message {message_id} not found in database")
+                                logger.debug("Message %s not found in database", message_id)
         
         return jsonify({'status': 'ok'})
     
@@ -0,0 +1,343 @@
+import gzip
+import json
+import logging
+import os
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from itertools import islice
+from types import SimpleNamespace
+from flask import current_app
+from flask_sqlalchemy.pagination import Pagination
+from app import db
+from app.models import MessageHistory, Template, TemplateVersion
+from app.message_columns import render_content
+from app.partitions import drop_partitions_before, is_partitioned, month_start
+
+# Create logger for cold-storage archival
+logger = logging.getLogger(__name__)
+
+# Layout: <ARCHIVE_FOLDER>/<user_id>/<YYYY-MM>.ndjson.gz plus <user_id>/manifest.json ({month: rows}).
+# Each archival batch appends a new gzip member to the month file; gzip readers see one stream.
+# A run fetches batches in id order under one cutoff, moving last_archived_id forward, so the rows it
+# has archived are exactly those with id <= last_archived_id and created_at before that cutoff. Month
+# files are in id order too (a backdated row left behind by an earlier run lands at the end of its
+# month), and readers stream them line by line instead of loading and sorting them.
+# Before a batch touches any file, _state.json records it as `pending` with each month file's size
+# and manifest count beforehand, so a run interrupted mid-batch is rolled back and the batch redone.
+STATE_FILE = '_state.json'
+MANIFEST_FILE = 'manifest.json'
+
+ARCHIVE_COLUMNS = [
+    'id', 'user_id', 'created_at', 'recipient', 'recipient_name', 'template_id', 'template_name',
+    'message_type', 'status', 'meta_message_id', 'message_content', 'scheduled_message_id'
+]
+
+
+def _archive_root():
+    return current_app.config['ARCHIVE_FOLDER']
+
+
+def _read_json(path, default):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return default
+
+
+def _write_json(path, data):
+    """Atomically replace a small JSON file"""
+    tmp = f"{path}.tmp"
+    with open(tmp, 'w') as f:
+        json.dump(data, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def _month_path(user_id, month):
+    return os.path.join(_archive_root(), str(user_id), f"{month}.ndjson.gz")
+
+
+def _append_month(user_id, month, records):
+    path = _month_path(user_id, month)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    payload = ''.join(json.dumps(record, ensure_ascii=False) + '\n' for record in records)
+    with open(path, 'ab') as f:
+        f.write(gzip.compress(payload.encode('utf-8')))
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def _pending_batch(root, by_partition):
+    """{'<user_id>/<month>': [file size, manifest count]} before a batch is written"""
+    manifests = {}
+    pending = {}
+    for user_id, month in by_partition:
+        path = _month_path(user_id, month)
+        manifest = manifests.setdefault(user_id, _read_json(os.path.join(root, str(user_id), MANIFEST_FILE), {}))
+        pending[f"{user_id}/{month}"] = [os.path.getsize(path) if os.path.exists(path) else 0,
+                                         manifest.get(month, 0)]
+    return pending
+
+
+def _rollback_pending(root, pending):
+    """Undo whatever part of an interrupted batch reached the month files and manifests"""
+    manifests = {}
+    for key, (size, count) in pending.items():
+        user_id, month = key.split('/')
+        path = _month_path(user_id, month)
+        if size:
+            os.truncate(path, size)
+        elif os.path.exists(path):
+            os.remove(path)
+        manifest = manifests.setdefault(user_id, _read_json(os.path.join(root, user_id, MANIFEST_FILE), {}))
+        if count:
+            manifest[month] = count
+        else:
+            manifest.pop(month, None)
+    for user_id, manifest in manifests.items():
+        _write_json(os.path.join(root, user_id, MANIFEST_FILE), manifest)
+    logger.warning(f"🧊 Rolled back an interrupted archive batch ({len(pending)} month files)")
+
+
+def _fetch_batch(cutoff, after_id, batch_size):
+    """The next rows to archive as ARCHIVE_COLUMNS tuples; archives keep the rendered message text"""
+    rows = db.session.query(
+        MessageHistory.id, MessageHistory.user_id, MessageHistory.created_at, MessageHistory.recipient,
+        MessageHistory.recipient_name, MessageHistory.template_id, Template.name,
+        MessageHistory.message_type, MessageHistory.status, MessageHistory.meta_message_id,
+        TemplateVersion.content, MessageHistory.params, MessageHistory.scheduled_message_id
+    ).outerjoin(Template, Template.id == MessageHistory.template_id)\
+     .outerjoin(TemplateVersion, TemplateVersion.id == MessageHistory.template_version_id)\
+     .filter(MessageHistory.created_at < cutoff, MessageHistory.id > after_id)\
+     .order_by(MessageHistory.id)\
+     .limit(batch_size).all()
+    return [tuple(row[:10]) + (render_content(row[10], row[11]), row[12]) for row in rows]
+
+
+def _delete_ids(ids):
+    MessageHistory.query.filter(MessageHistory.id.in_(ids)).delete(synchronize_session=False)
+    db.session.commit()
+    return len(ids)
+
+
+def _delete_archived(up_to_id, cutoff, batch_size):
+    """Delete rows a run archived under `cutoff` but didn't get to delete, in id-bounded chunks.
+
+    `cutoff` must be the one the run archived with: a later cutoff would also match rows with
+    lower ids that were created after it and never written out.
+    """
+    deleted = 0
+    while True:
+        ids = [row[0] for row in db.session.query(MessageHistory.id).filter(
+            MessageHistory.created_at < cutoff, MessageHistory.id <= up_to_id
+        ).order_by(MessageHistory.id).limit(batch_size).all()]
+        if not ids:
+            return deleted
+        deleted += _delete_ids(ids)
+
+
+def _drop_archived(state, batch_size, partitioned):
+    """Remove rows a run has archived: whole partitions when partitioned, id-bounded deletes otherwise"""
+    cutoff = datetime.fromisoformat(state['cutoff'])
+    dropped = drop_partitions_before(cutoff)[1] if partitioned else 0
+    # With month-aligned cutoffs nothing is left here; a cutoff from an unpartitioned run may
+    # leave part of a month, and the delete only scans that month's partition
+    return dropped + _delete_archived(state['last_archived_id'], cutoff, batch_size)
+
+
+def _archive_run(root, state_path, state, batch_size, pause, partitioned):
+    """Archive rows before state['cutoff'] past last_archived_id, then remove them; returns (archived, deleted)"""
+    cutoff = datetime.fromisoformat(state['cutoff'])
+    archived = 0
+    deleted = 0
+    if state['last_archived_id'] and not partitioned:
+        # An interrupted run may have written its last batch out without deleting it
+        deleted += _delete_archived(state['last_archived_id'], cutoff, batch_size)
+
+    while True:
+        rows = _fetch_batch(cutoff, state['last_archived_id'], batch_size)
+        if not rows:
+            break
+
+        by_partition = defaultdict(list)
+        for row in rows:
+            record = dict(zip(ARCHIVE_COLUMNS, row))
+            record['created_at'] = record['created_at'].isoformat()
+            by_partition[(record['user_id'], record['created_at'][:7])].append(record)
+
+        state['pending'] = _pending_batch(root, by_partition)
+        _write_json(state_path, state)
+
+        manifests = {}
+        for (user_id, month), records in by_partition.items():
+            _append_month(user_id, month, records)
+            manifest = manifests.setdefault(user_id, _read_json(
+                os.path.join(root, str(user_id), MANIFEST_FILE), {}))
+            manifest[month] = manifest.get(month, 0) + len(records)
+        for user_id, manifest in manifests.items():
+            _write_json(os.path.join(root, str(user_id), MANIFEST_FILE), manifest)
+
+        del state['pending']
+        state['last_archived_id'] = rows[-1][0]
+        _write_json(state_path, state)
+        archived += len(rows)
+        if not partitioned:
+            deleted += _delete_ids([row[0] for row in rows])
+        logger.info(f"🧊 Archived {archived} messages so far (up to id {state['last_archived_id']})")
+
+        if pause:
+            time.sleep(pause)
+
+    # Everything before the cutoff is archived now
+    state['complete'] = True
+    _write_json(state_path, state)
+    if partitioned:
+        deleted += _drop_archived(state, batch_size, partitioned)
+    return archived, deleted
+
+
+def archive_old_messages(older_than_days=None, batch_size=None, pause=None):
+    """Move MessageHistory rows older than the cutoff to compressed monthly files, then delete them.
+
+    Files are written and fsynced before `last_archived_id` advances, and each batch deletes exactly
+    the rows it wrote; a batch interrupted while writing is rolled back from its `pending` record and
+    written again, so an interrupted run can be re-run without losing or duplicating rows. An
+    interrupted run is finished under its own cutoff before a new one starts. On a partitioned table
+    the cutoff is rounded down to a month start and the archived months' partitions are dropped
+    instead of deleting rows, but only once the state records the run as `complete`: a run interrupted
+    part-way through a month resumes archiving rather than dropping rows it never wrote out.
+    """
+    config = current_app.config
+    older_than_days = older_than_days if older_than_days is not None else config['ARCHIVE_AFTER_DAYS']
+    batch_size = batch_size or config['ARCHIVE_BATCH_SIZE']
+    pause = config['ARCHIVE_BATCH_PAUSE'] if pause is None else pause
+    cutoff = datetime.now() - timedelta(days=older_than_days)
+    partitioned = is_partitioned()
+    if partitioned:
+        cutoff = datetime.combine(month_start(cutoff), datetime.min.time())
+
+    root = _archive_root()
+    os.makedirs(root, exist_ok=True)
+    state_path = os.path.join(root, STATE_FILE)
+    state = _read_json(state_path, {'last_archived_id': 0, 'cutoff': None})
+    if state.get('pending'):
+        _rollback_pending(root, state.pop('pending'))
+        _write_json(state_path, state)
+
+    archived = 0
+    deleted = 0
+    if state.get('cutoff') == cutoff.isoformat():
+        # Same cutoff as the last run (a partitioned table within one month): carry on past its last id
+        state['complete'] = False
+    else:
+        if state.get('cutoff') and not state.get('complete'):
+            # Finish an interrupted run first: what it archived is only known under its own cutoff
+            archived, deleted = _archive_run(root, state_path, state, batch_size, pause, partitioned)
+        elif state.get('cutoff'):
+            # Finish removing what the last run archived, if it stopped before it got there
+            deleted = _drop_archived(state, batch_size, partitioned)
+        # A new run starts from the lowest id, so rows an earlier run skipped (created_at isn't in id
+        # order) are picked up once they fall before the cutoff; everything it archived is gone by now
+        state = {'last_archived_id': 0, 'cutoff': cutoff.isoformat(), 'complete': False}
+    run_archived, run_deleted = _archive_run(root, state_path, state, batch_size, pause, partitioned)
+    archived += run_archived
+    deleted += run_deleted
+
+    logger.info(f"🧊 Archival complete: {archived} archived, {deleted} deleted (cutoff {cutoff:%Y-%m-%d})")
+    return archived, deleted
+
+
+def hot_since():
+    """First day whose rows are all still in message_history, or None if nothing was ever archived"""
+    state = _read_json(os.path.join(_archive_root(), STATE_FILE), {})
+    if not state.get('cutoff'):
+        return None
+    cutoff = datetime.fromisoformat(state['cutoff'])
+    day = cutoff.date()
+    # Rows before the cutoff's time of day are archived, so its day is only whole from midnight
+    return day if cutoff == datetime.combine(day, datetime.min.time()) else day + timedelta(days=1)
+
+
+def archived_months(user_id):
+    """{'YYYY-MM': row count} for a user's archive"""
+    return _read_json(os.path.join(_archive_root(), str(user_id), MANIFEST_FILE), {})
+
+
+def archived_count(user_id):
+    return sum(archived_months(user_id).values())
+
+
+def _iter_month(user_id, month, start=0, stop=None):
+    """A month's archived records in id order, streamed; lines outside [start, stop) aren't parsed"""
+    path = _month_path(user_id, month)
+    if not os.path.exists(path):
+        return
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        for line in islice(f, start, stop):
+            record = json.loads(line)
+            record['created_at'] = datetime.fromisoformat(record['created_at'])
+            yield record
+
+
+def iter_archived_records(user_id, start=None, end=None):
+    """Yield a user's archived messages as dicts, oldest month first, optionally limited to [start, end)"""
+    for month in sorted(archived_months(user_id)):
+        if start and month < start.strftime('%Y-%m'):
+            continue
+        if end and month > end.strftime('%Y-%m'):
+            continue
+        for record in _iter_month(user_id, month):
+            if start and record['created_at'] < start:
+                continue
+            if end and record['created_at'] >= end:
+                continue
+            yield record
+
+
+def _archived_page(user_id, offset, limit):
+    """`limit` archived messages newest-first after skipping `offset`.
+
+    The manifest's counts skip whole months, and within a month only the lines that make up the
+    page are parsed, so memory stays at one page however large the month is.
+    """
+    items = []
+    for month, count in sorted(archived_months(user_id).items(), reverse=True):
+        if offset >= count:
+            offset -= count
+            continue
+        # Newest-first positions [offset, offset + wanted) are these lines of the id-ordered file
+        wanted = limit - len(items)
+        stop = count - offset
+        chunk = list(_iter_month(user_id, month, max(0, stop - wanted), stop))
+        items.extend(SimpleNamespace(**record) for record in reversed(chunk))
+        offset = 0
+        if len(items) >= limit:
+            break
+    return items
+
+
+class HistoryPagination(Pagination):
+    """Paginates a user's hot MessageHistory newest-first, then continues into the archive"""
+
+    def _hot_total(self):
+        if not hasattr(self, '_hot_count'):
+            self._hot_count = self._query_args['query'].order_by(None).count()
+        return self._hot_count
+
+    def _query_items(self):
+        query = self._query_args['query']
+        offset = self._query_offset
+        hot_total = self._hot_total()
+        items = []
+        if offset < hot_total:
+            items = query.limit(self.per_page).offset(offset).all()
+        if len(items) < self.per_page:
+            archive_offset = max(0, offset - hot_total)
+            items += _archived_page(self._query_args['user_id'], archive_offset, self.per_page - len(items))
+        return items
+
+    def _query_count(self):
+        return self._hot_total() + archived_count(self._query_args['user_id'])
@@ -0,0 +1,190 @@
+import logging
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from types import SimpleNamespace
+from sqlalchemy import inspect
+from app.signals import message_sent, message_status_changed
+
+# Create logger for the result cache
+logger = logging.getLogger(__name__)
+
+# Cached result names dropped for a tenant when each event fires (approved templates live in
+# app/template_registry.py and are invalidated by template_status_changed)
+DASHBOARD = 'dashboard'
+ANALYTICS = 'analytics'
+INBOX = 'inbox'
+
+EVENT_INVALIDATIONS = {
+    message_sent: (DASHBOARD, ANALYTICS, INBOX),
+    message_status_changed: (DASHBOARD, ANALYTICS, INBOX),
+}
+
+
+def snapshot(row):
+    """Plain copy of a model row's mapped columns (by attribute name), safe to keep after its session is gone"""
+    return SimpleNamespace(**{attr.key: getattr(row, attr.key) for attr in inspect(row).mapper.column_attrs})
+
+
+class CacheStats:
+    """Thread-safe hit/miss counters"""
+
+    FIELDS = ('hits', 'misses', 'sets', 'evictions', 'expirations', 'invalidations')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = dict.fromkeys(self.FIELDS, 0)
+
+    def incr(self, field, amount=1):
+        with self._lock:
+            self._counts[field] += amount
+
+    def as_dict(self):
+        with self._lock:
+            counts = dict(self._counts)
+        lookups = counts['hits'] + counts['misses']
+        counts['hit_rate'] = round(counts['hits'] / lookups, 4) if lookups else 0.0
+        return counts
+
+
+class LocalBackend:
+    """In-process LRU dict with per-entry expiry"""
+
+    def __init__(self, stats, max_entries=10000):
+        self.stats = stats
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return False, None
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                self.stats.incr('expirations')
+                return False, None
+            self._entries.move_to_end(key)
+            return True, value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats.incr('evictions')
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def size(self):
+        return len(self._entries)
+
+
+class RedisBackend:
+    """Shared backend for multi-process deployments; LRU comes from Redis' maxmemory-policy allkeys-lru"""
+
+    def __init__(self, stats, url):
+        import redis  # Optional dependency, only needed when CACHE_BACKEND = 'redis'
+        self.stats = stats
+        self._client = redis.Redis.from_url(url)
+
+    def get(self, key):
+        raw = self._client.get(key)
+        if raw is None:
+            return False, None
+        return True, pickle.loads(raw)
+
+    def set(self, key, value, ttl):
+        self._client.set(key, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL), ex=max(1, int(ttl)))
+
+    def delete(self, *keys):
+        if keys:
+            self._client.delete(*keys)
+
+    def size(self):
+        return self._client.dbsize()
+
+
+class ResultCache:
+    """Per-tenant cache of computed view results, invalidated by app.signals events"""
+
+    def __init__(self, app=None):
+        self.stats = CacheStats()
+        self.backend = LocalBackend(self.stats)
+        self.default_ttl = 60
+        self._connected = False
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.default_ttl = app.config.get('CACHE_DEFAULT_TTL', 60)
+        if app.config.get('CACHE_BACKEND', 'local') == 'redis':
+            self.backend = RedisBackend(self.stats, app.config['CACHE_REDIS_URL'])
+        else:
+            self.backend = LocalBackend(self.stats, app.config.get('CACHE_MAX_ENTRIES', 10000))
+        if not self._connected:
+            for signal, names in EVENT_INVALIDATIONS.items():
+                signal.connect(self._invalidator(names), weak=False)
+            self._connected = True
+        app.extensions['result_cache'] = self
+
+    @staticmethod
+    def key(user_id, name):
+        return f"tenant:{user_id}:{name}"
+
+    def get_or_load(self, user_id, name, loader, ttl=None):
+        """Return the cached result for this tenant, computing it with `loader()` on a miss"""
+        key = self.key(user_id, name)
+        try:
+            found, value = self.backend.get(key)
+        except Exception as e:
+            logger.warning(f"⚠️ Cache read failed for {key}: {e}")
+            return loader()
+        if found:
+            self.stats.incr('hits')
+            return value
+        self.stats.incr('misses')
+        value = loader()
+        try:
+            self.backend.set(key, value, ttl or self.default_ttl)
+            self.stats.incr('sets')
+        except Exception as e:
+            logger.warning(f"⚠️ Cache write failed for {key}: {e}")
+        return value
+
+    def invalidate(self, user_id, *names):
+        try:
+            self.backend.delete(*(self.key(user_id, name) for name in names))
+            self.stats.incr('invalidations', len(names))
+        except Exception as e:
+            logger.warning(f"⚠️ Cache invalidation failed for user {user_id}: {e}")
+
+    def _invalidator(self, names):
+        def receiver(sender, user_id=None, **extra):
+            if user_id is not None:
+                self.invalidate(user_id, *names)
+        return receiver
+
+    def stats_dict(self):
+        stats = self.stats.as_dict()
+        stats['backend'] = type(self.backend).__name__
+        try:
+            stats['entries'] = self.backend.size()
+        except Exception:
+            stats['entries'] = None
+        return stats
+
+
+cache = ResultCache()
+
@@ -0,0 +1,124 @@
+import logging
+import click
+
+# Create logger for CLI commands
+logger = logging.getLogger(__name__)
+
+
+def register_commands(app):
+    """Attach maintenance commands to `flask <command>`"""
+
+    @app.cli.command('backfill-rollups')
+    @click.option('--user-id', type=int, default=None, help='Only rebuild this user\'s rollup')
+    @click.option('--since', type=click.DateTime(formats=['%Y-%m-%d']), default=None,
+                  help='Only rebuild days from this date on')
+    def backfill_rollups(user_id, since):
+        """Rebuild daily_message_stats from MessageHistory"""
+        from app.rollups import backfill
+        written = backfill(user_id=user_id, since=since.date() if since else None)
+        click.echo(f"Backfilled {written} daily_message_stats rows")
+
+    @app.cli.command('refresh-platform-metrics')
+    @click.option('--full', is_flag=True, help='Recompute every month and day instead of only recent ones')
+    def refresh_platform_metrics(full):
+        """Refresh the materialized admin aggregates (run from cron every few minutes)"""
+        from app.platform_metrics import refresh
+        refreshed_at = refresh(full=full)
+        click.echo(f"Platform metrics refreshed at {refreshed_at:%Y-%m-%d %H:%M:%S}")
+
+    @app.cli.command('archive-messages')
+    @click.option('--older-than-days', type=int, default=None, help='Defaults to ARCHIVE_AFTER_DAYS')
+    @click.option('--batch-size', type=int, default=None, help='Defaults to ARCHIVE_BATCH_SIZE')
+    def archive_messages(older_than_days, batch_size):
+        """Move old MessageHistory rows into compressed monthly archive files"""
+        from app.archive import archive_old_messages
+        archived, deleted = archive_old_messages(older_than_days=older_than_days, batch_size=batch_size)
+        click.echo(f"Archived {archived} messages, deleted {deleted} rows from message_history")
+
+    @app.cli.command('message-partitions')
+    @click.option('--ahead', type=int, default=None, help='Months to create ahead; defaults to MESSAGE_PARTITIONS_AHEAD')
+    def message_partitions(ahead):
+        """Create upcoming monthly message_history partitions and list them (run from cron monthly)"""
+        from app.partitions import ensure_partitions, partitions, PartitioningUnsupported
+        try:
+            created = ensure_partitions(months_ahead=ahead)
+        except PartitioningUnsupported as e:
+            raise click.ClickException(str(e))
+        click.echo(f"Created {len(created)} partitions: {', '.join(created) or '-'}")
+        for name, rows in partitions():
+            click.echo(f"  {name:<8} ~{rows} rows")
+
+    @app.cli.command('partition-message-history')
+    @click.option('--chunk-size', type=int, default=None, help='Rows per copy chunk; defaults to PARTITION_MIGRATION_CHUNK_SIZE')
+    @click.option('--pause', type=float, default=None, help='Seconds between chunks; defaults to PARTITION_MIGRATION_PAUSE')
+    @click.option('--start-id', type=int, default=0, help='Resume copying after this id')
+    @click.option('--no-swap', is_flag=True, help='Copy only; leave the RENAME for a later run')
+    def partition_message_history(chunk_size, pause, start_id, no_swap):
+        """Rebuild message_history as a monthly-partitioned table online (one-off migration)"""
+        from app.partitions import migrate_to_partitions, PartitioningUnsupported
+        try:
+            copied = migrate_to_partitions(chunk_size=chunk_size, pause=pause, start_id=start_id, swap=not no_swap)
+        except PartitioningUnsupported as e:
+            raise click.ClickException(str(e))
+        click.echo(f"Copied {copied} rows{'' if no_swap else '; message_history is now partitioned'}")
+
+    @app.cli.command('compact-message-history')
+    @click.option('--chunk-size', type=int, default=None, help='Rows per backfill chunk; defaults to HISTORY_COMPACTION_CHUNK_SIZE')
+    @click.option('--pause', type=float, default=None, help='Seconds between chunks; defaults to HISTORY_COMPACTION_PAUSE')
+    @click.option('--start-id', type=int, default=0, help='Resume the backfill after this id')
+    @click.option('--drop-legacy', is_flag=True, help='Then drop recipient, status and message_content')
+    def compact_message_history(chunk_size, pause, start_id, drop_legacy):
+        """Move message_history to the compact columns (one-off migration, safe to re-run)"""
+        from app.history_compaction import (add_compact_columns, backfill_compact_columns,
+                                            drop_legacy_columns, table_size)
+        before = table_size()
+        added = add_compact_columns()
+        click.echo(f"Added columns: {', '.join(added) or '-'}")
+        rows, invalid = backfill_compact_columns(chunk_size=chunk_size, pause=pause, start_id=start_id)
+        click.echo(f"Backfilled {rows} rows" + (f" ({invalid} with an invalid recipient, stored as 0)" if invalid else ''))
+        if drop_legacy:
+            try:
+                dropped = drop_legacy_columns()
+            except RuntimeError as e:
+                raise click.ClickException(str(e))
+            click.echo(f"Dropped columns: {', '.join(dropped) or '-'}")
+        after = table_size()
+        if before and after:
+            click.echo(f"message_history: data {before[0]:,} -> {after[0]:,} bytes, "
+                       f"indexes {before[1]:,} -> {after[1]:,} bytes")
+
+    @app.cli.command('sweep-subscriptions')
+    @click.option('--batch-size', type=int, default=None, help='Defaults to SUBSCRIPTION_SWEEP_BATCH_SIZE')
+    def sweep_subscriptions(batch_size):
+        """Expire due subscriptions and reset monthly message counters (run from cron hourly)"""
+        from app.subscription_sweeper import sweep
+        result = sweep(batch_size=batch_size)
+        click.echo(f"Expired {result['expired']} subscriptions ({result['downgraded']} users downgraded), "
+                   f"reset {result['reset']} monthly counters")
+
+    @app.cli.command('sync-templates')
+    @click.option('--user-id', type=int, default=None, help='Only sync this user\'s WABA')
+    @click.option('--workers', type=int, default=None, help='Defaults to TEMPLATE_SYNC_WORKERS')
+    def sync_templates(user_id, workers):
+        """Reconcile template status with Meta (catches missed template webhooks)"""
+        from app.template_sync import sync_templates
+        result = sync_templates(user_id=user_id, workers=workers)
+        click.echo(f"Template sync: {result}")
+
+    @app.cli.command('refresh-template-media')
+    def refresh_template_media():
+        """Upload IMAGE template headers that are missing or close to expiry (run from cron daily)"""
+        from app.media_cache import media_cache
+        checked, uploaded = media_cache.refresh_due()
+        click.echo(f"Template media: {checked} header images checked, {uploaded} uploaded")
+
+    @app.cli.command('migrate-uploads')
+    def migrate_uploads():
+        """Move documents saved flat in UPLOAD_FOLDER into content-addressed storage"""
+        from app import db
+        from app.models import Upload
+        from app.upload_storage import migrate_legacy
+        moved, missing = migrate_legacy(Upload.query.filter(Upload.sha256.is_(None)).all())
+        db.session.commit()
+        click.echo(f"Migrated {moved} uploads ({missing} files missing or invalid); "
+                   f"the flat files are left in place for you to remove")
@@ -0,0 +1,95 @@
+import logging
+import random
+import time
+from functools import wraps
+from flask import current_app, g, has_request_context, session as http_session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+
+# Create logger for read-replica routing
+logger = logging.getLogger(__name__)
+
+# Browser-session key holding when the user's read-your-writes window ends (epoch seconds)
+READ_YOUR_WRITES_KEY = '_primary_until'
+
+
+def replica_reads(view):
+    """Let a read-only view's SELECTs go to a read replica (see RoutingSession)"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        g.replica_reads = True
+        return view(*args, **kwargs)
+    return wrapper
+
+
+def _replica_engine():
+    """The replica engine for this request, picked once so a page reads from a single replica"""
+    engine = g.get('replica_engine')
+    if engine is None:
+        engines = current_app.extensions.get('read_replicas')
+        if not engines:
+            return None
+        engine = g.replica_engine = random.choice(engines)
+    return engine
+
+
+class RoutingSession(Session):
+    """db.session class that sends SELECTs from @replica_reads views to a read replica.
+
+    Everything else stays on the primary: writes and flushes, and every statement outside a
+    marked view. Once this session has written, so do the view's later reads. So does the
+    user's next READ_YOUR_WRITES_SECONDS of requests after a commit, which stops them seeing
+    replica lag on their own changes.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if (bind is None and not self._flushing and getattr(clause, 'is_select', False)
+                and has_request_context() and g.get('replica_reads')
+                and not self.info.get('wrote') and not _within_read_your_writes()):
+            engine = _replica_engine()
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def _within_read_your_writes():
+    return http_session.get(READ_YOUR_WRITES_KEY, 0) > time.time()
+
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _after_flush(session, flush_context):
+    session.info['wrote'] = True
+
+
+@event.listens_for(RoutingSession, 'do_orm_execute')
+def _on_execute(state):
+    # Bulk UPDATE/INSERT/DELETE through session.execute() never flush
+    if state.is_update or state.is_delete or state.is_insert:
+        state.session.info['wrote'] = True
+
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _after_commit(session):
+    # Only logged-in users get the window; webhook and anonymous commits don't need a cookie
+    if session.info.pop('wrote', False) and has_request_context() and '_user_id' in http_session:
+        window = current_app.config.get('READ_YOUR_WRITES_SECONDS', 10)
+        if window:
+            http_session[READ_YOUR_WRITES_KEY] = time.time() + window
+
+
+@event.listens_for(RoutingSession, 'after_rollback')
+def _after_rollback(session):
+    session.info.pop('wrote', None)
+
+
+def init_db_routing(app, db):
+    """Collect the READ_REPLICA_BINDS engines (call after db.init_app)"""
+    with app.app_context():
+        engines = db.engines
+        missing = [name for name in app.config.get('READ_REPLICA_BINDS', ()) if name not in engines]
+        if missing:
+            raise RuntimeError(f"READ_REPLICA_BINDS names binds missing from SQLALCHEMY_BINDS: {missing}")
+        replicas = [engines[name] for name in app.config.get('READ_REPLICA_BINDS', ())]
+    app.extensions['read_replicas'] = replicas
+    if replicas:
+        logger.info(f"📚 Read replicas enabled: {', '.join(app.config['READ_REPLICA_BINDS'])}")
@@ -0,0 +1,20 @@
+from app import db
+
+
+def insert_missing(table, rows):
+    """INSERT ... that skips rows whose primary key already exists.
+
+    For read-modify-write rows (sketches): insert an empty row if needed, then SELECT ... FOR UPDATE,
+    which always finds a row to lock, so two first writers can't both INSERT the same key.
+    """
+    dialect = db.engine.dialect.name
+    if dialect == 'mysql':
+        from sqlalchemy.dialects.mysql import insert
+        stmt = insert(table).values(rows)
+        key = table.primary_key.columns.values()[0].name
+        return stmt.on_duplicate_key_update({key: stmt.inserted[key]})
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(table).values(rows).on_conflict_do_nothing()
@@ -0,0 +1,87 @@
+import json
+import logging
+from datetime import datetime
+from functools import lru_cache
+from flask import current_app, has_app_context
+
+# Create logger for subscription entitlements
+logger = logging.getLogger(__name__)
+
+DEFAULT_FREE_MESSAGE_LIMIT = 100
+
+
+@lru_cache(maxsize=256)
+def parse_features(features):
+    """SubscriptionPlan.features JSON (a list of names, or {name: enabled}) as a frozenset of names"""
+    if not features:
+        return frozenset()
+    try:
+        value = json.loads(features)
+    except ValueError:
+        logger.warning(f"⚠️ Plan features are not valid JSON: {features[:100]!r}")
+        return frozenset()
+    if isinstance(value, dict):
+        return frozenset(name for name, enabled in value.items() if enabled)
+    if isinstance(value, list):
+        return frozenset(str(name) for name in value)
+    return frozenset()
+
+
+class Entitlements:
+    """What a user's subscription allows, read from the user, subscription and plan rows once.
+
+    Built from the rows the user loader already joins and cached with them (see UserCache), so plan
+    checks never lazy-load or parse. Expiry is checked against `expires_at` at use time, so a
+    snapshot taken before the end date stops granting the plan once it passes. Subscription writes
+    drop the snapshot along with the cached user.
+    """
+
+    __slots__ = ('plan_id', 'plan_name', 'price', 'status', 'expires_at', 'features',
+                 'user_limit', 'free_limit', 'subscribed')
+
+    def __init__(self, plan_id=None, plan_name=None, price=0, status=None, expires_at=None,
+                 features=frozenset(), user_limit=0, free_limit=DEFAULT_FREE_MESSAGE_LIMIT, subscribed=False):
+        self.plan_id = plan_id
+        self.plan_name = plan_name
+        self.price = price
+        self.status = status
+        self.expires_at = expires_at
+        self.features = features
+        self.user_limit = user_limit
+        self.free_limit = free_limit
+        self.subscribed = subscribed
+
+    @classmethod
+    def for_user(cls, user):
+        free_limit = DEFAULT_FREE_MESSAGE_LIMIT
+        if has_app_context():
+            free_limit = current_app.config.get('FREE_MESSAGE_LIMIT', DEFAULT_FREE_MESSAGE_LIMIT)
+        user_limit = user.message_limit or 0
+        subscription = user.subscription
+        plan = subscription.plan if subscription else None
+        if plan is None:
+            return cls(user_limit=user_limit, free_limit=free_limit, subscribed=subscription is not None)
+        return cls(plan_id=plan.id, plan_name=plan.name, price=plan.price, status=subscription.status,
+                   expires_at=subscription.end_date, features=parse_features(plan.features),
+                   user_limit=user_limit, free_limit=free_limit, subscribed=True)
+
+    @property
+    def active(self):
+        """An active plan whose end date hasn't passed"""
+        return (self.plan_id is not None and self.status == 'active'
+                and self.expires_at is not None and self.expires_at > datetime.now())
+
+    @property
+    def premium(self):
+        return self.active and self.plan_name != 'Free'
+
+    @property
+    def message_limit(self):
+        """Monthly message limit: the user's own while the plan is active (or they never had one),
+        capped at FREE_MESSAGE_LIMIT once their subscription has lapsed"""
+        if self.subscribed and not self.active:
+            return min(self.user_limit, self.free_limit)
+        return self.user_limit
+
+    def has_feature(self, name):
+        return self.active and name in self.features
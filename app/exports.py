@@ -0,0 +1,112 @@
+import csv
+import io
+import json
+import zlib
+from app import db
+from app.models import MessageHistory, Template, TemplateVersion
+from app.message_columns import render_content
+from app.archive import iter_archived_records
+
+# Rows fetched per round trip from the server-side cursor
+EXPORT_BATCH_SIZE = 1000
+
+EXPORT_COLUMNS = [
+    'id', 'created_at', 'recipient', 'recipient_name', 'template_id', 'template_name',
+    'message_type', 'status', 'meta_message_id', 'message_content'
+]
+
+CONTENT_TYPES = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+def iter_history_rows(user_id):
+    """Yield a user's MessageHistory joined with template name as tuples, archived rows first,
+    then the live table via a server-side cursor"""
+    for record in iter_archived_records(user_id):
+        yield tuple(record[column] for column in EXPORT_COLUMNS)
+
+    query = db.session.query(
+        MessageHistory.id,
+        MessageHistory.created_at,
+        MessageHistory.recipient,
+        MessageHistory.recipient_name,
+        MessageHistory.template_id,
+        Template.name,
+        MessageHistory.message_type,
+        MessageHistory.status,
+        MessageHistory.meta_message_id,
+        TemplateVersion.content,
+        MessageHistory.params
+    ).outerjoin(Template, Template.id == MessageHistory.template_id)\
+     .outerjoin(TemplateVersion, TemplateVersion.id == MessageHistory.template_version_id)\
+     .filter(MessageHistory.user_id == user_id)\
+     .order_by(MessageHistory.id)\
+     .yield_per(EXPORT_BATCH_SIZE)
+    for row in query:
+        yield tuple(row[:-2]) + (render_content(row[-2], row[-1]),)
+
+
+# Spreadsheet apps run a cell starting with one of these as a formula
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+def _csv_cell(value):
+    """A value as written to the CSV; user-supplied text that would run as a formula is quoted with '"""
+    if value is None:
+        return ''
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def csv_chunks(rows):
+    """Encode rows as CSV, one chunk per batch so the response never buffers the whole file"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    pending = 0
+    for row in rows:
+        writer.writerow([_csv_cell(value) for value in row])
+        pending += 1
+        if pending >= EXPORT_BATCH_SIZE:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+    yield buffer.getvalue().encode('utf-8')
+
+
+def ndjson_chunks(rows):
+    """Encode rows as newline-delimited JSON objects"""
+    lines = []
+    for row in rows:
+        record = dict(zip(EXPORT_COLUMNS, row))
+        if record['created_at'] is not None:
+            record['created_at'] = record['created_at'].isoformat()
+        lines.append(json.dumps(record, ensure_ascii=False))
+        if len(lines) >= EXPORT_BATCH_SIZE:
+            yield ('\n'.join(lines) + '\n').encode('utf-8')
+            lines = []
+    if lines:
+        yield ('\n'.join(lines) + '\n').encode('utf-8')
+
+
+def gzip_chunks(chunks, level=6):
+    """Compress a chunk stream into a single gzip member on the fly"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def export_chunks(user_id, fmt, gzip=False):
+    """Byte chunks of a user's message history export in `fmt` ('csv' or 'ndjson')"""
+    encoder = csv_chunks if fmt == 'csv' else ndjson_chunks
+    chunks = encoder(iter_history_rows(user_id))
+    return gzip_chunks(chunks) if gzip else chunks
@@ -1,7 +1,16 @@
 from flask_wtf import FlaskForm
 from wtforms import StringField, PasswordField, SubmitField, FileField, TextAreaField, SelectField
-from wtforms.validators import DataRequired, Email, Length
+from wtforms.validators import DataRequired, Email, Length, ValidationError
 from flask_wtf.file import FileAllowed
+from app.message_columns import normalize_e164
+
+E164_MESSAGE = 'Enter the number with country code, e.g. 919876543210'
+
+
+def e164_number(form, field):
+    """Country code and number; spaces, dashes, dots, brackets and a leading '+' are dropped when stored"""
+    if normalize_e164(field.data) is None:
+        raise ValidationError(E164_MESSAGE)
 
 class RegisterForm(FlaskForm):
     business_name = StringField('Business Name', validators=[DataRequired(), Length(min=2, max=200)])
@@ -21,7 +30,7 @@ class UploadForm(FlaskForm):
     submit = SubmitField('Upload')
 
 class WhatsAppMessageForm(FlaskForm):
-    recipient = StringField('Phone Number (with country code)', validators=[DataRequired()])
+    recipient = StringField('Phone Number (with country code)', validators=[DataRequired(), e164_number])
     template = SelectField('Template', choices=[], validators=[DataRequired()])
     language = StringField('Language Code', default='en_US')  # Not shown in UI, set by template
     submit = SubmitField('Send Message')
@@ -34,7 +43,7 @@ class BulkMessageForm(FlaskForm):
     submit = SubmitField('Send to All')
 
 class ScheduleMessageForm(FlaskForm):
-    recipient = StringField('Phone Number (with country code)', validators=[DataRequired()])
+    recipient = StringField('Phone Number (with country code)', validators=[DataRequired(), e164_number])
     template = SelectField('Template', choices=[], validators=[DataRequired()])
     scheduled_date = StringField('Date', validators=[DataRequired()], render_kw={"type": "date"})
     scheduled_time = StringField('Time', validators=[DataRequired()], render_kw={"type": "time"})
@@ -0,0 +1,78 @@
+import logging
+import time
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+from app.metrics import record_graph_call
+from app.graph_telemetry import graph_telemetry, OK
+
+# Create logger for Meta Graph API calls
+logger = logging.getLogger(__name__)
+
+GRAPH_HOST = 'https://graph.facebook.com'
+
+# One pooled session per process, so repeated sends reuse TLS connections to graph.facebook.com
+_session = requests.Session()
+_session.mount('https://', HTTPAdapter(pool_connections=4, pool_maxsize=32))
+_session.mount('http://', HTTPAdapter(pool_connections=4, pool_maxsize=32))
+
+# Where calls actually go; GRAPH_API_HOST points this at a fake Graph server for benchmarks
+_host = GRAPH_HOST
+
+
+def init_app(app):
+    global _host
+    _host = app.config.get('GRAPH_API_HOST') or GRAPH_HOST
+    if _host != GRAPH_HOST:
+        logger.warning(f"⚠️ Graph API calls are going to {_host}, not {GRAPH_HOST}")
+
+
+def _path_parts(url):
+    parts = [part for part in urlsplit(url).path.split('/') if part]
+    if parts and parts[0].startswith('v') and parts[0][1:].replace('.', '').isdigit():
+        parts = parts[1:]
+    return parts
+
+
+def graph_endpoint(url):
+    """Low-cardinality label for a Graph URL: the edge name, with version and object ids dropped"""
+    parts = _path_parts(url)
+    if parts[:1] == ['oauth']:
+        return '/'.join(parts)
+    return parts[-1] if len(parts) > 1 else 'node'
+
+
+def graph_object_id(url):
+    """The node an edge hangs off (the phone_number_id for /messages, the WABA for templates)"""
+    parts = _path_parts(url)
+    return parts[-2] if len(parts) > 1 and parts[0] != 'oauth' else None
+
+
+def request(method, url, session=None, **kwargs):
+    """requests.request() against the Graph API, timed and counted in app.metrics"""
+    if _host != GRAPH_HOST and url.startswith(GRAPH_HOST):
+        url = _host + url[len(GRAPH_HOST):]
+    started = time.perf_counter()
+    response = None
+    try:
+        response = (session or _session).request(method, url, **kwargs)
+        return response
+    finally:
+        elapsed = time.perf_counter() - started
+        endpoint = graph_endpoint(url)
+        object_id = graph_object_id(url)
+        outcome, code, subcode = graph_telemetry.record(endpoint, object_id, response, elapsed)
+        record_graph_call(endpoint, method, response.status_code if response is not None else 'error',
+                          elapsed, outcome, code, subcode)
+        if outcome != OK:
+            logger.warning('⚠️ Graph %s %s on %s (%s): status=%s code=%s subcode=%s in %.0fms',
+                           method, endpoint, object_id, outcome,
+                           response.status_code if response is not None else None, code, subcode, elapsed * 1000)
+
+
+def get(url, **kwargs):
+    return request('GET', url, **kwargs)
+
+
+def post(url, **kwargs):
+    return request('POST', url, **kwargs)
@@ -0,0 +1,176 @@
+import threading
+import time
+from collections import OrderedDict
+
+# Graph error codes that mean "slow down" rather than "this request is wrong"
+THROTTLE_CODES = {4, 17, 32, 613, 80007, 130429, 131048, 131056}
+
+OK = 'ok'
+THROTTLED = 'throttled'
+CLIENT_ERROR = 'client_error'
+SERVER_ERROR = 'server_error'
+NETWORK_ERROR = 'network_error'
+OUTCOMES = (OK, THROTTLED, CLIENT_ERROR, SERVER_ERROR, NETWORK_ERROR)
+
+BUCKET_SECONDS = 10
+WINDOWS = (('1m', 60), ('5m', 300), ('15m', 900))
+
+
+def classify(response):
+    """(outcome, Graph error code, error subcode) for a response, or a failed request if None"""
+    if response is None:
+        return NETWORK_ERROR, None, None
+    status = response.status_code
+    if status < 400:
+        return OK, None, None
+    code = subcode = None
+    try:
+        error = response.json().get('error') or {}
+        code = error.get('code')
+        subcode = error.get('error_subcode')
+    except (ValueError, AttributeError):
+        pass
+    if status == 429 or code in THROTTLE_CODES:
+        return THROTTLED, code, subcode
+    return (SERVER_ERROR if status >= 500 else CLIENT_ERROR), code, subcode
+
+
+class _Bucket:
+    __slots__ = ('start', 'calls', 'outcomes', 'errors', 'latency_sum', 'latency_max')
+
+    def __init__(self, start):
+        self.start = start
+        self.calls = 0
+        self.outcomes = dict.fromkeys(OUTCOMES, 0)
+        self.errors = {}
+        self.latency_sum = 0.0
+        self.latency_max = 0.0
+
+
+class RollingWindow:
+    """Per-series counts in BUCKET_SECONDS buckets covering the longest window; older buckets drop off"""
+
+    __slots__ = ('buckets', 'updated')
+
+    def __init__(self):
+        self.buckets = []
+        self.updated = 0.0
+
+    def add(self, now, outcome, error_key, elapsed):
+        start = int(now) - int(now) % BUCKET_SECONDS
+        if not self.buckets or self.buckets[-1].start != start:
+            self.buckets.append(_Bucket(start))
+            horizon = start - WINDOWS[-1][1]
+            while self.buckets[0].start <= horizon:
+                self.buckets.pop(0)
+        bucket = self.buckets[-1]
+        bucket.calls += 1
+        bucket.outcomes[outcome] += 1
+        if error_key is not None:
+            bucket.errors[error_key] = bucket.errors.get(error_key, 0) + 1
+        bucket.latency_sum += elapsed
+        if elapsed > bucket.latency_max:
+            bucket.latency_max = elapsed
+        self.updated = now
+
+    def summary(self, now, seconds):
+        since = now - seconds
+        calls = 0
+        outcomes = dict.fromkeys(OUTCOMES, 0)
+        errors = {}
+        latency_sum = latency_max = 0.0
+        for bucket in self.buckets:
+            if bucket.start + BUCKET_SECONDS <= since:
+                continue
+            calls += bucket.calls
+            for outcome, count in bucket.outcomes.items():
+                outcomes[outcome] += count
+            for key, count in bucket.errors.items():
+                errors[key] = errors.get(key, 0) + count
+            latency_sum += bucket.latency_sum
+            latency_max = max(latency_max, bucket.latency_max)
+        return {
+            'calls': calls,
+            'per_second': round(calls / seconds, 2),
+            'error_rate': round((calls - outcomes[OK]) / calls, 4) if calls else 0.0,
+            'outcomes': outcomes,
+            'errors': [{'code': code, 'subcode': subcode, 'count': count}
+                       for (code, subcode), count in sorted(errors.items(), key=lambda item: -item[1])],
+            'avg_latency': round(latency_sum / calls, 4) if calls else None,
+            'max_latency': round(latency_max, 4) if calls else None,
+        }
+
+
+class GraphTelemetry:
+    """Rolling per-endpoint and per-phone-number view of Graph API health.
+
+    Phone numbers come from the URL (`/{phone_number_id}/messages`); other edges are tracked per
+    endpoint only. At most max_series phone numbers are kept, least recently used dropped first.
+    """
+
+    def __init__(self, max_series=5000):
+        self.max_series = max_series
+        self._endpoints = {}
+        self._phones = OrderedDict()
+        self._lock = threading.Lock()
+
+    def record(self, endpoint, object_id, response, elapsed):
+        outcome, code, subcode = classify(response)
+        error_key = (code, subcode) if outcome != OK and code is not None else None
+        now = time.time()
+        with self._lock:
+            window = self._endpoints.get(endpoint)
+            if window is None:
+                window = self._endpoints[endpoint] = RollingWindow()
+            window.add(now, outcome, error_key, elapsed)
+            if endpoint == 'messages' and object_id:
+                window = self._phones.get(object_id)
+                if window is None:
+                    window = self._phones[object_id] = RollingWindow()
+                    while len(self._phones) > self.max_series:
+                        self._phones.popitem(last=False)
+                else:
+                    self._phones.move_to_end(object_id)
+                window.add(now, outcome, error_key, elapsed)
+        return outcome, code, subcode
+
+    def _summaries(self, series, now):
+        return {key: {label: window.summary(now, seconds) for label, seconds in WINDOWS}
+                for key, window in series.items()}
+
+    def snapshot(self, phone_limit=50):
+        """Windowed stats per endpoint, and for the busiest phone numbers over the last 5 minutes"""
+        now = time.time()
+        with self._lock:
+            endpoints = self._summaries(self._endpoints, now)
+            phones = self._summaries(self._phones, now)
+        busiest = sorted(phones.items(), key=lambda item: item[1]['5m']['calls'], reverse=True)[:phone_limit]
+        throttled = sorted(phone for phone, stats in phones.items() if stats['1m']['outcomes'][THROTTLED])
+        return {
+            'endpoints': dict(sorted(endpoints.items())),
+            'phone_numbers': dict(busiest),
+            'throttled_phone_numbers': throttled,
+            'tracked_phone_numbers': len(phones),
+        }
+
+    def render(self):
+        """Prometheus gauges over the last minute (per-phone series stay on the admin page)"""
+        now = time.time()
+        with self._lock:
+            endpoints = {endpoint: window.summary(now, 60) for endpoint, window in self._endpoints.items()}
+            throttled = sum(1 for window in self._phones.values() if window.summary(now, 60)['outcomes'][THROTTLED])
+        lines = ['# HELP graph_calls_per_second_1m Graph API call rate over the last minute',
+                 '# TYPE graph_calls_per_second_1m gauge']
+        lines += [f'graph_calls_per_second_1m{{graph_endpoint="{endpoint}"}} {stats["per_second"]:g}'
+                  for endpoint, stats in sorted(endpoints.items())]
+        lines += ['# HELP graph_error_rate_1m Share of Graph API calls that failed over the last minute',
+                  '# TYPE graph_error_rate_1m gauge']
+        lines += [f'graph_error_rate_1m{{graph_endpoint="{endpoint}"}} {stats["error_rate"]:g}'
+                  for endpoint, stats in sorted(endpoints.items())]
+        lines += ['# HELP graph_throttled_phone_numbers_1m Phone numbers that hit a Graph throttling error in the last minute',
+                  '# TYPE graph_throttled_phone_numbers_1m gauge',
+                  f'graph_throttled_phone_numbers_1m {throttled}']
+        return lines
+
+
+graph_telemetry = GraphTelemetry()
@@ -0,0 +1,177 @@
+import logging
+import time
+from flask import current_app
+from sqlalchemy import inspect, text
+from app import db
+from app.message_columns import STATUS_CODES, encode_params, normalize_e164
+from app.models import TemplateVersion
+from app.template_params import match_body
+
+# Create logger for the MessageHistory compaction migration
+logger = logging.getLogger(__name__)
+
+# The compact layout adds recipient_number (BIGINT), status_code (SMALLINT), template_version_id and
+# params next to the legacy recipient (VARCHAR), status (VARCHAR) and message_content (TEXT), backfills
+# them, and finally drops the legacy columns. Until then the app only reads and writes the new ones.
+TABLE = 'message_history'
+LEGACY_COLUMNS = ('recipient', 'status', 'message_content')
+NEW_COLUMNS = (
+    ('recipient_number', 'BIGINT'),
+    ('status_code', 'SMALLINT'),
+    ('template_version_id', 'INTEGER'),
+    ('params', 'TEXT'),
+)
+INVALID_RECIPIENT = 0  # recipient_number for legacy rows whose recipient isn't a phone number
+
+
+def _columns():
+    return {column['name'] for column in inspect(db.engine).get_columns(TABLE)}
+
+
+def add_compact_columns():
+    """Add the compact columns to an existing message_history; returns the columns added.
+
+    No foreign key is added for template_version_id: a partitioned message_history can't have one.
+    """
+    TemplateVersion.__table__.create(db.engine, checkfirst=True)
+    existing = _columns()
+    added = [name for name, _ in NEW_COLUMNS if name not in existing]
+    mysql = db.engine.dialect.name == 'mysql'
+    for name, sql_type in NEW_COLUMNS:
+        if name in added:
+            unsigned = ' UNSIGNED' if mysql and name == 'recipient_number' else ''
+            db.session.execute(text(f"ALTER TABLE {TABLE} ADD COLUMN {name} {sql_type}{unsigned} NULL"))
+    if mysql and 'recipient' in existing:
+        # The app stops writing the legacy column, so it must accept NULL until it is dropped
+        db.session.execute(text(f"ALTER TABLE {TABLE} MODIFY recipient VARCHAR(32) NULL"))
+    db.session.commit()
+    if added:
+        logger.info(f"🗜️ Added {', '.join(added)} to {TABLE}")
+    return added
+
+
+class _Versions:
+    """(template_version_id, params) for legacy (template_id, message_content) pairs, memoized"""
+
+    def __init__(self):
+        self.templates = {}
+        self.found = {}
+
+    def _template_content(self, template_id):
+        if template_id not in self.templates:
+            self.templates[template_id] = db.session.execute(
+                text("SELECT content FROM template WHERE id = :id"), {'id': template_id}).scalar()
+        return self.templates[template_id]
+
+    def lookup(self, template_id, content):
+        if content is None:
+            return None, None
+        key = (template_id, content)
+        if key not in self.found:
+            body = self._template_content(template_id)
+            values = match_body(body, content)
+            if values is not None:
+                # Rendered from today's template body: one shared version plus this row's values
+                version_id = TemplateVersion.id_for(template_id, body)
+                params = encode_params(values)
+            else:
+                # Sent before the template was edited: keep the text as its own version
+                version_id = TemplateVersion.id_for(template_id, content)
+                params = None
+            self.found[key] = (version_id, params)
+        return self.found[key]
+
+
+def backfill_compact_columns(chunk_size=None, pause=None, start_id=0):
+    """Fill the compact columns from the legacy ones in id chunks; returns (rows, invalid recipients).
+
+    Only rows whose recipient_number is still NULL are touched, so re-running after an interruption
+    (or after rows written by the old code during a deploy) only picks up what is left.
+    """
+    config = current_app.config
+    chunk_size = chunk_size or config['HISTORY_COMPACTION_CHUNK_SIZE']
+    pause = config['HISTORY_COMPACTION_PAUSE'] if pause is None else pause
+    if not set(LEGACY_COLUMNS) <= _columns():
+        logger.info(f"🗜️ {TABLE} has no legacy columns left to backfill from")
+        return 0, 0
+
+    versions = _Versions()
+    max_id = db.session.execute(text(f"SELECT COALESCE(MAX(id), 0) FROM {TABLE}")).scalar()
+    done = invalid = 0
+    low = start_id
+    while low < max_id:
+        high = min(low + chunk_size, max_id)
+        rows = db.session.execute(text(
+            f"SELECT id, template_id, recipient, status, message_content FROM {TABLE} "
+            f"WHERE id > :low AND id <= :high AND recipient_number IS NULL"), {'low': low, 'high': high}).all()
+        updates = []
+        for row_id, template_id, recipient, status, content in rows:
+            digits = normalize_e164(recipient)
+            if digits is None:
+                invalid += 1
+            version_id, params = versions.lookup(template_id, content)
+            updates.append({
+                'row_id': row_id,
+                'number': int(digits) if digits else INVALID_RECIPIENT,
+                'code': STATUS_CODES.get(status or 'sent', STATUS_CODES['unknown']),
+                'version_id': version_id,
+                'params': params,
+            })
+        if updates:
+            db.session.execute(text(
+                f"UPDATE {TABLE} SET recipient_number = :number, status_code = :code, "
+                f"template_version_id = :version_id, params = :params WHERE id = :row_id"), updates)
+        db.session.commit()
+        done += len(updates)
+        low = high
+        logger.info(f"🗜️ Compacted {done} rows (up to id {low} of {max_id})")
+        if pause and updates:
+            time.sleep(pause)
+    if invalid:
+        logger.warning(f"⚠️ {invalid} rows had a recipient that isn't a phone number; "
+                       f"stored as {INVALID_RECIPIENT}")
+    return done, invalid
+
+
+def drop_legacy_columns():
+    """Drop recipient, status and message_content once every row is backfilled; returns the columns dropped.
+
+    On MySQL this is one ALTER with ALGORITHM=INPLACE: the table is rebuilt without the columns,
+    which is what returns the space (an INSTANT drop would leave the old bytes in every row).
+    """
+    legacy = [name for name in LEGACY_COLUMNS if name in _columns()]
+    if not legacy:
+        return []
+    pending = db.session.execute(text(f"SELECT COUNT(*) FROM {TABLE} WHERE recipient_number IS NULL")).scalar()
+    if pending:
+        raise RuntimeError(f"{pending} message_history rows are not backfilled yet; run the backfill again first")
+
+    if db.engine.dialect.name == 'mysql':
+        drops = ', '.join(f"DROP COLUMN {name}" for name in legacy)
+        db.session.execute(text(
+            f"ALTER TABLE {TABLE} {drops}, MODIFY recipient_number BIGINT UNSIGNED NOT NULL, "
+            f"MODIFY status_code SMALLINT NOT NULL DEFAULT {STATUS_CODES['sent']}, ALGORITHM=INPLACE, LOCK=NONE"))
+    else:
+        for name in legacy:
+            db.session.execute(text(f"ALTER TABLE {TABLE} DROP COLUMN {name}"))
+    db.session.commit()
+    logger.info(f"🗜️ Dropped legacy {TABLE} columns: {', '.join(legacy)}")
+    return legacy
+
+
+def table_size():
+    """(data bytes, index bytes) of message_history, or None where the database can't tell"""
+    dialect = db.engine.dialect.name
+    if dialect == 'mysql':
+        db.session.execute(text(f"ANALYZE TABLE {TABLE}"))
+        return tuple(db.session.execute(text(
+            "SELECT DATA_LENGTH, INDEX_LENGTH FROM information_schema.TABLES "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table"), {'table': TABLE}).one())
+    if dialect == 'sqlite':
+        sizes = dict(db.session.execute(text(
+            "SELECT name, SUM(pgsize) FROM dbstat WHERE name = :table OR name IN "
+            "(SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = :table) GROUP BY name"),
+            {'table': TABLE}).all())
+        data = sizes.pop(TABLE, 0)
+        return data, sum(sizes.values())
+    return None
@@ -0,0 +1,153 @@
+import logging
+import time
+from collections import defaultdict
+from datetime import date, datetime, timedelta, timezone
+from sqlalchemy import func, select
+from app import db
+from app.db_upsert import insert_missing
+from app.models import LatencySketch, Template
+from app.sketches import LatencyHistogram
+from app.user_cache import user_cache
+
+# Create logger for delivery/read latency tracking
+logger = logging.getLogger(__name__)
+
+DELIVER = 'deliver'
+READ = 'read'
+PERCENTILES = (('p50', 0.5), ('p95', 0.95), ('p99', 0.99))
+DB_CLOCK_CHECK_SECONDS = 3600
+# Sketch rows per user/phone/template/day, so concurrent webhooks for one campaign rarely lock the same
+# row. Changing it is safe: readers merge every row of a key whatever its shard.
+LATENCY_SHARDS = 16
+
+_db_clock = {'offset': None, 'checked': 0.0}
+
+
+def _utcnow():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def _db_utc_offset():
+    """How far the database's now() is from UTC, to the nearest 15 minutes; re-read hourly for DST.
+
+    created_at is stamped by the database, whose time zone needn't be the web process's.
+    """
+    if _db_clock['offset'] is None or time.monotonic() - _db_clock['checked'] > DB_CLOCK_CHECK_SECONDS:
+        db_now = db.session.execute(select(func.now())).scalar()
+        seconds = (db_now.replace(tzinfo=None) - _utcnow()).total_seconds()
+        _db_clock['offset'] = timedelta(minutes=15 * round(seconds / 900))
+        _db_clock['checked'] = time.monotonic()
+    return _db_clock['offset']
+
+
+def _status_time(timestamp):
+    """A webhook status's unix-seconds timestamp on the database clock created_at uses; now if missing
+    or malformed"""
+    try:
+        at = datetime.fromtimestamp(int(timestamp), timezone.utc).replace(tzinfo=None)
+    except (TypeError, ValueError, OverflowError, OSError):
+        at = _utcnow()
+    return at + _db_utc_offset()
+
+
+def _add_sample(message, metric, seconds, phone_number_id):
+    """Fold one latency into this message's shard of the sketch for its user/phone/template/day"""
+    key = {
+        'user_id': message.user_id,
+        'day': message.created_at.date() if message.created_at else date.today(),
+        'template_id': message.template_id,
+        'phone_number_id': phone_number_id,
+        'metric': metric,
+        'shard': message.id % LATENCY_SHARDS,
+    }
+    query = LatencySketch.query.filter_by(**key).with_for_update()
+    row = query.first()
+    if row is None:
+        # First sample for this key: make sure a row exists (another request may be adding it) and lock that
+        db.session.execute(insert_missing(LatencySketch.__table__,
+                                          [dict(key, count=0, sketch=LatencyHistogram().to_bytes())]))
+        row = query.one()
+    histogram = LatencyHistogram.from_bytes(row.sketch)
+    histogram.add(max(0.0, seconds))
+    row.sketch = histogram.to_bytes()
+    row.count = histogram.count
+
+
+def record_transition(message, status, timestamp=None, phone_number_id=None):
+    """Stamp delivered_at/read_at from a webhook status and record the latency once per message.
+
+    Pass the webhook's metadata.phone_number_id; without it the sender's current number is read
+    from the user cache.
+    """
+    if not message.created_at:
+        return
+    at = _status_time(timestamp)
+    if status == 'delivered' and not message.delivered_at:
+        message.delivered_at = at
+        seconds = (at - message.created_at).total_seconds()
+        metric = DELIVER
+    elif status == 'read' and not message.read_at:
+        message.read_at = at
+        seconds = (at - (message.delivered_at or message.created_at)).total_seconds()
+        metric = READ
+    else:
+        return
+    if phone_number_id is None:
+        user = user_cache.load(message.user_id)
+        phone_number_id = user.phone_number_id if user else None
+    _add_sample(message, metric, seconds, phone_number_id or '')
+
+
+def _percentiles(histogram):
+    stats = {'count': histogram.count}
+    for label, q in PERCENTILES:
+        stats[label] = histogram.quantile(q)
+    return stats
+
+
+def latency_summary(user_id, days=30):
+    """p50/p95/p99 time-to-deliver and time-to-read over the last `days`, overall, per template and
+    per phone number, merged from the daily sketches without touching MessageHistory"""
+    since = date.today() - timedelta(days=days)
+    rows = LatencySketch.query.filter(LatencySketch.user_id == user_id, LatencySketch.day >= since).all()
+
+    overall = defaultdict(LatencyHistogram)
+    by_template = defaultdict(lambda: defaultdict(LatencyHistogram))
+    by_phone = defaultdict(lambda: defaultdict(LatencyHistogram))
+    for row in rows:
+        histogram = LatencyHistogram.from_bytes(row.sketch)
+        overall[row.metric].merge(histogram)
+        by_template[row.template_id][row.metric].merge(histogram)
+        by_phone[row.phone_number_id][row.metric].merge(histogram)
+
+    names = dict(db.session.query(Template.id, Template.name).filter(Template.id.in_(list(by_template))).all()) \
+        if by_template else {}
+
+    def breakdown(groups, field, label_of):
+        return sorted((
+            {field: label_of(key), DELIVER: _percentiles(metrics[DELIVER]), READ: _percentiles(metrics[READ])}
+            for key, metrics in groups.items()
+        ), key=lambda item: item[DELIVER]['count'], reverse=True)
+
+    templates = breakdown(by_template, 'name', lambda template_id: names.get(template_id, f"Template #{template_id}"))
+    phone_numbers = breakdown(by_phone, 'phone_number_id', lambda phone_number_id: phone_number_id or 'Unknown')
+
+    return {
+        DELIVER: _percentiles(overall[DELIVER]),
+        READ: _percentiles(overall[READ]),
+        'templates': templates,
+        'phone_numbers': phone_numbers,
+    }
+
+
+def format_duration(seconds):
+    """Human-friendly latency for templates: 850ms, 4.2s, 3m 10s, 2h 5m"""
+    if seconds is None:
+        return '—'
+    if seconds < 1:
+        return f"{seconds * 1000:.0f}ms"
+    if seconds < 60:
+        return f"{seconds:.1f}s"
+    if seconds < 3600:
+        return f"{int(seconds // 60)}m {int(seconds % 60)}s"
+    return f"{int(seconds // 3600)}h {int(seconds % 3600 // 60)}m"
@@ -0,0 +1,128 @@
+import atexit
+import json
+import logging
+import queue
+import random
+import sys
+import time
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from flask import g, request
+
+# Create logger for request access logs
+access_logger = logging.getLogger('app.access')
+
+# LogRecord attributes that are not user-supplied `extra` fields
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'taskName'}
+
+_listener = None
+
+
+def redact(value, keep=4):
+    """Mask a secret for debug output, keeping only the last few characters"""
+    if not value:
+        return value
+    value = str(value)
+    return f"***{value[-keep:]}" if len(value) > keep * 2 else '***'
+
+
+def redact_headers(headers):
+    return {name: redact(value) if name.lower() == 'authorization' else value for name, value in headers.items()}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line; `extra={...}` fields become top-level keys"""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class LazyQueueHandler(QueueHandler):
+    """QueueHandler that leaves %-formatting to the listener thread.
+
+    The stock handler renders the message on the calling (request) thread before enqueueing. Here
+    only tracebacks are rendered eagerly (they can't outlive the frame); msg and args travel as-is,
+    so call sites should pass immutable args, as the logging module already expects.
+    """
+
+    def prepare(self, record):
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def configure_logging(app):
+    """Route all logging through one in-memory queue drained by a background listener thread"""
+    global _listener
+    if _listener is not None:
+        return
+
+    if app.config.get('LOG_JSON'):
+        formatter = JsonFormatter()
+    else:
+        formatter = logging.Formatter(app.config['LOG_FORMAT'])
+    handlers = [logging.StreamHandler(sys.stdout)]
+    if app.config.get('LOG_FILE'):
+        handlers.append(logging.FileHandler(app.config['LOG_FILE']))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue = queue.SimpleQueue()
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(LazyQueueHandler(log_queue))
+    root.setLevel(app.config['LOG_LEVEL'])
+
+    _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+
+
+def stop_logging():
+    """Flush whatever is still queued and stop the listener thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def register_access_log(app):
+    """One structured record per request, sampled per endpoint; errors and slow requests always log"""
+    default_rate = app.config.get('ACCESS_LOG_SAMPLE_RATE', 1.0)
+    rates = app.config.get('ACCESS_LOG_SAMPLING', {})
+    slow_ms = app.config.get('ACCESS_LOG_SLOW_MS', 1000)
+
+    @app.before_request
+    def start_timer():
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def log_access(response):
+        started = g.get('request_started')
+        duration_ms = (time.perf_counter() - started) * 1000 if started else 0.0
+        if response.status_code < 400 and duration_ms < slow_ms:
+            rate = rates.get(request.endpoint, default_rate)
+            if rate <= 0 or (rate < 1 and random.random() >= rate):
+                return response
+        if access_logger.isEnabledFor(logging.INFO):
+            access_logger.info('%s %s %s %.1fms', request.method, request.path, response.status_code, duration_ms,
+                               extra={'method': request.method, 'path': request.path,
+                                      'endpoint': request.endpoint, 'status': response.status_code,
+                                      'duration_ms': round(duration_ms, 1), 'ip': request.remote_addr,
+                                      'sql_queries': g.get('sql_queries', 0), 'graph_calls': g.get('graph_calls', 0)})
+        return response
@@ -0,0 +1,186 @@
+import hashlib
+import logging
+import threading
+from datetime import datetime, timedelta
+from urllib.parse import urlsplit
+import requests
+from app import db, graph_api
+from app.cache import CacheStats, LocalBackend
+from app.models import MediaAsset, Template, User
+from app.upload_storage import sniff
+
+# Create logger for the template media cache
+logger = logging.getLogger(__name__)
+
+MEDIA_URL = 'https://graph.facebook.com/v19.0/{phone_number_id}/media'
+MIME_TYPES = {'png': 'image/png', 'jpg': 'image/jpeg'}
+
+
+class MediaUploadError(Exception):
+    """The header image could not be downloaded or Meta refused the upload"""
+
+
+class MediaStats(CacheStats):
+    FIELDS = CacheStats.FIELDS + ('uploads', 'upload_failures')
+
+
+class MediaCache:
+    """Media ids for IMAGE-header templates, uploaded once per phone number and source URL.
+
+    Meta keeps uploaded media for MEDIA_TTL_DAYS. An id is re-uploaded once it is within
+    MEDIA_REFRESH_BEFORE_HOURS of expiring, either on the next send that needs it or by
+    `flask refresh-template-media`. Ids live in media_assets so every process shares them,
+    with a per-process copy in front.
+    """
+
+    def __init__(self, app=None):
+        self.stats = MediaStats()
+        self.backend = LocalBackend(self.stats)
+        self.ttl = timedelta(days=30)
+        self.refresh_before = timedelta(days=3)
+        self.max_bytes = 5 * 1024 * 1024
+        self.timeout = 30
+        self._locks = {}
+        self._locks_lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.ttl = timedelta(days=app.config.get('MEDIA_TTL_DAYS', 30))
+        self.refresh_before = timedelta(hours=app.config.get('MEDIA_REFRESH_BEFORE_HOURS', 72))
+        self.max_bytes = app.config.get('MEDIA_MAX_BYTES', 5 * 1024 * 1024)
+        self.timeout = app.config.get('MEDIA_UPLOAD_TIMEOUT', 30)
+        self.backend = LocalBackend(self.stats, app.config.get('MEDIA_CACHE_MAX_ENTRIES', 10000))
+        app.extensions['media_cache'] = self
+
+    def _due_at(self, expires_at):
+        return expires_at - self.refresh_before
+
+    def _lock_for(self, key):
+        with self._locks_lock:
+            return self._locks.setdefault(key, threading.Lock())
+
+    def _remember(self, key, media_id, expires_at):
+        seconds = (self._due_at(expires_at) - datetime.utcnow()).total_seconds()
+        if seconds > 0:
+            self.backend.set(key, media_id, seconds)
+            self.stats.incr('sets')
+
+    def media_id(self, phone_number_id, token, url):
+        """Media id for `url` on this phone number, uploading it when missing or close to expiry.
+
+        Returns None if there is no usable id (upload failed and nothing unexpired is stored).
+        Commits the session when it records a new upload.
+        """
+        key = (phone_number_id, url)
+        found, media_id = self.backend.get(key)
+        if found:
+            self.stats.incr('hits')
+            return media_id
+        self.stats.incr('misses')
+
+        # One upload per key at a time in this process; concurrent bulk sends wait for it
+        with self._lock_for(key):
+            found, media_id = self.backend.get(key)
+            if found:
+                return media_id
+            url_hash = hashlib.sha256(url.encode('utf-8')).hexdigest()
+            asset = db.session.get(MediaAsset, (phone_number_id, url_hash))
+            now = datetime.utcnow()
+            if asset and self._due_at(asset.expires_at) > now:
+                self._remember(key, asset.media_id, asset.expires_at)
+                return asset.media_id
+
+            try:
+                media_id, mime_type = self._upload(phone_number_id, token, url)
+            except MediaUploadError as e:
+                self.stats.incr('upload_failures')
+                logger.warning(f"⚠️ Media upload for {phone_number_id} failed ({url}): {e}")
+                if asset and asset.expires_at > now:
+                    return asset.media_id  # still valid, try again on a later send
+                return None
+
+            if asset is None:
+                asset = MediaAsset(phone_number_id=phone_number_id, url_hash=url_hash, source_url=url[:255])
+                db.session.add(asset)
+            asset.media_id = media_id
+            asset.mime_type = mime_type
+            asset.uploaded_at = now
+            asset.expires_at = now + self.ttl
+            db.session.commit()
+            self.stats.incr('uploads')
+            self._remember(key, media_id, asset.expires_at)
+            logger.info(f"🖼️ Header image uploaded for {phone_number_id}: media {media_id}, "
+                        f"expires {asset.expires_at:%Y-%m-%d}")
+            return media_id
+
+    def _download(self, url):
+        try:
+            with requests.get(url, stream=True, timeout=self.timeout) as response:
+                if response.status_code != 200:
+                    raise MediaUploadError(f"download returned {response.status_code}")
+                chunks, size = [], 0
+                for chunk in response.iter_content(64 * 1024):
+                    size += len(chunk)
+                    if size > self.max_bytes:
+                        raise MediaUploadError(f"image is larger than {self.max_bytes} bytes")
+                    chunks.append(chunk)
+        except requests.RequestException as e:
+            raise MediaUploadError(f"download failed: {e}") from e
+        content = b''.join(chunks)
+        kind = sniff(content[:16])
+        if kind not in MIME_TYPES:
+            raise MediaUploadError('not a PNG or JPEG image')
+        return content, MIME_TYPES[kind]
+
+    def _upload(self, phone_number_id, token, url):
+        content, mime_type = self._download(url)
+        filename = urlsplit(url).path.rsplit('/', 1)[-1] or 'header'
+        try:
+            response = graph_api.post(
+                MEDIA_URL.format(phone_number_id=phone_number_id),
+                headers={'Authorization': f'Bearer {token}'},
+                data={'messaging_product': 'whatsapp', 'type': mime_type},
+                files={'file': (filename, content, mime_type)},
+                timeout=self.timeout,
+            )
+        except requests.RequestException as e:
+            raise MediaUploadError(f"upload failed: {e}") from e
+        if response.status_code != 200:
+            raise MediaUploadError(f"Graph returned {response.status_code}: {response.text[:200]}")
+        media_id = response.json().get('id')
+        if not media_id:
+            raise MediaUploadError('Graph response has no media id')
+        return media_id, mime_type
+
+    def header_component(self, template, phone_number_id, token):
+        """Graph `header` component for an IMAGE-header template, or None for other templates.
+
+        Falls back to the image link (Meta fetches it per message) when no media id is available.
+        """
+        if getattr(template, 'header_type', None) != 'IMAGE' or not template.header_image_url:
+            return None
+        media_id = self.media_id(phone_number_id, token, template.header_image_url)
+        image = {'id': media_id} if media_id else {'link': template.header_image_url}
+        return {'type': 'header', 'parameters': [{'type': 'image', 'image': image}]}
+
+    def refresh_due(self):
+        """Upload every approved IMAGE header that is missing or due for refresh; returns (checked, uploaded)"""
+        rows = db.session.query(User.phone_number_id, User.whatsapp_access_token, Template.header_image_url)\
+            .join(Template, Template.user_id == User.id)\
+            .filter(Template.status == 'Approved', Template.header_type == 'IMAGE',
+                    Template.header_image_url.isnot(None), User.phone_number_id.isnot(None),
+                    User.whatsapp_access_token.isnot(None))\
+            .distinct().all()
+        before = self.stats.as_dict()['uploads']
+        for phone_number_id, token, url in rows:
+            self.media_id(phone_number_id, token, url)
+        return len(rows), self.stats.as_dict()['uploads'] - before
+
+    def stats_dict(self):
+        stats = self.stats.as_dict()
+        stats['entries'] = self.backend.size()
+        return stats
+
+
+media_cache = MediaCache()
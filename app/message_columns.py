@@ -0,0 +1,72 @@
+import json
+import re
+from sqlalchemy import BigInteger, SmallInteger
+from sqlalchemy.types import TypeDecorator
+from app.template_params import render_body
+
+# message_history.status_code values, by position. Append only: rows store the index.
+# Webhook statuses outside this list are stored as 'unknown'.
+MESSAGE_STATUSES = ('unknown', 'sent', 'delivered', 'read', 'failed', 'deleted', 'warning', 'played')
+STATUS_CODES = {status: code for code, status in enumerate(MESSAGE_STATUSES)}
+
+_E164 = re.compile(r'[1-9]\d{6,14}')
+_SEPARATORS = re.compile(r'[\s()+.-]')
+
+
+def normalize_e164(value):
+    """Digits of a phone number in E.164 (country code first, no '+'), or None if it isn't one"""
+    if value is None:
+        return None
+    digits = _SEPARATORS.sub('', str(value))
+    return digits if _E164.fullmatch(digits) else None
+
+
+def normalize_status(value):
+    """A webhook status as MessageHistory stores it: itself if in MESSAGE_STATUSES, else 'unknown'"""
+    return value if value in STATUS_CODES else 'unknown'
+
+
+class E164Number(TypeDecorator):
+    """A phone number kept as an 8-byte integer instead of a VARCHAR; Python sees the digit string.
+
+    Values that aren't E.164 bind as NULL, so a lookup by a malformed number matches nothing.
+    """
+    impl = BigInteger
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        digits = normalize_e164(value)
+        return int(digits) if digits else None
+
+    def process_result_value(self, value, dialect):
+        return None if value is None else str(value)
+
+
+class MessageStatus(TypeDecorator):
+    """A message status kept as a small int code from MESSAGE_STATUSES; Python sees the name"""
+    impl = SmallInteger
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        return STATUS_CODES[normalize_status(value)]
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        return MESSAGE_STATUSES[value] if 0 <= value < len(MESSAGE_STATUSES) else 'unknown'
+
+
+def encode_params(values):
+    """Compact JSON for a message's body parameter values, or None when there are none"""
+    if not values:
+        return None
+    return json.dumps(list(values), ensure_ascii=False, separators=(',', ':'))
+
+
+def render_content(content, params):
+    """The text a message carried, from its template version's body and its encoded parameters"""
+    if content is None:
+        return None
+    return render_body(content, json.loads(params) if params else ())
@@ -0,0 +1,193 @@
+import bisect
+import logging
+import threading
+import time
+from flask import Response, abort, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from app.graph_telemetry import graph_telemetry
+
+# Create logger for request metrics
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 250)
+
+
+class Histogram:
+    """Fixed-bucket histogram per label set, rendered as Prometheus cumulative buckets.
+
+    observe() is a bisect and three additions under one lock, cheap enough to leave on for every
+    request.
+    """
+
+    def __init__(self, name, help_text, label_names, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {labels: (list(counts), total, count) for labels, (counts, total, count) in self._series.items()}
+        for labels, (counts, total, count) in sorted(series.items()):
+            base = _labels(self.label_names, labels)
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f'{self.name}_bucket{{{base}{"," if base else ""}le="{bound:g}"}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{{base}{"," if base else ""}le="+Inf"}} {count}')
+            lines.append(f"{self.name}_sum{{{base}}} {total:.6f}")
+            lines.append(f"{self.name}_count{{{base}}} {count}")
+        return lines
+
+
+class Counter:
+    """Monotonic counter per label set"""
+
+    def __init__(self, name, help_text, label_names):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = dict(self._values)
+        for labels, value in sorted(values.items()):
+            lines.append(f"{self.name}{{{_labels(self.label_names, labels)}}} {value:g}")
+        return lines
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values):
+    return ','.join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+
+
+REQUEST_LATENCY = Histogram('http_request_duration_seconds', 'Request latency by endpoint',
+                            ('endpoint', 'method'), LATENCY_BUCKETS)
+REQUESTS = Counter('http_requests_total', 'Requests by endpoint and status', ('endpoint', 'method', 'status'))
+REQUEST_QUERIES = Histogram('http_request_sql_queries', 'SQL statements per request',
+                            ('endpoint',), QUERY_COUNT_BUCKETS)
+SQL_QUERIES = Counter('sql_queries_total', 'SQL statements executed, by request endpoint', ('endpoint',))
+SQL_SECONDS = Counter('sql_seconds_total', 'Time spent in SQL statements, by request endpoint', ('endpoint',))
+GRAPH_LATENCY = Histogram('graph_request_duration_seconds', 'Meta Graph API call latency',
+                          ('graph_endpoint', 'method'), LATENCY_BUCKETS)
+GRAPH_CALLS = Counter('graph_requests_total', 'Meta Graph API calls by outcome',
+                      ('graph_endpoint', 'method', 'status'))
+GRAPH_ERRORS = Counter('graph_errors_total', 'Failed Graph API calls by classification and Graph error code',
+                       ('graph_endpoint', 'outcome', 'code', 'subcode'))
+REQUEST_GRAPH_CALLS = Counter('http_request_graph_calls_total', 'Graph API calls made while serving requests',
+                              ('endpoint',))
+REQUEST_GRAPH_SECONDS = Counter('http_request_graph_seconds_total', 'Time spent waiting on the Graph API, by endpoint',
+                                ('endpoint',))
+
+REGISTRY = [REQUEST_LATENCY, REQUESTS, REQUEST_QUERIES, SQL_QUERIES, SQL_SECONDS,
+            GRAPH_LATENCY, GRAPH_CALLS, GRAPH_ERRORS, REQUEST_GRAPH_CALLS, REQUEST_GRAPH_SECONDS,
+            graph_telemetry]
+
+
+def _endpoint():
+    return (request.endpoint or 'unmatched') if has_request_context() else 'background'
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info['query_started'] = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info.pop('query_started', time.perf_counter())
+    if has_request_context():
+        g.sql_queries = g.get('sql_queries', 0) + 1
+        g.sql_seconds = g.get('sql_seconds', 0.0) + elapsed
+    else:
+        SQL_QUERIES.inc(('background',))
+        SQL_SECONDS.inc(('background',), elapsed)
+
+
+def record_graph_call(graph_endpoint, method, status, elapsed, outcome='ok', code=None, subcode=None):
+    """Called by app.graph_api for every outbound Graph request"""
+    GRAPH_LATENCY.observe((graph_endpoint, method), elapsed)
+    GRAPH_CALLS.inc((graph_endpoint, method, str(status)))
+    if outcome != 'ok':
+        GRAPH_ERRORS.inc((graph_endpoint, outcome, str(code or ''), str(subcode or '')))
+    if has_request_context():
+        g.graph_calls = g.get('graph_calls', 0) + 1
+        g.graph_seconds = g.get('graph_seconds', 0.0) + elapsed
+
+
+def render_metrics():
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+def init_metrics(app):
+    """Time every request, count its SQL through engine events, and serve /metrics"""
+    graph_telemetry.max_series = app.config.get('GRAPH_TELEMETRY_MAX_PHONE_NUMBERS', 5000)
+    if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+
+    @app.before_request
+    def start_metrics_timer():
+        g.metrics_started = time.perf_counter()
+
+    @app.after_request
+    def record_request_metrics(response):
+        _record(response.status_code)
+        return response
+
+    @app.teardown_request
+    def record_failed_request(exc):
+        if exc is not None:
+            _record(500)
+
+    def _record(status):
+        started = g.pop('metrics_started', None)
+        if started is None:
+            return
+        endpoint = _endpoint()
+        REQUEST_LATENCY.observe((endpoint, request.method), time.perf_counter() - started)
+        REQUESTS.inc((endpoint, request.method, str(status)))
+        queries = g.get('sql_queries', 0)
+        REQUEST_QUERIES.observe((endpoint,), queries)
+        if queries:
+            SQL_QUERIES.inc((endpoint,), queries)
+            SQL_SECONDS.inc((endpoint,), g.get('sql_seconds', 0.0))
+        graph_calls = g.get('graph_calls', 0)
+        if graph_calls:
+            REQUEST_GRAPH_CALLS.inc((endpoint,), graph_calls)
+            REQUEST_GRAPH_SECONDS.inc((endpoint,), g.get('graph_seconds', 0.0))
+
+    token = app.config.get('METRICS_TOKEN')
+
+    def metrics():
+        if token and request.headers.get('Authorization') != f'Bearer {token}':
+            abort(403)
+        return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
+
+    app.add_url_rule('/metrics', 'metrics', metrics)
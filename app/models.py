@@ -1,5 +1,11 @@
+import hashlib
+from datetime import date
 from app import db
 from flask_login import UserMixin
+from sqlalchemy import update
+from sqlalchemy.orm import validates
+from app.entitlements import Entitlements
+from app.message_columns import E164Number, MessageStatus, normalize_e164, render_content
 
 class SubscriptionPlan(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -29,6 +35,9 @@ class Payment(db.Model):
 
 
 class UserSubscription(db.Model):
+    # The expiry sweep finds due rows by (status, end_date); see app/subscription_sweeper.py
+    __table_args__ = (db.Index('ix_user_subscription_status_end_date', 'status', 'end_date'),)
+
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     plan_id = db.Column(db.Integer, db.ForeignKey('subscription_plan.id'), nullable=False)
@@ -56,31 +65,55 @@ class User(db.Model, UserMixin):
     is_verified = db.Column(db.Boolean, default=False)  # Document verification status
     message_limit = db.Column(db.Integer, default=100)  # Monthly message limit (reduced for free tier)
     messages_sent_this_month = db.Column(db.Integer, default=0)
+    # Month the counter was last reset; indexed for the sweep's "anyone not reset yet?" probe
+    quota_period = db.Column(db.Date, default=lambda: date.today().replace(day=1), index=True)
     subscription_id = db.Column(db.Integer, db.ForeignKey('user_subscription.id'))
     created_at = db.Column(db.DateTime, server_default=db.func.now())
     uploads = db.relationship('Upload', backref='user', lazy=True)
     subscription = db.relationship('UserSubscription', backref='user', foreign_keys=[subscription_id])
     
+    @property
+    def entitlements(self):
+        """Plan, limits, expiry and features as one snapshot, built once per loaded user"""
+        snapshot = self.__dict__.get('_entitlements')
+        if snapshot is None:
+            snapshot = self._entitlements = Entitlements.for_user(self)
+        return snapshot
+    
     def can_send_message(self):
         """Check if user can send more messages this month"""
-        return self.messages_sent_this_month < self.message_limit
+        return self.messages_sent_this_month < self.entitlements.message_limit
+    
+    def add_messages_sent(self, count):
+        """Bump the monthly counter in SQL (x = x + count) so concurrent sends don't overwrite each other"""
+        self.messages_sent_this_month = User.messages_sent_this_month + count
+    
+    def reserve_messages(self, count):
+        """Take `count` messages from this month's quota before sending; False if they don't fit.
+        
+        One conditional UPDATE against the row, not the loaded (possibly cached) counter, so
+        sends from other workers count. Give back the ones that fail with add_messages_sent(-n).
+        """
+        reserved = db.session.execute(
+            update(User)
+            .where(User.id == self.id,
+                   User.messages_sent_this_month + count <= self.entitlements.message_limit)
+            .values(messages_sent_this_month=User.messages_sent_this_month + count)
+            .execution_options(synchronize_session=False)).rowcount
+        db.session.expire(self, ['messages_sent_this_month'])
+        return reserved == 1
     
     def get_remaining_messages(self):
         """Get remaining messages for this month"""
-        return max(0, self.message_limit - self.messages_sent_this_month)
+        return max(0, self.entitlements.message_limit - self.messages_sent_this_month)
     
     def get_current_plan(self):
         """Get user's current subscription plan"""
-        if self.subscription and self.subscription.status == 'active':
-            from datetime import datetime
-            if self.subscription.end_date > datetime.now():
-                return self.subscription.plan
-        return None
+        return self.subscription.plan if self.entitlements.active else None
     
     def is_premium(self):
         """Check if user has an active premium subscription"""
-        plan = self.get_current_plan()
-        return plan is not None and plan.name != 'Free'
+        return self.entitlements.premium
 
 
 class Upload(db.Model):
@@ -88,6 +121,8 @@ class Upload(db.Model):
     filename = db.Column(db.String(200), nullable=False)
     filetype = db.Column(db.String(20))  # 'PAN' or 'GST'
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    sha256 = db.Column(db.String(64), index=True)  # content address in upload_storage; NULL for legacy flat files
+    size = db.Column(db.Integer)  # bytes
 
 
 class Template(db.Model):
@@ -110,6 +145,62 @@ class Template(db.Model):
 
 
 
+class TemplateVersion(db.Model):
+    """Immutable copy of a template body as sent; MessageHistory points here instead of storing the text"""
+    __tablename__ = 'template_version'
+    __table_args__ = (db.UniqueConstraint('template_id', 'content_hash', name='uq_template_version'),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    template_id = db.Column(db.Integer, db.ForeignKey('template.id'), nullable=False)
+    content_hash = db.Column(db.String(64), nullable=False)  # sha256 of content
+    content = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, server_default=db.func.now())
+
+    @staticmethod
+    def hash_content(content):
+        return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+    # (template_id, content_hash) -> id, for versions already committed; rows never change
+    _ids = {}
+
+    @classmethod
+    def id_for(cls, template_id, content):
+        """Id of the version row for this template body, inserting it if it is new"""
+        key = (template_id, cls.hash_content(content))
+        version_id = cls._ids.get(key)
+        if version_id is not None:
+            return version_id
+        version_id = db.session.query(cls.id).filter_by(template_id=template_id, content_hash=key[1]).scalar()
+        if version_id is None:
+            version_id = cls._insert(template_id, key[1], content)
+        elif len(cls._ids) < 10000:
+            cls._ids[key] = version_id
+        return version_id
+
+    @classmethod
+    def _insert(cls, template_id, content_hash, content):
+        """INSERT this version, or find the one a concurrent request just added under
+        uq_template_version; returns its id either way"""
+        table = cls.__table__
+        row = {'template_id': template_id, 'content_hash': content_hash, 'content': content}
+        dialect = db.engine.dialect.name
+        if dialect == 'mysql':
+            from sqlalchemy.dialects.mysql import insert
+            # LAST_INSERT_ID(id) makes lastrowid the existing row's id when the key is taken
+            stmt = insert(table).values(row).on_duplicate_key_update(id=db.func.last_insert_id(table.c.id))
+            return db.session.execute(stmt).lastrowid
+        if dialect == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        stmt = insert(table).values(row)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.template_id, table.c.content_hash],
+            set_={'content_hash': stmt.excluded.content_hash}
+        )
+        return db.session.execute(stmt.returning(table.c.id)).scalar_one()
+
+
 class ScheduledMessage(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
@@ -152,20 +243,38 @@ class Contact(db.Model):
 class MessageHistory(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    recipient = db.Column(db.String(32), nullable=False)
+    recipient = db.Column('recipient_number', E164Number, nullable=False)  # E.164 digits, stored as BIGINT
     recipient_name = db.Column(db.String(100))  # Optional contact name
     template_id = db.Column(db.Integer, db.ForeignKey('template.id'), nullable=False)
-    message_content = db.Column(db.Text)  # Store the actual message content sent
+    template_version_id = db.Column(db.Integer, db.ForeignKey('template_version.id'))  # Body that was sent
+    params = db.Column(db.Text)  # JSON list of the body's {{n}} values, NULL when it has none
     message_type = db.Column(db.Enum('template', 'text', 'media'), default='template')
     meta_message_id = db.Column(db.String(128))
-    status = db.Column(db.String(32), default='sent')  # sent, delivered, read, failed, etc.
+    status = db.Column('status_code', MessageStatus, nullable=False, default='sent')  # sent, delivered, read, failed, etc.
     scheduled_message_id = db.Column(db.Integer, db.ForeignKey('scheduled_message.id'))  # Link to scheduled message if applicable
     created_at = db.Column(db.DateTime, server_default=db.func.now())
+    delivered_at = db.Column(db.DateTime)  # From the webhook 'delivered' status timestamp
+    read_at = db.Column(db.DateTime)  # From the webhook 'read' status timestamp
     
     # Relationships
     template = db.relationship('Template', backref='messages')
+    template_version = db.relationship('TemplateVersion')
     user = db.relationship('User', backref='sent_messages')
     
+    @validates('recipient')
+    def validate_recipient(self, key, value):
+        digits = normalize_e164(value)
+        if digits is None:
+            raise ValueError(f"Recipient {value!r} is not an E.164 phone number")
+        return digits
+    
+    @property
+    def message_content(self):
+        """The message text, rendered from the template version and params"""
+        if self.template_version is None:
+            return None
+        return render_content(self.template_version.content, self.params)
+    
     def get_contact(self):
         """Get or create contact for this message"""
         contact = Contact.query.filter_by(
@@ -190,3 +299,72 @@ class MessageHistory(db.Model):
             db.session.commit()
         
         return contact
+
+
+class DailyMessageStat(db.Model):
+    """Per-user daily rollup of MessageHistory, kept in step on send and on webhook status change"""
+    __tablename__ = 'daily_message_stats'
+
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    day = db.Column(db.Date, primary_key=True, index=True)
+    template_id = db.Column(db.Integer, db.ForeignKey('template.id'), primary_key=True)
+    status = db.Column(db.String(32), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+
+class PlatformMetric(db.Model):
+    """Materialized platform-wide aggregates for the admin pages, see app/platform_metrics.py"""
+    __tablename__ = 'platform_metrics'
+
+    metric = db.Column(db.String(32), primary_key=True)  # monthly_revenue, total_users, active_plan, daily_messages, ...
+    period = db.Column(db.String(64), primary_key=True)  # '2025-07', '2025-07-17', plan name or 'all'
+    value = db.Column(db.Float, nullable=False, default=0)
+    refreshed_at = db.Column(db.DateTime, nullable=False)
+
+
+class LatencySketch(db.Model):
+    """Mergeable time-to-deliver / time-to-read histogram per user, phone number, template and day,
+    kept in a few shards (by message) so a delivery burst doesn't queue webhooks on one row"""
+    __tablename__ = 'latency_sketches'
+
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    template_id = db.Column(db.Integer, db.ForeignKey('template.id'), primary_key=True)
+    phone_number_id = db.Column(db.String(64), primary_key=True, default='')
+    metric = db.Column(db.String(16), primary_key=True)  # 'deliver' or 'read'
+    shard = db.Column(db.SmallInteger, primary_key=True, autoincrement=False, default=0)  # message id % LATENCY_SHARDS
+    count = db.Column(db.Integer, nullable=False, default=0)
+    sketch = db.Column(db.LargeBinary, nullable=False)  # LatencyHistogram.to_bytes()
+
+
+class RecipientSketch(db.Model):
+    """HyperLogLog of distinct recipients per user, day and template, merged for reach over any range"""
+    __tablename__ = 'recipient_sketches'
+
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    day = db.Column(db.Date, primary_key=True, index=True)
+    template_id = db.Column(db.Integer, db.ForeignKey('template.id'), primary_key=True)
+    sketch = db.Column(db.LargeBinary, nullable=False)  # HyperLogLog.to_bytes()
+
+
+class PlatformRecipientSketch(db.Model):
+    """Platform-wide HyperLogLog of distinct recipients per day, kept in a few shards (by user) so
+    concurrent sends rarely wait on the same row; the shards of a day are merged when read"""
+    __tablename__ = 'platform_recipient_sketches'
+
+    day = db.Column(db.Date, primary_key=True)
+    shard = db.Column(db.SmallInteger, primary_key=True, autoincrement=False)  # user_id % PLATFORM_SHARDS
+    sketch = db.Column(db.LargeBinary, nullable=False)  # HyperLogLog.to_bytes()
+
+
+class MediaAsset(db.Model):
+    """A template header image uploaded to a phone number's /media edge, see app/media_cache.py"""
+    __tablename__ = 'media_assets'
+
+    phone_number_id = db.Column(db.String(64), primary_key=True)
+    url_hash = db.Column(db.String(64), primary_key=True)  # sha256 of source_url
+    source_url = db.Column(db.String(255), nullable=False)
+    media_id = db.Column(db.String(128), nullable=False)
+    mime_type = db.Column(db.String(64))
+    uploaded_at = db.Column(db.DateTime, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
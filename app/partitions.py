@@ -0,0 +1,210 @@
+import logging
+import time
+from datetime import date, datetime
+from flask import current_app
+from sqlalchemy import text
+from app import db
+
+# Create logger for MessageHistory partition management
+logger = logging.getLogger(__name__)
+
+# MySQL only. message_history is RANGE COLUMNS(created_at) partitioned, one partition per month
+# named p<YYYYMM> (rows before <YYYY-MM+1>-01) plus a pmax catch-all that should stay empty.
+# Partitioned InnoDB tables cannot have foreign keys, and every unique key must include
+# created_at, so the partitioned table's primary key is (id, created_at) and it has no FKs.
+TABLE = 'message_history'
+SHADOW_TABLE = 'message_history_partitioned'
+OLD_TABLE = 'message_history_unpartitioned'
+MAX_PARTITION = 'pmax'
+TRIGGERS = ('message_history_part_ins', 'message_history_part_upd', 'message_history_part_del')
+
+
+class PartitioningUnsupported(RuntimeError):
+    """Partition management needs MySQL"""
+
+
+def _require_mysql():
+    if db.engine.dialect.name != 'mysql':
+        raise PartitioningUnsupported(f"MessageHistory partitioning needs MySQL, not {db.engine.dialect.name}")
+
+
+def month_start(value):
+    return date(value.year, value.month, 1)
+
+
+def next_month(value):
+    return date(value.year + value.month // 12, value.month % 12 + 1, 1)
+
+
+def month_ranges(start, end):
+    """[(first day, first day of next month)] for every month from start's to end's, for range
+    predicates (`created_at >= a AND created_at < b`) that MySQL prunes to one partition"""
+    last = end.date() if isinstance(end, datetime) else end
+    ranges = []
+    month = month_start(start)
+    while month <= last:
+        ranges.append((month, next_month(month)))
+        month = next_month(month)
+    return ranges
+
+
+def partition_name(month):
+    return f"p{month:%Y%m}"
+
+
+def _partition_sql(month):
+    return f"PARTITION {partition_name(month)} VALUES LESS THAN ('{next_month(month):%Y-%m-%d}')"
+
+
+def partitions(table=TABLE):
+    """[(partition name, estimated rows)] in range order; empty when the table isn't partitioned"""
+    if db.engine.dialect.name != 'mysql':
+        return []
+    rows = db.session.execute(text(
+        "SELECT PARTITION_NAME, TABLE_ROWS FROM information_schema.PARTITIONS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table AND PARTITION_NAME IS NOT NULL "
+        "ORDER BY PARTITION_ORDINAL_POSITION"), {'table': table}).all()
+    return [(name, rows_estimate) for name, rows_estimate in rows]
+
+
+def is_partitioned():
+    return bool(partitions())
+
+
+def _month_of(name):
+    return datetime.strptime(name[1:], '%Y%m').date()
+
+
+def ensure_partitions(months_ahead=None):
+    """Create monthly partitions through the current month + months_ahead; returns names created.
+
+    New months are split off the empty pmax partition, which is a metadata-only change.
+    """
+    _require_mysql()
+    months_ahead = current_app.config['MESSAGE_PARTITIONS_AHEAD'] if months_ahead is None else months_ahead
+    existing = [name for name, _ in partitions() if name != MAX_PARTITION]
+    if not existing:
+        raise PartitioningUnsupported(f"{TABLE} is not partitioned yet; run flask partition-message-history")
+
+    target = month_start(date.today())
+    for _ in range(months_ahead):
+        target = next_month(target)
+    month = next_month(_month_of(existing[-1]))
+    new = []
+    while month <= target:
+        new.append(month)
+        month = next_month(month)
+    if new:
+        db.session.execute(text(
+            f"ALTER TABLE {TABLE} REORGANIZE PARTITION {MAX_PARTITION} INTO "
+            f"({', '.join(_partition_sql(m) for m in new)}, PARTITION {MAX_PARTITION} VALUES LESS THAN (MAXVALUE))"))
+        db.session.commit()
+        logger.info(f"🗂️ Created {TABLE} partitions: {', '.join(partition_name(m) for m in new)}")
+    return [partition_name(m) for m in new]
+
+
+def drop_partitions_before(cutoff):
+    """Drop every monthly partition that ends on or before `cutoff`; returns (names, rows dropped).
+
+    This is how retention removes old rows: one DROP PARTITION per run instead of row deletes.
+    """
+    _require_mysql()
+    expired = [name for name, _ in partitions()
+               if name != MAX_PARTITION and next_month(_month_of(name)) <= month_start(cutoff)]
+    if not expired:
+        return [], 0
+    from app.models import MessageHistory
+    rows = MessageHistory.query.filter(MessageHistory.created_at < next_month(_month_of(expired[-1]))).count()
+    db.session.execute(text(f"ALTER TABLE {TABLE} DROP PARTITION {', '.join(expired)}"))
+    db.session.commit()
+    logger.info(f"🗂️ Dropped {TABLE} partitions {', '.join(expired)} ({rows} rows)")
+    return expired, rows
+
+
+def _columns():
+    return [row[0] for row in db.session.execute(text(
+        "SELECT COLUMN_NAME FROM information_schema.COLUMNS WHERE TABLE_SCHEMA = DATABASE() "
+        "AND TABLE_NAME = :table ORDER BY ORDINAL_POSITION"), {'table': TABLE}).all()]
+
+
+def _create_shadow(first_month, months_ahead):
+    """Empty partitioned copy of message_history, plus triggers that keep it in step with live writes"""
+    months = [first_month]
+    last = month_start(date.today())
+    for _ in range(months_ahead):
+        last = next_month(last)
+    while months[-1] < last:
+        months.append(next_month(months[-1]))
+
+    columns = _columns()
+    column_list = ', '.join(columns)
+    new_values = ', '.join(f"NEW.{column}" for column in columns)
+    statements = [
+        f"CREATE TABLE {SHADOW_TABLE} LIKE {TABLE}",  # indexes, no foreign keys
+        f"ALTER TABLE {SHADOW_TABLE} MODIFY created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP, "
+        f"DROP PRIMARY KEY, ADD PRIMARY KEY (id, created_at)",
+        f"ALTER TABLE {SHADOW_TABLE} PARTITION BY RANGE COLUMNS(created_at) "
+        f"({', '.join(_partition_sql(m) for m in months)}, PARTITION {MAX_PARTITION} VALUES LESS THAN (MAXVALUE))",
+        f"CREATE TRIGGER {TRIGGERS[0]} AFTER INSERT ON {TABLE} FOR EACH ROW "
+        f"REPLACE INTO {SHADOW_TABLE} ({column_list}) VALUES ({new_values})",
+        f"CREATE TRIGGER {TRIGGERS[1]} AFTER UPDATE ON {TABLE} FOR EACH ROW "
+        f"REPLACE INTO {SHADOW_TABLE} ({column_list}) VALUES ({new_values})",
+        f"CREATE TRIGGER {TRIGGERS[2]} AFTER DELETE ON {TABLE} FOR EACH ROW "
+        f"DELETE FROM {SHADOW_TABLE} WHERE id = OLD.id",
+    ]
+    for statement in statements:
+        db.session.execute(text(statement))
+    db.session.commit()
+    return columns
+
+
+def migrate_to_partitions(chunk_size=None, pause=None, start_id=0, swap=True):
+    """Rebuild message_history as a partitioned table without blocking writes; returns rows copied.
+
+    A partitioned shadow table is created and kept current by triggers. Existing rows are copied
+    in id chunks with INSERT IGNORE, which leaves rows the triggers already wrote alone, pausing
+    between chunks. Then both tables are swapped with one atomic RENAME. The old table is kept as
+    message_history_unpartitioned. Re-running after an interruption resumes at start_id (the last
+    id it logged); rows already copied are skipped.
+    """
+    _require_mysql()
+    config = current_app.config
+    chunk_size = chunk_size or config['PARTITION_MIGRATION_CHUNK_SIZE']
+    pause = config['PARTITION_MIGRATION_PAUSE'] if pause is None else pause
+    if is_partitioned():
+        logger.info(f"🗂️ {TABLE} is already partitioned")
+        return 0
+
+    shadow_exists = db.session.execute(text(
+        "SELECT COUNT(*) FROM information_schema.TABLES WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table"),
+        {'table': SHADOW_TABLE}).scalar()
+    if shadow_exists:
+        columns = _columns()
+    else:
+        first = db.session.execute(text(f"SELECT MIN(created_at) FROM {TABLE}")).scalar() or datetime.now()
+        columns = _create_shadow(month_start(first), config['MESSAGE_PARTITIONS_AHEAD'])
+    column_list = ', '.join(columns)
+
+    # Rows above max_id are inserted after the triggers exist, so the triggers copy them
+    max_id = db.session.execute(text(f"SELECT COALESCE(MAX(id), 0) FROM {TABLE}")).scalar()
+    copied = 0
+    low = start_id
+    while low < max_id:
+        high = min(low + chunk_size, max_id)
+        result = db.session.execute(text(
+            f"INSERT IGNORE INTO {SHADOW_TABLE} ({column_list}) "
+            f"SELECT {column_list} FROM {TABLE} WHERE id > :low AND id <= :high"), {'low': low, 'high': high})
+        db.session.commit()
+        copied += max(result.rowcount, 0)
+        low = high
+        logger.info(f"🗂️ Copied {copied} rows into {SHADOW_TABLE} (up to id {low} of {max_id})")
+        if pause:
+            time.sleep(pause)
+
+    if swap:
+        db.session.execute(text(f"RENAME TABLE {TABLE} TO {OLD_TABLE}, {SHADOW_TABLE} TO {TABLE}"))
+        for trigger in TRIGGERS:
+            db.session.execute(text(f"DROP TRIGGER IF EXISTS {trigger}"))
+        db.session.commit()
+        logger.info(f"🗂️ {TABLE} is now partitioned; the old table is kept as {OLD_TABLE}")
+    return copied
@@ -0,0 +1,162 @@
+import logging
+from datetime import date, datetime, timedelta
+from sqlalchemy import func
+from app import db
+from app.models import (User, Payment, SubscriptionPlan, UserSubscription,
+                        DailyMessageStat, PlatformMetric)
+from app.reach import platform_unique_recipients, rebuild_platform_sketches
+
+# Create logger for platform metrics
+logger = logging.getLogger(__name__)
+
+MONTHLY_REVENUE = 'monthly_revenue'
+MONTHLY_USERS = 'monthly_users'
+ACTIVE_PLAN = 'active_plan'
+DAILY_MESSAGES = 'daily_messages'
+REACH = 'reach'
+TOTAL_USERS = 'total_users'
+TOTAL_REVENUE = 'total_revenue'
+TOTAL = 'all'
+
+
+def _month_start(value):
+    return datetime(value.year, value.month, 1)
+
+
+def _next_month(month_start):
+    if month_start.month == 12:
+        return month_start.replace(year=month_start.year + 1, month=1)
+    return month_start.replace(month=month_start.month + 1)
+
+
+def _month_ranges(since, until):
+    """Yield (label, start, end) for every calendar month from `since` up to `until`"""
+    start = _month_start(since)
+    while start <= until:
+        end = _next_month(start)
+        yield start.strftime('%Y-%m'), start, end
+        start = end
+
+
+def last_refreshed():
+    """When the aggregates were last rebuilt, or None if never"""
+    return db.session.query(func.max(PlatformMetric.refreshed_at)).scalar()
+
+
+def _store(metric, period, value, now):
+    db.session.merge(PlatformMetric(metric=metric, period=period, value=float(value or 0), refreshed_at=now))
+
+
+def refresh(full=False):
+    """Rebuild the platform aggregates.
+
+    Incremental runs only recompute the month before the last refresh onwards (late payment
+    completions land in the month the order was created) and the days since the last refresh.
+    Every per-month query is a created_at range predicate, so both tables' indexes stay usable.
+    User and revenue totals are counted from source on every run, so deleted users and refunds
+    in older months show up at once; the per-month series only pick those up on a full run.
+    """
+    now = datetime.now()
+    previous = None if full else last_refreshed()
+
+    if previous:
+        month_since = _month_start(_month_start(previous) - timedelta(days=1))
+        day_since = previous.date() - timedelta(days=1)
+    else:
+        month_since = min(filter(None, [
+            db.session.query(func.min(Payment.created_at)).scalar(),
+            db.session.query(func.min(User.created_at)).scalar(),
+        ]), default=now)
+        day_since = None
+
+    months = 0
+    for label, start, end in _month_ranges(month_since, now):
+        revenue = db.session.query(func.sum(Payment.amount)).filter(
+            Payment.status == 'completed', Payment.created_at >= start, Payment.created_at < end
+        ).scalar()
+        new_users = User.query.filter(User.created_at >= start, User.created_at < end).count()
+        _store(MONTHLY_REVENUE, label, revenue, now)
+        _store(MONTHLY_USERS, label, new_users, now)
+        months += 1
+
+    # Totals are not sums of the month rows, which an incremental run leaves stale for older months
+    _store(TOTAL_USERS, TOTAL, db.session.query(func.count(User.id)).scalar(), now)
+    _store(TOTAL_REVENUE, TOTAL, db.session.query(func.sum(Payment.amount))
+           .filter(Payment.status == 'completed').scalar(), now)
+
+    # Plan distribution is a small grouped read; always rebuilt whole
+    PlatformMetric.query.filter_by(metric=ACTIVE_PLAN).delete(synchronize_session=False)
+    plan_rows = db.session.query(
+        SubscriptionPlan.name,
+        func.count(UserSubscription.id)
+    ).join(UserSubscription, SubscriptionPlan.id == UserSubscription.plan_id)\
+     .filter(UserSubscription.status == 'active')\
+     .group_by(SubscriptionPlan.name).all()
+    for name, count in plan_rows:
+        _store(ACTIVE_PLAN, name, count, now)
+
+    # Daily volume comes from the per-user rollup, which is indexed on day
+    volume_query = db.session.query(DailyMessageStat.day, func.sum(DailyMessageStat.count))
+    if day_since:
+        volume_query = volume_query.filter(DailyMessageStat.day >= day_since)
+    days = 0
+    for day, count in volume_query.group_by(DailyMessageStat.day).all():
+        if isinstance(day, str):  # SQLite returns dates as text
+            day = date.fromisoformat(day)
+        _store(DAILY_MESSAGES, day.isoformat(), count, now)
+        days += 1
+
+    # Platform-wide distinct recipients from the per-day platform sketches the send paths keep
+    if full:
+        rebuild_platform_sketches()
+    _store(REACH, '30d', platform_unique_recipients(start=date.today() - timedelta(days=29)), now)
+
+    db.session.commit()
+    logger.info(f"📊 Platform metrics refreshed ({'full' if full else 'incremental'}): "
+                f"{months} months, {len(plan_rows)} plans, {days} days")
+    return now
+
+
+def _series(metric):
+    return [(row.period, row.value) for row in
+            PlatformMetric.query.filter_by(metric=metric).order_by(PlatformMetric.period).all()]
+
+
+def _value(metric, period):
+    row = db.session.get(PlatformMetric, (metric, period))
+    return row.value if row else 0
+
+
+def dashboard_metrics():
+    """Headline numbers for the admin dashboard, read from the aggregates only"""
+    now = datetime.now()
+    this_month = now.strftime('%Y-%m')
+    active_subscriptions = db.session.query(func.sum(PlatformMetric.value))\
+        .filter(PlatformMetric.metric == ACTIVE_PLAN).scalar()
+    return {
+        'total_users': int(_value(TOTAL_USERS, TOTAL)),
+        'active_subscriptions': int(active_subscriptions or 0),
+        'total_revenue': _value(TOTAL_REVENUE, TOTAL),
+        'messages_sent_today': int(_value(DAILY_MESSAGES, now.date().isoformat())),
+        'monthly_revenue': _value(MONTHLY_REVENUE, this_month),
+        'monthly_users': int(_value(MONTHLY_USERS, this_month)),
+        'unique_recipients_30d': int(_value(REACH, '30d')),
+        'last_refreshed': last_refreshed(),
+    }
+
+
+def analytics_metrics(days=30):
+    """Series for the admin analytics page, read from the aggregates only"""
+    since = (date.today() - timedelta(days=days)).isoformat()
+    message_volume = [
+        (row.period, int(row.value)) for row in PlatformMetric.query.filter(
+            PlatformMetric.metric == DAILY_MESSAGES, PlatformMetric.period >= since
+        ).order_by(PlatformMetric.period).all()
+    ]
+    return {
+        'revenue_by_month': [(month, revenue) for month, revenue in _series(MONTHLY_REVENUE) if revenue],
+        'user_growth': [(month, int(users)) for month, users in _series(MONTHLY_USERS) if users],
+        'plan_distribution': [(name, int(count)) for name, count in _series(ACTIVE_PLAN)],
+        'message_volume': message_volume,
+        'last_refreshed': last_refreshed(),
+    }
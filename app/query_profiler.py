@@ -0,0 +1,131 @@
+import logging
+import re
+import sys
+import threading
+import time
+from functools import lru_cache
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Create logger for the query profiler
+logger = logging.getLogger(__name__)
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_IN_LIST = re.compile(r'\(\s*(?:\?|%s|:\w+)(?:\s*,\s*(?:\?|%s|:\w+))*\s*\)')
+_SPACE = re.compile(r'\s+')
+
+# Frames from these packages are skipped when looking for the code that issued a query
+_SKIP_MODULES = ('sqlalchemy', 'flask_sqlalchemy', 'app.query_profiler', 'app.metrics')
+
+
+@lru_cache(maxsize=2048)
+def normalize(statement):
+    """Statement shape with literals and IN-list lengths erased, so `id = 1` and `id = 2` group together"""
+    sql = _STRING.sub('?', statement)
+    sql = _NUMBER.sub('?', sql)
+    sql = _IN_LIST.sub('(?)', sql)
+    return _SPACE.sub(' ', sql).strip()
+
+
+def call_site():
+    """`module:function:line` of the innermost app frame that led to this query"""
+    frame = sys._getframe(1)
+    while frame is not None:
+        module = frame.f_globals.get('__name__', '')
+        if module.startswith('app') and not module.startswith(_SKIP_MODULES):
+            return f"{module}:{frame.f_code.co_name}:{frame.f_lineno}"
+        frame = frame.f_back
+    return 'unknown'
+
+
+class QueryProfiler:
+    """Flags slow statements and N+1 patterns, per request.
+
+    Every statement costs one cached normalize() and a dict increment; the stack walk for the call
+    site only happens for slow statements and the first time a statement crosses the repeat
+    threshold in a request. Offending views accumulate in a per-endpoint report.
+    """
+
+    def __init__(self):
+        self.slow_ms = 200
+        self.repeat_threshold = 10
+        self.enabled = False
+        self._reports = {}
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.enabled = app.config.get('QUERY_PROFILER_ENABLED', True)
+        self.slow_ms = app.config.get('QUERY_SLOW_MS', 200)
+        self.repeat_threshold = app.config.get('QUERY_REPEAT_THRESHOLD', 10)
+        if not self.enabled:
+            return
+        if not event.contains(Engine, 'before_cursor_execute', self._before_cursor_execute):
+            event.listen(Engine, 'before_cursor_execute', self._before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', self._after_cursor_execute)
+        app.after_request(self._after_request)
+        app.extensions['query_profiler'] = self
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info['profiler_started'] = time.perf_counter()
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed_ms = (time.perf_counter() - conn.info.pop('profiler_started', time.perf_counter())) * 1000
+        shape = normalize(statement)
+        if elapsed_ms >= self.slow_ms:
+            logger.warning('🐢 Slow query %.0fms at %s: %s', elapsed_ms, call_site(), shape,
+                           extra={'duration_ms': round(elapsed_ms, 1), 'sql': shape})
+        if not has_request_context():
+            return
+        seen = g.setdefault('query_profile', {})
+        entry = seen.get(shape)
+        if entry is None:
+            seen[shape] = entry = [0, 0.0, None]
+        entry[0] += 1
+        entry[1] += elapsed_ms
+        if entry[0] == self.repeat_threshold + 1:
+            entry[2] = call_site()
+
+    def _after_request(self, response):
+        seen = g.pop('query_profile', None)
+        if not seen:
+            return response
+        repeated = sorted(
+            ((shape, count, total_ms, site) for shape, (count, total_ms, site) in seen.items()
+             if count > self.repeat_threshold),
+            key=lambda item: item[1], reverse=True)
+        if repeated:
+            endpoint = request.endpoint or 'unmatched'
+            total = sum(count for count, _, _ in seen.values())
+            self._remember(endpoint, total, repeated)
+            shape, count, total_ms, site = repeated[0]
+            logger.warning('🔁 Possible N+1 in %s: %d queries, worst repeats %dx (%.0fms) at %s: %s',
+                           endpoint, total, count, total_ms, site, shape,
+                           extra={'endpoint': endpoint, 'sql_queries': total,
+                                  'repeats': [{'sql': s, 'count': c, 'ms': round(ms, 1), 'call_site': cs}
+                                              for s, c, ms, cs in repeated]})
+        return response
+
+    def _remember(self, endpoint, total, repeated):
+        with self._lock:
+            report = self._reports.setdefault(endpoint, {'requests': 0, 'max_queries': 0, 'statements': {}})
+            report['requests'] += 1
+            report['max_queries'] = max(report['max_queries'], total)
+            for shape, count, total_ms, site in repeated:
+                statement = report['statements'].setdefault(shape, {'max_repeats': 0, 'requests': 0,
+                                                                    'total_ms': 0.0, 'call_site': site})
+                statement['max_repeats'] = max(statement['max_repeats'], count)
+                statement['requests'] += 1
+                statement['total_ms'] = round(statement['total_ms'] + total_ms, 1)
+                statement['call_site'] = site or statement['call_site']
+
+    def report(self):
+        """Per-endpoint N+1 findings since startup, worst endpoints first"""
+        with self._lock:
+            reports = {endpoint: {**report, 'statements': dict(report['statements'])}
+                       for endpoint, report in self._reports.items()}
+        return dict(sorted(reports.items(), key=lambda item: item[1]['max_queries'], reverse=True))
+
+
+query_profiler = QueryProfiler()
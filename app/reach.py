@@ -0,0 +1,119 @@
+import logging
+from collections import defaultdict
+from datetime import date, timedelta
+from itertools import groupby
+from app import db
+from app.db_upsert import insert_missing
+from app.models import PlatformRecipientSketch, RecipientSketch
+from app.sketches import HyperLogLog
+
+# Create logger for unique-recipient reach
+logger = logging.getLogger(__name__)
+
+# Platform sketch rows per day. Changing it is safe: a day's rows are merged whatever their shard.
+PLATFORM_SHARDS = 16
+
+
+def _normalize(recipient):
+    return ''.join(ch for ch in str(recipient) if ch.isdigit())
+
+
+def _add_recipients(model, key, recipients):
+    """Fold recipients into one sketch row, creating it first if needed so the row lock always holds"""
+    query = model.query.filter_by(**key).with_for_update()
+    row = query.first()
+    if row is None:
+        db.session.execute(insert_missing(model.__table__, [dict(key, sketch=HyperLogLog().to_bytes())]))
+        row = query.one()
+    sketch = HyperLogLog.from_bytes(row.sketch)
+    for recipient in recipients:
+        sketch.add(_normalize(recipient))
+    row.sketch = sketch.to_bytes()
+
+
+def record_recipients(messages):
+    """Add the recipients of newly sent messages to their user/day/template sketches and to the
+    day's platform-wide sketch.
+
+    Messages are grouped first so a bulk send reads and writes each sketch row once. Rows are
+    locked in key order, user sketches before platform ones, so concurrent sends can't deadlock.
+    """
+    groups = defaultdict(list)
+    for message in messages:
+        if message.status == 'failed':
+            continue
+        day = message.created_at.date() if message.created_at else date.today()
+        groups[(message.user_id, day, message.template_id)].append(message.recipient)
+
+    platform = defaultdict(list)
+    for (user_id, day, template_id), recipients in sorted(groups.items()):
+        _add_recipients(RecipientSketch, {'user_id': user_id, 'day': day, 'template_id': template_id}, recipients)
+        platform[(day, user_id % PLATFORM_SHARDS)].extend(recipients)
+    for (day, shard), recipients in sorted(platform.items()):
+        _add_recipients(PlatformRecipientSketch, {'day': day, 'shard': shard}, recipients)
+
+
+def merged_sketch(user_id=None, start=None, end=None, template_id=None):
+    """Union of the matching sketches; any filter may be omitted. `end` is exclusive."""
+    query = db.session.query(RecipientSketch.sketch)
+    if user_id is not None:
+        query = query.filter(RecipientSketch.user_id == user_id)
+    if start is not None:
+        query = query.filter(RecipientSketch.day >= start)
+    if end is not None:
+        query = query.filter(RecipientSketch.day < end)
+    if template_id is not None:
+        query = query.filter(RecipientSketch.template_id == template_id)
+    merged = HyperLogLog()
+    for (data,) in query:
+        merged.merge(HyperLogLog.from_bytes(data))
+    return merged
+
+
+def unique_recipients(user_id=None, start=None, end=None, template_id=None):
+    """Approximate distinct recipients over the range, within HyperLogLog.relative_error"""
+    return merged_sketch(user_id, start, end, template_id).estimate()
+
+
+def reach_summary(user_id):
+    """7- and 30-day unique recipients for the analytics page"""
+    today = date.today()
+    return {
+        'reach_7d': unique_recipients(user_id, start=today - timedelta(days=6)),
+        'reach_30d': unique_recipients(user_id, start=today - timedelta(days=29)),
+        'error_pct': round(HyperLogLog().relative_error * 100, 1),
+    }
+
+
+def platform_unique_recipients(start, end=None):
+    """Approximate distinct recipients across every user over [start, end), from the platform sketches"""
+    query = db.session.query(PlatformRecipientSketch.sketch).filter(PlatformRecipientSketch.day >= start)
+    if end is not None:
+        query = query.filter(PlatformRecipientSketch.day < end)
+    merged = HyperLogLog()
+    for (data,) in query:
+        merged.merge(HyperLogLog.from_bytes(data))
+    return merged.estimate()
+
+
+def rebuild_platform_sketches(since=None):
+    """Recompute platform_recipient_sketches from the per-user sketches (for days recorded before
+    they existed); returns the days written. Sketches are read in day order, one day merged at a time."""
+    query = db.session.query(RecipientSketch.day, RecipientSketch.user_id, RecipientSketch.sketch)
+    stale = PlatformRecipientSketch.query
+    if since is not None:
+        query = query.filter(RecipientSketch.day >= since)
+        stale = stale.filter(PlatformRecipientSketch.day >= since)
+    stale.delete(synchronize_session=False)
+
+    days = 0
+    for day, rows in groupby(query.order_by(RecipientSketch.day).yield_per(1000), key=lambda row: row.day):
+        shards = defaultdict(HyperLogLog)
+        for _, user_id, data in rows:
+            shards[user_id % PLATFORM_SHARDS].merge(HyperLogLog.from_bytes(data))
+        db.session.add_all(PlatformRecipientSketch(day=day, shard=shard, sketch=sketch.to_bytes())
+                           for shard, sketch in shards.items())
+        days += 1
+    db.session.commit()
+    logger.info(f"📈 Rebuilt platform reach sketches for {days} days")
+    return days
@@ -0,0 +1,181 @@
+import logging
+from collections import Counter
+from datetime import date, datetime, timedelta
+from sqlalchemy import func
+from app import db
+from app.archive import hot_since
+from app.models import DailyMessageStat, MessageHistory, Template
+from app.partitions import month_ranges
+
+# Create logger for rollups
+logger = logging.getLogger(__name__)
+
+BACKFILL_BATCH_SIZE = 1000
+
+_table = DailyMessageStat.__table__
+_key_columns = [_table.c.user_id, _table.c.day, _table.c.template_id, _table.c.status]
+
+
+def _message_day(message):
+    """Day a message is bucketed under (created_at is only set after flush)"""
+    return message.created_at.date() if message.created_at else date.today()
+
+
+def _upsert_stmt(rows):
+    """INSERT ... that adds to the existing count when the rollup row already exists"""
+    dialect = db.engine.dialect.name
+    if dialect == 'mysql':
+        from sqlalchemy.dialects.mysql import insert
+        stmt = insert(_table).values(rows)
+        return stmt.on_duplicate_key_update(count=_table.c.count + stmt.inserted['count'])
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    stmt = insert(_table).values(rows)
+    return stmt.on_conflict_do_update(
+        index_elements=_key_columns,
+        set_={'count': _table.c.count + stmt.excluded['count']}
+    )
+
+
+def apply_deltas(deltas):
+    """Apply {(user_id, day, template_id, status): delta} to the rollup in the current transaction"""
+    increments = []
+    for (user_id, day, template_id, status), delta in deltas.items():
+        if delta > 0:
+            increments.append({'user_id': user_id, 'day': day, 'template_id': template_id,
+                               'status': status, 'count': delta})
+        elif delta < 0:
+            # Never let a bucket go negative (e.g. rows sent before the backfill ran)
+            db.session.execute(
+                _table.update()
+                .where(_table.c.user_id == user_id, _table.c.day == day,
+                       _table.c.template_id == template_id, _table.c.status == status,
+                       _table.c.count >= -delta)
+                .values(count=_table.c.count + delta)
+            )
+    if increments:
+        db.session.execute(_upsert_stmt(increments))
+
+
+def record_sent(messages):
+    """Count newly created MessageHistory rows; call before the send path commits"""
+    deltas = Counter()
+    for message in messages:
+        deltas[(message.user_id, _message_day(message), message.template_id, message.status or 'sent')] += 1
+    apply_deltas(deltas)
+
+
+def record_status_change(message, old_status, new_status):
+    """Move one message from its old status bucket to the new one"""
+    if old_status == new_status:
+        return
+    day = _message_day(message)
+    deltas = Counter()
+    deltas[(message.user_id, day, message.template_id, old_status or 'sent')] -= 1
+    deltas[(message.user_id, day, message.template_id, new_status)] += 1
+    apply_deltas(deltas)
+
+
+def backfill(user_id=None, since=None):
+    """Rebuild the rollup from MessageHistory, one user at a time; returns rows written.
+
+    Each user is read one calendar month at a time with created_at range predicates, so on a
+    partitioned message_history every query touches a single partition. `since` (a date)
+    rebuilds only the days from then on. Days before a user's oldest hot row, or before the
+    archive cutoff, are left as they are: their rows are in cold storage, not message_history.
+    """
+    if user_id is not None:
+        user_ids = [user_id]
+    else:
+        user_ids = [row[0] for row in db.session.query(MessageHistory.user_id).distinct()]
+    floor = hot_since()
+    if since and floor and since < floor:
+        logger.warning(f"⚠️ Messages before {floor} are archived; keeping their rollup rows")
+
+    written = 0
+    day_col = func.date(MessageHistory.created_at)
+    status_col = MessageHistory.status
+    for uid in user_ids:
+        oldest = db.session.query(func.min(MessageHistory.created_at))\
+            .filter(MessageHistory.user_id == uid).scalar()
+        if oldest is None:
+            continue  # nothing hot to rebuild from
+        first = max(filter(None, [since, oldest.date(), floor]))
+        DailyMessageStat.query.filter(DailyMessageStat.user_id == uid, DailyMessageStat.day >= first)\
+            .delete(synchronize_session=False)
+
+        user_rows = 0
+        for start, end in month_ranges(first, date.today()):
+            start = max(start, first)
+            rows = db.session.query(
+                day_col, MessageHistory.template_id, status_col, func.count(MessageHistory.id)
+            ).filter(MessageHistory.user_id == uid,
+                     MessageHistory.created_at >= start, MessageHistory.created_at < end)\
+             .group_by(day_col, MessageHistory.template_id, status_col).all()
+            batch = []
+            for day, template_id, status, count in rows:
+                if isinstance(day, str):  # SQLite returns DATE() as text
+                    day = date.fromisoformat(day)
+                batch.append({'user_id': uid, 'day': day, 'template_id': template_id,
+                              'status': status, 'count': count})
+                if len(batch) >= BACKFILL_BATCH_SIZE:
+                    db.session.execute(_table.insert(), batch)
+                    batch = []
+            if batch:
+                db.session.execute(_table.insert(), batch)
+            user_rows += len(rows)
+        db.session.commit()
+        written += user_rows
+        logger.info(f"📈 Rollup backfilled for user {uid}: {user_rows} rows")
+    return written
+
+
+def analytics_summary(user_id, days=30, daily_days=7):
+    """Everything the /analytics page needs, read from the rollup in three grouped queries"""
+    S = DailyMessageStat
+    today = date.today()
+    window_start = (datetime.now() - timedelta(days=days)).date()
+
+    status_stats = [
+        (status, int(count)) for status, count in db.session.query(S.status, func.sum(S.count))
+        .filter(S.user_id == user_id).group_by(S.status).all() if count
+    ]
+    status_counts = dict(status_stats)
+    total_messages = sum(status_counts.values())
+
+    per_day = {
+        (date.fromisoformat(day) if isinstance(day, str) else day): int(count or 0)
+        for day, count in db.session.query(S.day, func.sum(S.count))
+        .filter(S.user_id == user_id, S.day >= window_start).group_by(S.day).all()
+    }
+    messages_this_month = sum(per_day.values())
+
+    daily_stats = []
+    for i in reversed(range(daily_days)):
+        day = today - timedelta(days=i)
+        daily_stats.append({
+            'date': day.strftime('%Y-%m-%d'),
+            'day': day.strftime('%a'),
+            'count': per_day.get(day, 0)
+        })
+
+    usage = func.sum(S.count)
+    template_stats = [
+        (name, int(count)) for name, count in db.session.query(Template.name, usage.label('usage_count'))
+        .join(S, Template.id == S.template_id)
+        .filter(S.user_id == user_id)
+        .group_by(Template.name)
+        .order_by(usage.desc())
+        .limit(5).all()
+    ]
+
+    return {
+        'total_messages': total_messages,
+        'messages_this_month': messages_this_month,
+        'status_stats': status_stats,
+        'status_counts': status_counts,
+        'daily_stats': daily_stats,
+        'template_stats': template_stats,
+    }
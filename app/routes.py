@@ -1,16 +1,22 @@
-import os
 import logging
-from flask import Blueprint, render_template, redirect, url_for, request, flash, current_app as app, jsonify
+from flask import Blueprint, render_template, redirect, url_for, request, flash, current_app as app, jsonify, Response, stream_with_context
 from flask_login import login_user, login_required, logout_user, current_user
 from werkzeug.security import generate_password_hash, check_password_hash
 from werkzeug.utils import secure_filename
-import requests                                 
-from app import db, login_manager
-from app.models import User, Upload, Template, MessageHistory, Contact
+from app import db, login_manager, graph_api, upload_storage
+from app.models import User, Upload, Template, TemplateVersion, MessageHistory, Contact
+from app.message_columns import encode_params, normalize_e164, normalize_status
+from app.rollups import record_sent, record_status_change
+from app.reach import record_recipients
+from app.latency import record_transition
+from app.cache import cache, snapshot, DASHBOARD, ANALYTICS, INBOX
+from app.template_registry import template_registry
+from app.user_cache import user_cache
+from app.media_cache import media_cache
+from app.db_routing import replica_reads
+from app.logging_setup import redact, redact_headers
+from app.signals import message_sent, message_status_changed, template_status_changed
 from app.forms import RegisterForm, LoginForm, UploadForm, WhatsAppMessageForm, TemplateForm
-from config import Config
-import urllib.parse
-from wtforms import SelectField
 
 # Create logger for routes
 logger = logging.getLogger(__name__)
@@ -19,7 +25,7 @@ main = Blueprint('main', __name__)
 
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    return user_cache.load(int(user_id))
 
 @main.route('/')
 def index():
@@ -90,16 +96,26 @@ def login():
 @login_required
 def dashboard():
     logger.info(f"📊 Dashboard accessed by user: {current_user.email} (ID: {current_user.id})")
-    uploads = Upload.query.filter_by(user_id=current_user.id).all()
-    has_pan = any(u.filetype == 'PAN' for u in uploads)
-    has_gst = any(u.filetype == 'GST' for u in uploads)
-    docs_uploaded = has_pan and has_gst
+    
+    def load_dashboard():
+        uploads = Upload.query.filter_by(user_id=current_user.id).all()
+        has_pan = any(u.filetype == 'PAN' for u in uploads)
+        has_gst = any(u.filetype == 'GST' for u in uploads)
+        # Get recent message history
+        message_history = MessageHistory.query.filter_by(user_id=current_user.id).order_by(MessageHistory.created_at.desc()).limit(10).all()
+        return {
+            'docs_uploaded': has_pan and has_gst,
+            'message_history': [snapshot(m) for m in message_history]
+        }
+    
+    data = cache.get_or_load(current_user.id, DASHBOARD, load_dashboard)
+    docs_uploaded = data['docs_uploaded']
     onboarding_status = current_user.onboarding_status
     
     logger.info(f"📋 User status - Docs uploaded: {docs_uploaded}, Onboarding: {onboarding_status}")
     
     # Check if user can send messages
-    approved_templates = Template.query.filter_by(user_id=current_user.id, status='Approved').all()
+    approved_templates = template_registry.for_user(current_user.id)
     can_send = (onboarding_status == 'Verified' and 
                 current_user.whatsapp_access_token and 
                 current_user.phone_number_id and 
@@ -107,14 +123,11 @@ def dashboard():
     
     logger.info(f"📱 User messaging capability: {can_send} (Templates: {len(approved_templates)})")
     
-    # Get recent message history
-    message_history = MessageHistory.query.filter_by(user_id=current_user.id).order_by(MessageHistory.created_at.desc()).limit(10).all()
-    
     return render_template('dashboard.html', 
                            docs_uploaded=docs_uploaded,
                            can_send=can_send,
                            onboarding_status=onboarding_status,
-                           message_history=message_history)
+                           message_history=data['message_history'])
 
 @main.route('/dashboard/templates', methods=['GET', 'POST'])
 @login_required
@@ -160,7 +173,7 @@ def manage_templates():
                 "components": components,
                 "category": form.category.data
             }
-            response = requests.post(url, headers=headers, json=payload)
+            response = graph_api.post(url, headers=headers, json=payload)
             if response.status_code == 200:
                 resp_json = response.json()
                 template = Template(
@@ -243,13 +256,9 @@ def debug_user():
     # Force refresh user from database
     db.session.refresh(current_user)
     
-    print(f"🔍 DEBUG USER DATA:")
-    print(f"  - ID: {current_user.id}")
-    print(f"  - Email: {current_user.email}")
-    print(f"  - WABA ID: {current_user.waba_id}")
-    print(f"  - Phone ID: {current_user.phone_number_id}")
-    print(f"  - Token (first 50): {current_user.whatsapp_access_token[:50] if current_user.whatsapp_access_token else 'None'}")
-    print(f"  - Status: {current_user.onboarding_status}")
+    logger.debug("🔍 Debug user data: id=%s waba_id=%s phone_id=%s token=%s status=%s",
+                 current_user.id, current_user.waba_id, current_user.phone_number_id,
+                 redact(current_user.whatsapp_access_token), current_user.onboarding_status)
     
     return f"""
     <h2>Debug User Data</h2>
@@ -330,6 +339,7 @@ def simple_setup():
             auto_create_starter_templates(current_user.id)
             
             db.session.commit()
+            template_status_changed.send(user_id=current_user.id)
             
             flash('🎉 Setup complete! You can now send WhatsApp messages to your customers.', 'success')
             return redirect(url_for('main.dashboard'))
@@ -359,10 +369,8 @@ def onboard_callback():
         "code": code
     }
 
-    print(f"Token exchange params: {params}")  # Debug log
-    token_resp = requests.get(token_url, params=params)
-    print(f"Token response status: {token_resp.status_code}")  # Debug log
-    print(f"Token response text: {token_resp.text}")  # Debug log
+    token_resp = graph_api.get(token_url, params=params)
+    logger.debug("🔑 Token exchange response: %s", token_resp.status_code)
     
     if token_resp.status_code != 200:
         flash(f"Failed to fetch access token: {token_resp.status_code} - {token_resp.text}", "danger")
@@ -439,8 +447,9 @@ def onboard_callback():
 
 
     app_waba_url = f"https://graph.facebook.com/v19.0/{test_waba_id}/phone_numbers"
-    app_waba_resp = requests.get(app_waba_url, params={"access_token": access_token}).json()
-    print(f"WABA linked to app: {app_waba_resp}")
+    app_waba_resp = graph_api.get(app_waba_url, params={"access_token": access_token}).json()
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("WABA linked to app: %s", app_waba_resp)
 
     # The rest of the onboarding status logic remains the same
     waba_phones = app_waba_resp.get("data", [])
@@ -464,12 +473,18 @@ def business_verification():
     if form.validate_on_submit():
         for file, filetype in [(form.pan_file.data, 'PAN'), (form.gst_file.data, 'GST')]:
             if file:
-                filename = secure_filename(file.filename)
-                filepath = os.path.join(Config.UPLOAD_FOLDER, filename)
-                file.save(filepath)
-                upload = Upload(filename=filename, filetype=filetype, user_id=current_user.id)
+                try:
+                    stored = upload_storage.store(file.stream)
+                except upload_storage.InvalidUpload as e:
+                    db.session.rollback()
+                    flash(f'{filetype} document rejected: {e}', 'danger')
+                    return render_template('business_verification.html', form=form,
+                                           uploads=Upload.query.filter_by(user_id=current_user.id).all())
+                upload = Upload(filename=secure_filename(file.filename), filetype=filetype, user_id=current_user.id,
+                                sha256=stored.sha256, size=stored.size)
                 db.session.add(upload)
         db.session.commit()
+        cache.invalidate(current_user.id, DASHBOARD)
         flash('Documents uploaded successfully!', 'success')
         return redirect(url_for('main.dashboard'))
     
@@ -483,7 +498,7 @@ def send_messages():
         flash('Please complete WhatsApp setup first.', 'warning')
         return redirect(url_for('main.dashboard'))
     
-    approved_templates = Template.query.filter_by(user_id=current_user.id, status='Approved').all()
+    approved_templates = template_registry.for_user(current_user.id)
     if not approved_templates:
         flash('No approved templates found. Please create templates first.', 'warning')
         return redirect(url_for('main.manage_templates'))
@@ -492,17 +507,12 @@ def send_messages():
     msg_form.template.choices = [(t.name, f"{t.name} ({t.language})") for t in approved_templates]
     
     if msg_form.validate_on_submit():
-        recipient = msg_form.recipient.data
+        recipient = normalize_e164(msg_form.recipient.data)
         template_name = msg_form.template.data
-        lang = None
-        template_obj = None
         
         # Find the template object
-        for t in approved_templates:
-            if t.name == template_name:
-                lang = t.language
-                template_obj = t
-                break
+        template_obj = approved_templates.find(template_name)
+        lang = template_obj.language if template_obj else None
         
         if not lang or not template_obj:
             flash("Invalid template selected.", "danger")
@@ -511,16 +521,11 @@ def send_messages():
         token = current_user.whatsapp_access_token
         phone_id = current_user.phone_number_id
         
-        print(f"🔍 DEBUG - User ID: {current_user.id}")
-        print(f"🔍 DEBUG - Phone ID: {phone_id}")
-        print(f"🔍 DEBUG - Token (first 20 chars): {token[:20] if token else 'None'}...")
-        print(f"🔍 DEBUG - Token length: {len(token) if token else 0}")
-        print(f"🔍 DEBUG - Recipient: {recipient}")
-        print(f"🔍 DEBUG - Template: {template_name}")
-        print(f"🔍 DEBUG - Language: {lang}")
+        logger.debug("🔍 Send: user=%s phone_id=%s token=%s recipient=%s template=%s lang=%s",
+                     current_user.id, phone_id, redact(token), recipient, template_name, lang)
         
         if not token or not phone_id:
-            print("❌ DEBUG - Missing credentials!")
+            logger.warning(f"❌ Missing WhatsApp credentials for user {current_user.id}")
             flash("Missing WhatsApp credentials", "danger")
             return redirect(url_for('main.dashboard'))
         
@@ -540,16 +545,12 @@ def send_messages():
             }
         }
         
-        print(f"🔍 DEBUG - URL: {url}")
-        print(f"🔍 DEBUG - Headers: {headers}")
-        print(f"🔍 DEBUG - Payload: {payload}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("📤 POST %s headers=%s payload=%s", url, redact_headers(headers), payload)
+        response = graph_api.post(url, headers=headers, json=payload)
         
-        print("📤 DEBUG - Sending request to WhatsApp API...")
-        response = requests.post(url, headers=headers, json=payload)
-        
-        print(f"📥 DEBUG - Response Status: {response.status_code}")
-        print(f"📥 DEBUG - Response Headers: {dict(response.headers)}")
-        print(f"📥 DEBUG - Response Text: {response.text}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("📥 Response %s: %s", response.status_code, response.text)
         
         meta_message_id = None
         if response.status_code == 200:
@@ -560,17 +561,19 @@ def send_messages():
         else:
             flash(f"Failed to send message: {response.status_code} — {response.text}", "danger")
         
-        # Save message history with content
+        # Save message history with the template version sent
         history = MessageHistory(
             user_id=current_user.id,
             recipient=recipient,
             template_id=template_obj.id,
-            message_content=template_obj.content,
+            template_version_id=TemplateVersion.id_for(template_obj.id, template_obj.content),
             message_type='template',
             meta_message_id=meta_message_id,
             status='sent'
         )
         db.session.add(history)
+        record_sent([history])
+        record_recipients([history])
         
         # Create or update contact
         contact = Contact.query.filter_by(
@@ -592,13 +595,14 @@ def send_messages():
             logger.info(f"📇 Contact updated: {recipient} for user {current_user.id}")
         
         db.session.commit()
+        message_sent.send(user_id=current_user.id)
         
         return redirect(url_for('main.send_messages'))
     
     # Get recent messages for display
     recent_messages = MessageHistory.query.filter_by(user_id=current_user.id).order_by(MessageHistory.created_at.desc()).limit(5).all()
     
-    return render_template('send_messages.html', form=msg_form, templates=approved_templates, recent_messages=recent_messages)
+    return render_template('send_messages.html', form=msg_form, templates=approved_templates.approved, recent_messages=recent_messages)
 
 @main.route('/inbox')
 @login_required
@@ -610,53 +614,9 @@ def inbox():
     
     logger.info(f"📥 Inbox accessed by user: {current_user.email} (ID: {current_user.id})")
     
-    # Get all contacts with their last message, ordered by most recent
-    from sqlalchemy import func
-    contacts_with_messages = db.session.query(
-        Contact,
-        func.count(MessageHistory.id).label('message_count'),
-        func.max(MessageHistory.created_at).label('last_message_time')
-    ).outerjoin(
-        MessageHistory, 
-        (Contact.phone_number == MessageHistory.recipient) & 
-        (Contact.user_id == MessageHistory.user_id)
-    ).filter(
-        Contact.user_id == current_user.id
-    ).group_by(Contact.id).order_by(
-        func.max(MessageHistory.created_at).desc()
-    ).all()
-    
-    # If no contacts exist, create them from message history
-    if not contacts_with_messages:
-        # Get unique recipients from message history
-        recipients = db.session.query(
-            MessageHistory.recipient,
-            MessageHistory.recipient_name,
-            func.max(MessageHistory.created_at).label('last_message_time'),
-            func.count(MessageHistory.id).label('message_count')
-        ).filter_by(user_id=current_user.id).group_by(
-            MessageHistory.recipient
-        ).order_by(func.max(MessageHistory.created_at).desc()).all()
-        
-        # Create contacts for each recipient
-        for recipient_data in recipients:
-            existing_contact = Contact.query.filter_by(
-                user_id=current_user.id,
-                phone_number=recipient_data.recipient
-            ).first()
-            
-            if not existing_contact:
-                contact = Contact(
-                    user_id=current_user.id,
-                    phone_number=recipient_data.recipient,
-                    name=recipient_data.recipient_name or recipient_data.recipient,
-                    last_message_at=recipient_data.last_message_time
-                )
-                db.session.add(contact)
-        
-        db.session.commit()
-        
-        # Re-query contacts
+    def load_inbox():
+        # Get all contacts with their last message, ordered by most recent
+        from sqlalchemy import func
         contacts_with_messages = db.session.query(
             Contact,
             func.count(MessageHistory.id).label('message_count'),
@@ -671,6 +631,56 @@ def inbox():
             func.max(MessageHistory.created_at).desc()
         ).all()
     
+        # If no contacts exist, create them from message history
+        if not contacts_with_messages:
+            # Get unique recipients from message history
+            recipients = db.session.query(
+                MessageHistory.recipient,
+                MessageHistory.recipient_name,
+                func.max(MessageHistory.created_at).label('last_message_time'),
+                func.count(MessageHistory.id).label('message_count')
+            ).filter_by(user_id=current_user.id).group_by(
+                MessageHistory.recipient
+            ).order_by(func.max(MessageHistory.created_at).desc()).all()
+        
+            # Create contacts for each recipient
+            for recipient_data in recipients:
+                existing_contact = Contact.query.filter_by(
+                    user_id=current_user.id,
+                    phone_number=recipient_data.recipient
+                ).first()
+            
+                if not existing_contact:
+                    contact = Contact(
+                        user_id=current_user.id,
+                        phone_number=recipient_data.recipient,
+                        name=recipient_data.recipient_name or recipient_data.recipient,
+                        last_message_at=recipient_data.last_message_time
+                    )
+                    db.session.add(contact)
+        
+            db.session.commit()
+        
+            # Re-query contacts
+            contacts_with_messages = db.session.query(
+                Contact,
+                func.count(MessageHistory.id).label('message_count'),
+                func.max(MessageHistory.created_at).label('last_message_time')
+            ).outerjoin(
+                MessageHistory, 
+                (Contact.phone_number == MessageHistory.recipient) & 
+                (Contact.user_id == MessageHistory.user_id)
+            ).filter(
+                Contact.user_id == current_user.id
+            ).group_by(Contact.id).order_by(
+                func.max(MessageHistory.created_at).desc()
+            ).all()
+        
+        return [(snapshot(contact), message_count, last_message_time)
+                for contact, message_count, last_message_time in contacts_with_messages]
+    
+    contacts_with_messages = cache.get_or_load(current_user.id, INBOX, load_inbox)
+    
     logger.info(f"📥 Found {len(contacts_with_messages)} contacts for user {current_user.id}")
     
     return render_template('inbox.html', contacts_with_messages=contacts_with_messages)
@@ -707,6 +717,7 @@ def chat_with_contact(phone_number):
             )
             db.session.add(contact)
             db.session.commit()
+            cache.invalidate(current_user.id, INBOX)
         else:
             flash('No conversation found with this contact.', 'warning')
             return redirect(url_for('main.inbox'))
@@ -718,10 +729,7 @@ def chat_with_contact(phone_number):
     ).order_by(MessageHistory.created_at.asc()).all()
     
     # Get approved templates for quick sending
-    approved_templates = Template.query.filter_by(
-        user_id=current_user.id, 
-        status='Approved'
-    ).all()
+    approved_templates = template_registry.for_user(current_user.id).approved
     
     logger.info(f"💬 Loaded {len(messages)} messages for conversation with {phone_number}")
     
@@ -744,20 +752,21 @@ def send_quick_message():
     if not phone_number or not template_id:
         return jsonify({'error': 'Phone number and template are required.'}), 400
     
-    # Check message limit
-    if not current_user.can_send_message():
-        return jsonify({'error': 'Monthly message limit reached.'}), 400
+    recipient = normalize_e164(phone_number)
+    if recipient is None:
+        return jsonify({'error': 'Enter the phone number with country code, e.g. 919876543210'}), 400
     
     # Get template
-    template = Template.query.filter_by(
-        id=template_id,
-        user_id=current_user.id,
-        status='Approved'
-    ).first()
+    template = template_registry.for_user(current_user.id).get(template_id)
     
     if not template:
         return jsonify({'error': 'Invalid template selected.'}), 400
     
+    # Take the message from the quota up front, committed so the user row isn't locked during the Graph call
+    if not current_user.reserve_messages(1):
+        return jsonify({'error': 'Monthly message limit reached.'}), 400
+    db.session.commit()
+    
     logger.info(f"📤 Quick message sending: {phone_number} using template {template.name}")
     
     # Send message via WhatsApp API
@@ -770,7 +779,7 @@ def send_quick_message():
         
         payload = {
             "messaging_product": "whatsapp",
-            "to": phone_number,
+            "to": recipient,
             "type": "template",
             "template": {
                 "name": template.name,
@@ -778,22 +787,21 @@ def send_quick_message():
             }
         }
         
-        response = requests.post(url, headers=headers, json=payload)
+        response = graph_api.post(url, headers=headers, json=payload)
         
         if response.status_code == 200:
             # Save message history
             message_history = MessageHistory(
                 user_id=current_user.id,
-                recipient=phone_number,
+                recipient=recipient,
                 template_id=template.id,
-                message_content=template.content,
+                template_version_id=TemplateVersion.id_for(template.id, template.content),
                 message_type='template',
                 status='sent'
             )
             db.session.add(message_history)
-            
-            # Update user's message count
-            current_user.messages_sent_this_month += 1
+            record_sent([message_history])
+            record_recipients([message_history])
             
             # Update contact's last message time
             contact = Contact.query.filter_by(
@@ -805,31 +813,70 @@ def send_quick_message():
                 contact.last_message_at = message_history.created_at
             
             db.session.commit()
+            message_sent.send(user_id=current_user.id)
             
             logger.info(f"✅ Quick message sent successfully to {phone_number}")
             return jsonify({'success': True, 'message': 'Message sent successfully!'})
         else:
             logger.error(f"❌ Failed to send quick message: {response.status_code} - {response.text}")
+            current_user.add_messages_sent(-1)  # give the reserved message back
+            db.session.commit()
             return jsonify({'error': f'Failed to send message: {response.text}'}), 400
             
     except Exception as e:
         logger.error(f"❌ Error sending quick message: {str(e)}")
+        db.session.rollback()
+        current_user.add_messages_sent(-1)
+        db.session.commit()
         return jsonify({'error': 'An error occurred while sending the message.'}), 500
 
 @main.route('/message-history')
 @login_required
+@replica_reads
 def message_history():
     if current_user.onboarding_status != 'Verified':
         flash('Please complete WhatsApp setup first.', 'warning')
         return redirect(url_for('main.dashboard'))
     
+    from app.archive import HistoryPagination
+    
+    # Pages run through the live table first, then transparently into the cold-storage archive
     page = request.args.get('page', 1, type=int)
-    messages = MessageHistory.query.filter_by(user_id=current_user.id).order_by(MessageHistory.created_at.desc()).paginate(
-        page=page, per_page=20, error_out=False
+    messages = HistoryPagination(
+        query=MessageHistory.query.filter_by(user_id=current_user.id).order_by(MessageHistory.created_at.desc()),
+        user_id=current_user.id, page=page, per_page=20, error_out=False
     )
     
     return render_template('message_history.html', messages=messages)
 
+@main.route('/message-history/export')
+@login_required
+@replica_reads
+def export_message_history():
+    """Stream the full delivery report as CSV or NDJSON, optionally gzipped"""
+    from app.exports import export_chunks, CONTENT_TYPES
+    from datetime import datetime
+    
+    if current_user.onboarding_status != 'Verified':
+        flash('Please complete WhatsApp setup first.', 'warning')
+        return redirect(url_for('main.dashboard'))
+    
+    fmt = request.args.get('format', 'csv').lower()
+    if fmt not in CONTENT_TYPES:
+        flash('Unsupported export format.', 'danger')
+        return redirect(url_for('main.message_history'))
+    use_gzip = request.args.get('gzip', '0').lower() in ('1', 'true', 'yes')
+    
+    filename = f"message_history_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{fmt}"
+    headers = {'Content-Disposition': f'attachment; filename="{filename}.gz"' if use_gzip
+               else f'attachment; filename="{filename}"'}
+    logger.info(f"📦 Message history export ({fmt}{', gzip' if use_gzip else ''}) started by user {current_user.id}")
+    
+    chunks = export_chunks(current_user.id, fmt, gzip=use_gzip)
+    return Response(stream_with_context(chunks),
+                    mimetype='application/gzip' if use_gzip else CONTENT_TYPES[fmt],
+                    headers=headers)
+
 
 
 @main.route('/bulk-messages', methods=['GET', 'POST'])
@@ -839,7 +886,7 @@ def bulk_messages():
         flash('Please complete WhatsApp setup first.', 'warning')
         return redirect(url_for('main.dashboard'))
     
-    approved_templates = Template.query.filter_by(user_id=current_user.id, status='Approved').all()
+    approved_templates = template_registry.for_user(current_user.id)
     if not approved_templates:
         flash('No approved templates found. Please create templates first.', 'warning')
         return redirect(url_for('main.manage_templates'))
@@ -849,52 +896,80 @@ def bulk_messages():
     form.template.choices = [(t.name, f"{t.name} ({t.language})") for t in approved_templates]
     
     if form.validate_on_submit():
-        # Get recipients from text area or CSV file
+        from app.template_params import compile_template, bind_columns, row_values, MissingParameters
+        
+        # Find the selected template
+        template_name = form.template.data
+        template_obj = approved_templates.find(template_name)
+        
+        if not template_obj:
+            flash("Invalid template selected.", "danger")
+            return redirect(url_for('main.bulk_messages'))
+        
+        renderer = compile_template(template_obj)
+        
+        # Get recipients (and their template parameters) from text area or CSV file
         recipients = []
+        skipped_count = 0
+        invalid_count = 0
         
         if form.csv_file.data:
-            # Handle CSV upload
+            # Handle CSV upload: phone number first, then one column per {{n}} placeholder
             import csv
             import io
             csv_file = form.csv_file.data
             csv_content = csv_file.read().decode('utf-8')
             csv_reader = csv.reader(io.StringIO(csv_content))
+            columns = None
             
             for row in csv_reader:
                 if row and len(row) > 0:  # Skip empty rows
-                    phone = row[0].strip()
-                    if phone and phone.isdigit() and len(phone) >= 10:
-                        recipients.append(phone)
+                    phone = normalize_e164(row[0])
+                    if phone:
+                        if columns is None:
+                            columns = bind_columns(None, renderer.param_count)
+                        try:
+                            recipients.append((phone, row_values(row, columns)))
+                        except MissingParameters:
+                            skipped_count += 1
+                    elif columns is None and not any(ch.isdigit() for ch in row[0]):
+                        # Header row
+                        columns = bind_columns(row, renderer.param_count)
+                    elif row[0].strip():
+                        invalid_count += 1
         else:
             # Handle text area input
             recipients_text = form.recipients_text.data.strip()
             if recipients_text:
                 for line in recipients_text.split('\n'):
-                    phone = line.strip()
-                    if phone and phone.isdigit() and len(phone) >= 10:
-                        recipients.append(phone)
+                    if not line.strip():
+                        continue
+                    phone = normalize_e164(line)
+                    if phone is None:
+                        invalid_count += 1
+                    elif renderer.param_count:
+                        skipped_count += 1
+                    else:
+                        recipients.append((phone, ()))
+        
+        if invalid_count:
+            flash(f'{invalid_count} recipients skipped: not a phone number with country code '
+                  f'(e.g. 919876543210).', 'warning')
+        if skipped_count:
+            flash(f'{skipped_count} recipients skipped: template "{template_name}" needs '
+                  f'{renderer.param_count} parameter column(s) after the phone number.', 'warning')
         
         if not recipients:
             flash('No valid phone numbers found. Please check your input.', 'danger')
             return redirect(url_for('main.bulk_messages'))
         
-        # Check message limits
-        remaining_messages = current_user.get_remaining_messages()
-        if len(recipients) > remaining_messages:
+        # Take the whole batch from the quota up front (failures are given back below), committed so
+        # the user row isn't locked while the batch goes out
+        if not current_user.reserve_messages(len(recipients)):
+            remaining_messages = current_user.get_remaining_messages()
             flash(f'You can only send {remaining_messages} more messages this month. You tried to send {len(recipients)} messages.', 'warning')
             return redirect(url_for('main.bulk_messages'))
-        
-        # Find the selected template
-        template_name = form.template.data
-        template_obj = None
-        for t in approved_templates:
-            if t.name == template_name:
-                template_obj = t
-                break
-        
-        if not template_obj:
-            flash("Invalid template selected.", "danger")
-            return redirect(url_for('main.bulk_messages'))
+        db.session.commit()
         
         # Send messages
         success_count = 0
@@ -908,8 +983,16 @@ def bulk_messages():
             'Content-Type': 'application/json'
         }
         url = f'https://graph.facebook.com/v19.0/{phone_id}/messages'
+        histories = []
+        template_version_id = TemplateVersion.id_for(template_obj.id, template_obj.content)
         
-        for recipient in recipients:
+        # IMAGE headers go out by cached media id, uploaded once per phone number, not per message
+        image_header = media_cache.header_component(template_obj, phone_id, token)
+        
+        for recipient, values in recipients:
+            components, _ = renderer.render(values)
+            if image_header:
+                components = [image_header] + (components or [])
             payload = {
                 "messaging_product": "whatsapp",
                 "to": recipient,
@@ -919,9 +1002,11 @@ def bulk_messages():
                     "language": {"code": template_obj.language}
                 }
             }
+            if components:
+                payload["template"]["components"] = components
             
             try:
-                response = requests.post(url, headers=headers, json=payload)
+                response = graph_api.post(url, headers=headers, json=payload)
                 meta_message_id = None
                 
                 if response.status_code == 200:
@@ -938,9 +1023,12 @@ def bulk_messages():
                     recipient=recipient,
                     template_id=template_obj.id,
                     meta_message_id=meta_message_id,
+                    template_version_id=template_version_id,
+                    params=encode_params(renderer.body_values(values)),
                     status='sent' if response.status_code == 200 else 'failed'
                 )
                 db.session.add(history)
+                histories.append(history)
                 
             except Exception as e:
                 failed_count += 1
@@ -949,13 +1037,22 @@ def bulk_messages():
                     user_id=current_user.id,
                     recipient=recipient,
                     template_id=template_obj.id,
+                    template_version_id=template_version_id,
+                    params=encode_params(renderer.body_values(values)),
                     status='failed'
                 )
                 db.session.add(history)
+                histories.append(history)
+        
+        record_sent(histories)
         
-        # Update user's message count
-        current_user.messages_sent_this_month += success_count
+        record_recipients(histories)
+        
+        # Give back the reserved messages that failed
+        if failed_count:
+            current_user.add_messages_sent(-failed_count)
         db.session.commit()
+        message_sent.send(user_id=current_user.id)
         
         if success_count > 0:
             flash(f'Successfully sent {success_count} messages!', 'success')
@@ -964,7 +1061,7 @@ def bulk_messages():
         
         return redirect(url_for('main.message_history'))
     
-    return render_template('bulk_messages.html', form=form, templates=approved_templates, 
+    return render_template('bulk_messages.html', form=form, templates=approved_templates.approved, 
                          remaining_messages=current_user.get_remaining_messages())
 
 @main.route('/schedule-messages', methods=['GET', 'POST'])
@@ -974,7 +1071,7 @@ def schedule_messages():
         flash('Please complete WhatsApp setup first.', 'warning')
         return redirect(url_for('main.dashboard'))
     
-    approved_templates = Template.query.filter_by(user_id=current_user.id, status='Approved').all()
+    approved_templates = template_registry.for_user(current_user.id)
     if not approved_templates:
         flash('No approved templates found. Please create templates first.', 'warning')
         return redirect(url_for('main.manage_templates'))
@@ -1005,11 +1102,7 @@ def schedule_messages():
         
         # Find the selected template
         template_name = form.template.data
-        template_obj = None
-        for t in approved_templates:
-            if t.name == template_name:
-                template_obj = t
-                break
+        template_obj = approved_templates.find(template_name)
         
         if not template_obj:
             flash("Invalid template selected.", "danger")
@@ -1018,7 +1111,7 @@ def schedule_messages():
         # Create scheduled message
         scheduled_msg = ScheduledMessage(
             user_id=current_user.id,
-            recipient=form.recipient.data,
+            recipient=normalize_e164(form.recipient.data),
             template_id=template_obj.id,
             scheduled_time=scheduled_datetime,
             status='pending'
@@ -1030,7 +1123,7 @@ def schedule_messages():
         flash(f'Message scheduled for {scheduled_datetime.strftime("%B %d, %Y at %I:%M %p")}!', 'success')
         return redirect(url_for('main.scheduled_messages'))
     
-    return render_template('schedule_messages.html', form=form, templates=approved_templates)
+    return render_template('schedule_messages.html', form=form, templates=approved_templates.approved)
 
 @main.route('/scheduled-messages')
 @login_required
@@ -1066,88 +1159,45 @@ def cancel_scheduled(message_id):
 
 @main.route('/analytics')
 @login_required
+@replica_reads
 def analytics():
     if current_user.onboarding_status != 'Verified':
         flash('Please complete WhatsApp setup first.', 'warning')
         return redirect(url_for('main.dashboard'))
     
-    from datetime import datetime, timedelta
-    from sqlalchemy import func, and_
-    
-    # Date range for analytics (last 30 days)
-    end_date = datetime.now()
-    start_date = end_date - timedelta(days=30)
-    
-    # Basic stats
-    total_messages = MessageHistory.query.filter_by(user_id=current_user.id).count()
-    messages_this_month = MessageHistory.query.filter(
-        and_(
-            MessageHistory.user_id == current_user.id,
-            MessageHistory.created_at >= start_date
-        )
-    ).count()
-    
-    # Status breakdown
-    status_stats = db.session.query(
-        MessageHistory.status,
-        func.count(MessageHistory.id).label('count')
-    ).filter_by(user_id=current_user.id).group_by(MessageHistory.status).all()
-    
-    # Daily message counts (last 7 days)
-    daily_stats = []
-    for i in range(7):
-        day = end_date - timedelta(days=i)
-        day_start = day.replace(hour=0, minute=0, second=0, microsecond=0)
-        day_end = day_start + timedelta(days=1)
-        
-        count = MessageHistory.query.filter(
-            and_(
-                MessageHistory.user_id == current_user.id,
-                MessageHistory.created_at >= day_start,
-                MessageHistory.created_at < day_end
-            )
-        ).count()
-        
-        daily_stats.append({
-            'date': day.strftime('%Y-%m-%d'),
-            'day': day.strftime('%a'),
-            'count': count
-        })
+    from app.rollups import analytics_summary
+    from app.latency import latency_summary
+    from app.reach import reach_summary
     
-    daily_stats.reverse()  # Show oldest to newest
+    # Served from the daily_message_stats rollup and latency sketches instead of scanning MessageHistory
+    def load_analytics():
+        summary = analytics_summary(current_user.id)
+        summary['latency'] = latency_summary(current_user.id)
+        summary['reach'] = reach_summary(current_user.id)
+        return summary
     
-    # Template usage stats
-    template_stats = db.session.query(
-        Template.name,
-        func.count(MessageHistory.id).label('usage_count')
-    ).join(MessageHistory, Template.id == MessageHistory.template_id)\
-     .filter(MessageHistory.user_id == current_user.id)\
-     .group_by(Template.name)\
-     .order_by(func.count(MessageHistory.id).desc())\
-     .limit(5).all()
+    summary = cache.get_or_load(current_user.id, ANALYTICS, load_analytics)
+    total_messages = summary['total_messages']
+    status_counts = summary['status_counts']
     
     # Calculate delivery rate
-    delivered_count = MessageHistory.query.filter_by(
-        user_id=current_user.id, 
-        status='delivered'
-    ).count()
+    delivered_count = status_counts.get('delivered', 0)
     delivery_rate = (delivered_count / total_messages * 100) if total_messages > 0 else 0
     
     # Calculate read rate
-    read_count = MessageHistory.query.filter_by(
-        user_id=current_user.id, 
-        status='read'
-    ).count()
+    read_count = status_counts.get('read', 0)
     read_rate = (read_count / total_messages * 100) if total_messages > 0 else 0
     
     return render_template('analytics.html',
                          total_messages=total_messages,
-                         messages_this_month=messages_this_month,
-                         status_stats=status_stats,
-                         daily_stats=daily_stats,
-                         template_stats=template_stats,
+                         messages_this_month=summary['messages_this_month'],
+                         status_stats=summary['status_stats'],
+                         daily_stats=summary['daily_stats'],
+                         template_stats=summary['template_stats'],
                          delivery_rate=delivery_rate,
                          read_rate=read_rate,
+                         latency=summary['latency'],
+                         reach=summary['reach'],
                          remaining_messages=current_user.get_remaining_messages())
 
 @main.route('/pricing')
@@ -1368,7 +1418,7 @@ def cancel_subscription():
         current_user.subscription.auto_renew = False
         
         # Revert to free plan limits
-        current_user.message_limit = 100
+        current_user.message_limit = app.config['FREE_MESSAGE_LIMIT']
         
         db.session.commit()
         flash('Your subscription has been cancelled. You will continue to have access until the end of your billing period.', 'info')
@@ -1396,6 +1446,7 @@ def meta_webhook():
                         elif event == 'REJECTED':
                             template.status = 'Rejected'
                         db.session.commit()
+                        template_status_changed.send(user_id=template.user_id)
                 # Message DLR (delivery status)
                 if 'statuses' in value:
                     for status in value['statuses']:
@@ -1404,8 +1455,14 @@ def meta_webhook():
                         if meta_message_id and status_str:
                             history = MessageHistory.query.filter_by(meta_message_id=meta_message_id).first()
                             if history:
+                                # Bucket and store the status the way the status_code column reads it back
+                                status_str = normalize_status(status_str)
+                                record_status_change(history, history.status, status_str)
+                                record_transition(history, status_str, status.get('timestamp'),
+                                                  value.get('metadata', {}).get('phone_number_id'))
                                 history.status = status_str
                                 db.session.commit()
+                                message_status_changed.send(user_id=history.user_id)
     return '', 200
 
 def assign_dedicated_whatsapp_number(user_id, business_name):
@@ -0,0 +1,9 @@
+from blinker import Namespace
+
+# Application events that invalidate cached per-tenant results. Every signal is sent
+# with a `user_id` keyword once the change has been committed.
+_signals = Namespace()
+
+message_sent = _signals.signal('message-sent')
+message_status_changed = _signals.signal('message-status-changed')
+template_status_changed = _signals.signal('template-status-changed')
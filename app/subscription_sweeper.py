@@ -0,0 +1,99 @@
+import logging
+import time
+from datetime import date, datetime
+from flask import current_app
+from sqlalchemy import or_, update
+from app import db
+from app.models import User, UserSubscription
+from app.user_cache import user_cache
+
+# Create logger for the subscription expiry and quota reset sweeper
+logger = logging.getLogger(__name__)
+
+
+def _settings(batch_size, pause):
+    config = current_app.config
+    batch_size = batch_size or config['SUBSCRIPTION_SWEEP_BATCH_SIZE']
+    pause = config['SUBSCRIPTION_SWEEP_PAUSE'] if pause is None else pause
+    return batch_size, pause
+
+
+def expire_subscriptions(now=None, batch_size=None, pause=None):
+    """Mark active subscriptions past their end date 'expired' and cap their users' message_limit
+    at FREE_MESSAGE_LIMIT; returns (subscriptions expired, users downgraded).
+
+    Due rows are found through ix_user_subscription_status_end_date, batch_size at a time, and
+    each batch is two set-based UPDATEs and a commit. Both UPDATEs repeat their conditions, so a
+    subscription renewed meanwhile is left alone and re-running the sweep changes nothing.
+    """
+    now = now or datetime.now()
+    batch_size, pause = _settings(batch_size, pause)
+    free_limit = current_app.config['FREE_MESSAGE_LIMIT']
+    expired = downgraded = 0
+    while True:
+        due = db.session.query(UserSubscription.id, UserSubscription.user_id).filter(
+            UserSubscription.status == 'active', UserSubscription.end_date <= now
+        ).order_by(UserSubscription.end_date).limit(batch_size).all()
+        if not due:
+            break
+        ids = [row.id for row in due]
+        expired += db.session.execute(
+            update(UserSubscription)
+            .where(UserSubscription.id.in_(ids), UserSubscription.status == 'active',
+                   UserSubscription.end_date <= now)
+            .values(status='expired')
+            .execution_options(synchronize_session=False)).rowcount
+        # Only users whose current subscription is the one that ended
+        downgraded += db.session.execute(
+            update(User)
+            .where(User.subscription_id.in_(ids), User.message_limit > free_limit)
+            .values(message_limit=free_limit)
+            .execution_options(synchronize_session=False)).rowcount
+        db.session.commit()
+        user_cache.invalidate(*{row.user_id for row in due})
+        if pause:
+            time.sleep(pause)
+    if expired:
+        logger.info(f"⏳ Expired {expired} subscriptions, downgraded {downgraded} users to {free_limit} messages")
+    return expired, downgraded
+
+
+def reset_monthly_counters(today=None, batch_size=None, pause=None):
+    """Zero messages_sent_this_month for every user not yet reset this calendar month; returns users reset.
+
+    Walks the user table in primary-key ranges of batch_size, one UPDATE and commit per range.
+    quota_period records the month a user was last reset, so a second run in the same month
+    (or a resumed one) skips them; the hourly "nothing to do" check is one ix_user_quota_period lookup.
+    """
+    period = (today or date.today()).replace(day=1)
+    batch_size, pause = _settings(batch_size, pause)
+    stale = or_(User.quota_period.is_(None), User.quota_period < period)
+    if db.session.query(User.id).filter(stale).first() is None:
+        return 0  # the usual case: this month's reset is done
+
+    max_id = db.session.query(db.func.max(User.id)).scalar() or 0
+    reset = 0
+    low = 0
+    while low < max_id:
+        high = low + batch_size
+        changed = db.session.execute(
+            update(User)
+            .where(User.id > low, User.id <= high, stale)
+            .values(messages_sent_this_month=0, quota_period=period)
+            .execution_options(synchronize_session=False)).rowcount
+        db.session.commit()
+        reset += changed
+        low = high
+        if pause and changed:
+            time.sleep(pause)
+    if reset:
+        user_cache.clear()
+        logger.info(f"🔄 Reset monthly message counters for {reset} users ({period:%Y-%m})")
+    return reset
+
+
+def sweep(batch_size=None, pause=None):
+    """Expire due subscriptions, then reset counters for a new month; safe to run as often as needed"""
+    expired, downgraded = expire_subscriptions(batch_size=batch_size, pause=pause)
+    reset = reset_monthly_counters(batch_size=batch_size, pause=pause)
+    return {'expired': expired, 'downgraded': downgraded, 'reset': reset}
@@ -0,0 +1,149 @@
+import itertools
+import re
+from functools import lru_cache
+
+PLACEHOLDER = re.compile(r'\{\{\s*(\d+)\s*\}\}')
+
+
+class MissingParameters(ValueError):
+    """A recipient row has no value for one of the template's placeholders"""
+
+
+def _compile_text(text):
+    """Turn `Hi {{1}}, order {{2}}` into a str.format pattern and the 1-based placeholder count"""
+    if not text:
+        return None, 0
+    numbers = [int(n) for n in PLACEHOLDER.findall(text)]
+    if not numbers:
+        return None, 0
+    literal = text.replace('{', '{{').replace('}', '}}')
+    # Escaping doubled the placeholder braces too; map each back to a positional field
+    pattern = re.sub(r'\{\{\{\{\s*(\d+)\s*\}\}\}\}', lambda m: '{%d}' % (int(m.group(1)) - 1), literal)
+    return pattern, max(numbers)
+
+
+class CompiledTemplate:
+    """A template body (and text header) parsed once into positional format patterns.
+
+    render() is the per-recipient hot path: one str.format per text and a fresh, minimal
+    components list, with no regex work or dict lookups by placeholder name.
+    """
+
+    __slots__ = ('content', 'body_pattern', 'body_count', 'header_pattern', 'header_count')
+
+    def __init__(self, content, header_text=None):
+        self.content = content or ''
+        self.body_pattern, self.body_count = _compile_text(self.content)
+        self.header_pattern, self.header_count = _compile_text(header_text)
+
+    @property
+    def param_count(self):
+        """Values each recipient must supply: header placeholders first, then body"""
+        return self.header_count + self.body_count
+
+    def render(self, values=()):
+        """(Graph `components` list or None, content to store) for one recipient's values"""
+        if len(values) < self.param_count:
+            raise MissingParameters(f"Template needs {self.param_count} parameters, got {len(values)}")
+        if not self.param_count:
+            return None, self.content
+
+        components = []
+        header_values = values[:self.header_count]
+        body_values = values[self.header_count:self.param_count]
+        if self.header_count:
+            components.append({
+                'type': 'header',
+                'parameters': [{'type': 'text', 'text': value} for value in header_values],
+            })
+        if self.body_count:
+            components.append({
+                'type': 'body',
+                'parameters': [{'type': 'text', 'text': value} for value in body_values],
+            })
+            content = self.body_pattern.format(*body_values)
+        else:
+            content = self.content
+        return components, content
+
+    def body_values(self, values):
+        """The body's share of a recipient's values, as stored with the message"""
+        return list(values[self.header_count:self.param_count])
+
+
+@lru_cache(maxsize=1024)
+def _compiled(template_id, content, header_text):
+    return CompiledTemplate(content, header_text)
+
+
+@lru_cache(maxsize=1024)
+def _body(content):
+    return _compile_text(content)
+
+
+def render_body(content, values=()):
+    """A template body with its {{n}} placeholders filled from values; the body as-is if short of values"""
+    pattern, count = _body(content)
+    if not pattern or len(values) < count:
+        return content
+    return pattern.format(*values)
+
+
+@lru_cache(maxsize=1024)
+def _body_regex(content):
+    parts, seen = [], set()
+    position = 0
+    for match in PLACEHOLDER.finditer(content):
+        parts.append(re.escape(content[position:match.start()]))
+        number = int(match.group(1))
+        parts.append(f'(?P=p{number})' if number in seen else f'(?P<p{number}>.*?)')
+        seen.add(number)
+        position = match.end()
+    parts.append(re.escape(content[position:]))
+    return re.compile(''.join(parts), re.DOTALL), max(seen) if seen else 0
+
+
+def match_body(content, text):
+    """Recover the values a rendered body was filled with: [value for {{1}}, {{2}}, ...], or None
+    if `text` isn't this body rendered"""
+    if not content or text is None:
+        return None
+    regex, count = _body_regex(content)
+    match = regex.fullmatch(text)
+    if not match:
+        return None
+    return [match.group(f'p{n}') if f'p{n}' in regex.groupindex else '' for n in range(1, count + 1)]
+
+
+def compile_template(template):
+    """Compiled renderer for a Template (or snapshot), cached per id and text"""
+    header_text = template.header_text if getattr(template, 'header_type', None) == 'TEXT' else None
+    return _compiled(template.id, template.content, header_text)
+
+
+def bind_columns(header, param_count):
+    """CSV column index for each parameter, in render() order.
+
+    Columns after the phone number bind to {{1}}, {{2}}, ... in order, unless the header row names
+    them explicitly as `{{n}}` or `n`. Placeholders a header leaves unnamed take the columns it
+    doesn't name, in order, so no column is bound twice.
+    """
+    named, taken = {}, set()
+    for index, name in enumerate(header or []):
+        match = PLACEHOLDER.fullmatch(name.strip()) or re.fullmatch(r'\d+', name.strip())
+        if match and index > 0:
+            named.setdefault(int(match.group(1) if match.groups() else match.group(0)), index)
+            taken.add(index)
+    free = (index for index in itertools.count(1) if index not in taken)
+    return [named[n] if n in named else next(free) for n in range(1, param_count + 1)]
+
+
+def row_values(row, columns):
+    """The stripped parameter values for one CSV row; empty cells count as missing"""
+    values = []
+    for column in columns:
+        value = row[column].strip() if column < len(row) else ''
+        if not value:
+            raise MissingParameters(f"Column {column + 1} is empty")
+        values.append(value)
+    return values
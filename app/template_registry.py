@@ -0,0 +1,93 @@
+import logging
+from app.cache import CacheStats, LocalBackend, snapshot
+from app.models import Template
+from app.signals import template_status_changed
+
+# Create logger for the template registry
+logger = logging.getLogger(__name__)
+
+
+class UserTemplates:
+    """One user's approved templates, indexed by id and by (name, language)"""
+
+    __slots__ = ('approved', 'by_id', 'by_key', 'by_name')
+
+    def __init__(self, templates):
+        self.approved = templates
+        self.by_id = {t.id: t for t in templates}
+        self.by_key = {(t.name, t.language): t for t in templates}
+        self.by_name = {}
+        for t in templates:
+            self.by_name.setdefault(t.name, t)
+
+    def find(self, name, language=None):
+        """Template by name (and language when given), or None"""
+        if language is not None:
+            return self.by_key.get((name, language))
+        return self.by_name.get(name)
+
+    def get(self, template_id):
+        try:
+            return self.by_id.get(int(template_id))
+        except (TypeError, ValueError):
+            return None
+
+    def __len__(self):
+        return len(self.approved)
+
+    def __iter__(self):
+        return iter(self.approved)
+
+
+class TemplateRegistry:
+    """Per-process registry of approved templates.
+
+    Entries are dropped when template_status_changed fires for the user (Meta webhook, admin
+    approve/reject, starter templates); other processes pick the change up within TEMPLATE_REGISTRY_TTL.
+    """
+
+    def __init__(self, app=None):
+        self.stats = CacheStats()
+        self.backend = LocalBackend(self.stats)
+        self.ttl = 300
+        self._connected = False
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.ttl = app.config.get('TEMPLATE_REGISTRY_TTL', 300)
+        self.backend = LocalBackend(self.stats, app.config.get('TEMPLATE_REGISTRY_MAX_USERS', 10000))
+        if not self._connected:
+            template_status_changed.connect(self._on_template_status_changed, weak=False)
+            self._connected = True
+        app.extensions['template_registry'] = self
+
+    def for_user(self, user_id):
+        found, templates = self.backend.get(user_id)
+        if found:
+            self.stats.incr('hits')
+            return templates
+        self.stats.incr('misses')
+        templates = UserTemplates([
+            snapshot(t) for t in Template.query.filter_by(user_id=user_id, status='Approved').all()
+        ])
+        self.backend.set(user_id, templates, self.ttl)
+        self.stats.incr('sets')
+        return templates
+
+    def invalidate(self, user_id):
+        self.backend.delete(user_id)
+        self.stats.incr('invalidations')
+
+    def _on_template_status_changed(self, sender, user_id=None, **extra):
+        if user_id is not None:
+            self.invalidate(user_id)
+            logger.info(f"📋 Template registry invalidated for user {user_id}")
+
+    def stats_dict(self):
+        stats = self.stats.as_dict()
+        stats['entries'] = self.backend.size()
+        return stats
+
+
+template_registry = TemplateRegistry()
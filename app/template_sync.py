@@ -0,0 +1,173 @@
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
+from flask import current_app
+from sqlalchemy import update
+from app import db, graph_api
+from app.models import User, Template
+from app.signals import template_status_changed
+
+# Create logger for template sync
+logger = logging.getLogger(__name__)
+
+GRAPH_URL = "https://graph.facebook.com/v19.0"
+TEMPLATE_FIELDS = 'id,name,language,status'
+
+# Meta template status -> local Template.status (statuses not listed are left alone)
+META_STATUSES = {
+    'APPROVED': 'Approved',
+    'REJECTED': 'Rejected',
+    'DISABLED': 'Rejected',
+    'PENDING': 'Pending',
+    'IN_APPEAL': 'Pending',
+}
+
+
+class SyncResult:
+    """Counters for one sync run"""
+
+    def __init__(self):
+        self.tenants = 0
+        self.failed = 0
+        self.fetched = 0
+        self.updated = 0
+        self.unmatched = 0
+        self.elapsed = 0.0
+
+    def __str__(self):
+        return (f"{self.tenants} tenants ({self.failed} failed), {self.fetched} templates fetched, "
+                f"{self.updated} updated, {self.unmatched} not found locally in {self.elapsed:.1f}s")
+
+
+def _session(workers):
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=workers)
+    session.mount('https://', adapter)
+    return session
+
+
+def fetch_templates(session, waba_id, access_token, page_size, timeout):
+    """Every template on a WABA, following Graph paging cursors, with only the fields we diff on"""
+    url = f"{GRAPH_URL}/{waba_id}/message_templates"
+    params = {'fields': TEMPLATE_FIELDS, 'limit': page_size}
+    headers = {'Authorization': f'Bearer {access_token}'}
+    templates = []
+    while url:
+        response = graph_api.get(url, session=session, params=params, headers=headers, timeout=timeout)
+        response.raise_for_status()
+        body = response.json()
+        templates.extend(body.get('data', []))
+        # The `next` link already carries fields, limit and the after cursor
+        url = body.get('paging', {}).get('next')
+        params = None
+    return templates
+
+
+def diff_templates(local_rows, remote):
+    """Bulk-update mappings for local templates whose status (or missing Meta id) differs from Meta.
+
+    Rows are matched on meta_template_id first, then on (name, language) for templates created
+    before the id was stored. Returns (mappings, unmatched remote count).
+    """
+    by_meta_id = {row.meta_template_id: row for row in local_rows if row.meta_template_id}
+    by_key = {(row.name, row.language): row for row in local_rows}
+    mappings = []
+    unmatched = 0
+    for item in remote:
+        row = by_meta_id.get(item.get('id')) or by_key.get((item.get('name'), item.get('language')))
+        if row is None:
+            unmatched += 1
+            continue
+        changes = {}
+        status = META_STATUSES.get(item.get('status'))
+        if status and status != row.status:
+            changes['status'] = status
+        if not row.meta_template_id and item.get('id'):
+            changes['meta_template_id'] = item['id']
+        if changes:
+            changes['id'] = row.id
+            mappings.append(changes)
+    return mappings, unmatched
+
+
+def _tenants(user_id=None):
+    query = db.session.query(User.id, User.waba_id, User.whatsapp_access_token).filter(
+        User.waba_id.isnot(None), User.whatsapp_access_token.isnot(None)
+    )
+    if user_id is not None:
+        query = query.filter(User.id == user_id)
+    return query.order_by(User.id).all()
+
+
+def _apply(fetched, result):
+    """Diff one chunk of tenants against their local templates and write the changes in one UPDATE"""
+    user_ids = list(fetched)
+    local = {}
+    for row in db.session.query(Template.id, Template.user_id, Template.name, Template.language,
+                                Template.status, Template.meta_template_id)\
+            .filter(Template.user_id.in_(user_ids)).all():
+        local.setdefault(row.user_id, []).append(row)
+
+    mappings = []
+    changed_users = []
+    for user_id, remote in fetched.items():
+        user_mappings, unmatched = diff_templates(local.get(user_id, []), remote)
+        result.unmatched += unmatched
+        if user_mappings:
+            mappings.extend(user_mappings)
+            changed_users.append(user_id)
+
+    if mappings:
+        db.session.execute(update(Template), mappings)
+        db.session.commit()
+        result.updated += len(mappings)
+        for user_id in changed_users:
+            template_status_changed.send(user_id=user_id)
+
+
+def sync_templates(user_id=None, workers=None, page_size=None, chunk_size=None):
+    """Reconcile local template status with Meta for every connected WABA.
+
+    Graph calls run concurrently across tenants on a thread pool (network only, no DB work in the
+    threads); each chunk of tenants is then diffed against a single query of local rows and written
+    back with one bulk UPDATE, so unchanged templates are never touched.
+    """
+    config = current_app.config
+    workers = workers or config['TEMPLATE_SYNC_WORKERS']
+    page_size = page_size or config['TEMPLATE_SYNC_PAGE_SIZE']
+    chunk_size = chunk_size or config['TEMPLATE_SYNC_CHUNK_SIZE']
+    timeout = config['TEMPLATE_SYNC_TIMEOUT']
+
+    result = SyncResult()
+    started = time.monotonic()
+    tenants = _tenants(user_id)
+    session = _session(workers)
+
+    def fetch(tenant):
+        try:
+            return tenant, fetch_templates(session, tenant.waba_id, tenant.whatsapp_access_token,
+                                           page_size, timeout)
+        except (requests.RequestException, ValueError) as e:
+            logger.warning(f"⚠️ Template sync failed for user {tenant.id} (WABA {tenant.waba_id}): {e}")
+            return tenant, None
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for start in range(0, len(tenants), chunk_size):
+            chunk = tenants[start:start + chunk_size]
+            fetched = {}
+            for tenant, remote in pool.map(fetch, chunk):
+                result.tenants += 1
+                if remote is None:
+                    result.failed += 1
+                    continue
+                result.fetched += len(remote)
+                fetched[tenant.id] = remote
+            if fetched:
+                _apply(fetched, result)
+
+    session.close()
+    result.elapsed = time.monotonic() - started
+    logger.info(f"🔄 Template sync finished: {result}")
+    return result
@@ -0,0 +1,123 @@
+import hashlib
+import logging
+import os
+import tempfile
+from collections import namedtuple
+from flask import current_app
+
+# Create logger for document upload storage
+logger = logging.getLogger(__name__)
+
+# Layout: <UPLOAD_FOLDER>/objects/<ab>/<cd>/<sha256>, named by content so identical files are stored
+# once whoever uploads them. Partial uploads stream into <UPLOAD_FOLDER>/tmp and are renamed into
+# place, so an object path only ever holds a complete file.
+OBJECTS_DIR = 'objects'
+TMP_DIR = 'tmp'
+
+# Leading bytes of the document types ALLOWED_EXTENSIONS lets through
+MAGIC_BYTES = (
+    (b'%PDF-', 'pdf'),
+    (b'\x89PNG\r\n\x1a\n', 'png'),
+    (b'\xff\xd8\xff', 'jpg'),
+)
+
+StoredFile = namedtuple('StoredFile', 'sha256 size kind path deduplicated')
+
+
+class InvalidUpload(ValueError):
+    """The upload is empty or its content is not an allowed document type"""
+
+
+def sniff(head):
+    """Document type from the first bytes of a file, or None"""
+    for magic, kind in MAGIC_BYTES:
+        if head.startswith(magic):
+            return kind
+    return None
+
+
+def _root():
+    return current_app.config['UPLOAD_FOLDER']
+
+
+def object_path(sha256):
+    return os.path.join(_root(), OBJECTS_DIR, sha256[:2], sha256[2:4], sha256)
+
+
+def path_for(upload):
+    """Where an Upload's bytes live; rows from before content addressing sit flat in UPLOAD_FOLDER"""
+    if upload.sha256:
+        return object_path(upload.sha256)
+    return os.path.join(_root(), upload.filename)
+
+
+def store(stream):
+    """Stream a file object into the store, hashing as it goes; returns a StoredFile.
+
+    Only the first chunk is checked against MAGIC_BYTES; a file that is already stored is not
+    written again.
+    """
+    chunk_size = current_app.config.get('UPLOAD_CHUNK_SIZE', 64 * 1024)
+    head = stream.read(chunk_size)
+    if not head:
+        raise InvalidUpload('Empty file')
+    kind = sniff(head)
+    allowed = current_app.config['ALLOWED_EXTENSIONS']
+    if kind is None or not (kind in allowed or (kind == 'jpg' and 'jpeg' in allowed)):
+        raise InvalidUpload('Only PDF, PNG and JPEG documents are accepted')
+
+    tmp_dir = os.path.join(_root(), TMP_DIR)
+    os.makedirs(tmp_dir, exist_ok=True)
+    digest = hashlib.sha256()
+    size = 0
+    fd, tmp_path = tempfile.mkstemp(dir=tmp_dir)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            chunk = head
+            while chunk:
+                digest.update(chunk)
+                size += len(chunk)
+                f.write(chunk)
+                chunk = stream.read(chunk_size)
+            f.flush()
+            os.fsync(f.fileno())
+
+        sha256 = digest.hexdigest()
+        path = object_path(sha256)
+        if os.path.exists(path):
+            os.remove(tmp_path)
+            logger.info(f"📎 Upload deduplicated: {sha256[:12]} ({size} bytes)")
+            return StoredFile(sha256, size, kind, path, True)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    logger.info(f"📎 Upload stored: {sha256[:12]} ({size} bytes, {kind})")
+    return StoredFile(sha256, size, kind, path, False)
+
+
+def migrate_legacy(uploads):
+    """Move flat UPLOAD_FOLDER files into the store and stamp their rows; returns (moved, missing).
+
+    Flat files were named after the upload, so rows sharing a filename all get whichever file
+    won the overwrite; the caller commits.
+    """
+    moved = missing = 0
+    for upload in uploads:
+        legacy = path_for(upload)
+        if not os.path.isfile(legacy):
+            missing += 1
+            continue
+        with open(legacy, 'rb') as f:
+            try:
+                stored = store(f)
+            except InvalidUpload as e:
+                logger.warning(f"⚠️ Legacy upload {upload.id} ({upload.filename}) not migrated: {e}")
+                missing += 1
+                continue
+        upload.sha256 = stored.sha256
+        upload.size = stored.size
+        moved += 1
+    return moved, missing
@@ -0,0 +1,140 @@
+import logging
+from sqlalchemy import event
+from sqlalchemy.orm import Session, joinedload, make_transient_to_detached
+from sqlalchemy.orm.attributes import set_committed_value
+from app import db
+from app.cache import CacheStats, LocalBackend
+from app.entitlements import Entitlements
+from app.models import User, UserSubscription, SubscriptionPlan
+from app.signals import message_sent
+
+# Create logger for the user loader cache
+logger = logging.getLogger(__name__)
+
+
+def _columns(row):
+    return {column.key: getattr(row, column.key) for column in row.__table__.columns}
+
+
+def _detached(model, columns):
+    """A model instance that the session will treat as already loaded with these column values"""
+    instance = model(**columns)
+    make_transient_to_detached(instance)
+    return instance
+
+
+class UserCache:
+    """Per-process cache of the rows Flask-Login needs for every authenticated request.
+
+    A snapshot holds the user's columns plus their subscription and plan, loaded in one joined
+    query on a miss, and the Entitlements built from them. Hits are merged back into the request's session with load=False, so the view
+    gets a normal persistent User (writes to it still flush) without any SELECT. Entries are dropped
+    after a commit that touched the user, their subscription or any plan; other processes pick the
+    change up within USER_CACHE_TTL.
+    """
+
+    def __init__(self, app=None):
+        self.stats = CacheStats()
+        self.backend = LocalBackend(self.stats)
+        self.ttl = 30
+        self._connected = False
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.ttl = app.config.get('USER_CACHE_TTL', 30)
+        self.backend = LocalBackend(self.stats, app.config.get('USER_CACHE_MAX_USERS', 10000))
+        if not self._connected:
+            event.listen(Session, 'after_flush', self._after_flush)
+            event.listen(Session, 'after_commit', self._after_commit)
+            event.listen(Session, 'after_rollback', self._after_rollback)
+            # Quota reservations are a plain UPDATE the flush hooks don't see
+            message_sent.connect(self._on_message_sent, weak=False)
+            self._connected = True
+        app.extensions['user_cache'] = self
+
+    def load(self, user_id):
+        found, cached = self.backend.get(user_id)
+        if found:
+            self.stats.incr('hits')
+            return self._attach(cached)
+        self.stats.incr('misses')
+        user = User.query.options(
+            joinedload(User.subscription).joinedload(UserSubscription.plan)
+        ).filter_by(id=user_id).first()
+        if user is not None:
+            self.backend.set(user_id, self._snapshot(user), self.ttl)
+            self.stats.incr('sets')
+        return user
+
+    @staticmethod
+    def _snapshot(user):
+        subscription = user.subscription
+        plan = subscription.plan if subscription else None
+        return {
+            'user': _columns(user),
+            'subscription': _columns(subscription) if subscription else None,
+            'plan': _columns(plan) if plan else None,
+            'entitlements': user.entitlements,
+        }
+
+    @staticmethod
+    def _attach(cached):
+        user = _detached(User, cached['user'])
+        subscription = None
+        if cached['subscription']:
+            subscription = _detached(UserSubscription, cached['subscription'])
+            plan = _detached(SubscriptionPlan, cached['plan']) if cached['plan'] else None
+            set_committed_value(subscription, 'plan', plan)
+        set_committed_value(user, 'subscription', subscription)
+        user = db.session.merge(user, load=False)
+        user._entitlements = cached['entitlements']
+        return user
+
+    def invalidate(self, *user_ids):
+        self.backend.delete(*user_ids)
+        self.stats.incr('invalidations', len(user_ids))
+
+    def clear(self):
+        self.backend.clear()
+        self.stats.incr('invalidations')
+
+    def _after_flush(self, session, flush_context):
+        pending = session.info.setdefault('user_cache_invalidate', set())
+        for instance in list(session.dirty) + list(session.deleted) + list(session.new):
+            if isinstance(instance, User):
+                if instance in session.new:
+                    continue  # Nothing cached for a user that did not exist yet
+                pending.add(instance.id)
+            elif isinstance(instance, UserSubscription):
+                pending.add(instance.user_id)
+            elif isinstance(instance, SubscriptionPlan) and instance not in session.new:
+                pending.add(None)  # Plans are shared; drop everything
+
+    def _after_commit(self, session):
+        pending = session.info.pop('user_cache_invalidate', None)
+        if not pending:
+            return
+        # Users still in this session rebuild their Entitlements from the committed rows too
+        for key, instance in list(session.identity_map.items()):
+            if key[0] is User and (None in pending or key[1][0] in pending):
+                instance.__dict__.pop('_entitlements', None)
+        if None in pending:
+            self.clear()
+            logger.info("👤 User cache cleared after a plan change")
+        else:
+            self.invalidate(*pending)
+
+    def _on_message_sent(self, sender, user_id=None, **kwargs):
+        self.invalidate(user_id)
+
+    def _after_rollback(self, session):
+        session.info.pop('user_cache_invalidate', None)
+
+    def stats_dict(self):
+        stats = self.stats.as_dict()
+        stats['entries'] = self.backend.size()
+        return stats
+
+
+user_cache = UserCache()
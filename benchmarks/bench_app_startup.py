@@ -0,0 +1,81 @@
+"""Startup time and memory of the web app factory vs the worker app factory.
+
+    python benchmarks/bench_app_startup.py [--runs 7]
+
+Each run is a fresh interpreter that imports `app`, calls the factory and opens one database
+connection, which is what a scheduler or queue consumer pays on every start. Reported per factory
+are the median wall time of import + factory, the median peak RSS, the number of loaded modules,
+and whether flask_wtf or razorpay got imported. SQLite is used so the MySQL driver isn't needed.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+FACTORIES = ('create_app', 'create_worker_app')
+HEAVY = ('flask_wtf', 'wtforms', 'razorpay', 'flask_cors', 'app.forms', 'app.routes')
+
+CHILD = '''
+import json, logging, resource, sys, time
+started = time.perf_counter()
+sys.path.insert(0, {root!r})
+from config import Config
+Config.SQLALCHEMY_DATABASE_URI = {database_uri!r}
+Config.LOG_FILE = None
+Config.LOG_LEVEL = logging.ERROR
+import app
+application = getattr(app, {factory!r})()
+with application.app_context():
+    app.db.session.execute(app.db.text('SELECT 1'))
+elapsed = time.perf_counter() - started
+print('RESULT ' + json.dumps({{
+    'seconds': elapsed,
+    'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    'modules': len(sys.modules),
+    'heavy': sorted(name for name in {heavy!r} if name in sys.modules),
+}}))
+'''
+
+
+def run_once(factory, database_uri):
+    code = CHILD.format(root=ROOT, database_uri=database_uri, factory=factory, heavy=HEAVY)
+    output = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, cwd=ROOT)
+    lines = [line for line in output.stdout.splitlines() if line.startswith('RESULT ')]
+    if output.returncode or not lines:
+        sys.exit(f"{factory}: failed\n{output.stderr[-2000:]}")
+    return json.loads(lines[-1][len('RESULT '):])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=7)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database_uri = f"sqlite:///{os.path.join(tmp, 'startup.db')}"
+        results = {}
+        for factory in FACTORIES:
+            run_once(factory, database_uri)  # warm the filesystem and bytecode caches
+            runs = [run_once(factory, database_uri) for _ in range(args.runs)]
+            results[factory] = {
+                'ms': statistics.median(run['seconds'] for run in runs) * 1000,
+                'rss': statistics.median(run['peak_rss_mb'] for run in runs),
+                'modules': runs[-1]['modules'],
+                'heavy': runs[-1]['heavy'],
+            }
+
+    web = results['create_app']
+    print(f"{'factory':<18} {'startup ms':>11} {'peak RSS MB':>12} {'modules':>8}  heavy imports")
+    for factory, r in results.items():
+        print(f"{factory:<18} {r['ms']:>11.1f} {r['rss']:>12.1f} {r['modules']:>8}  {', '.join(r['heavy']) or '-'}")
+    worker = results['create_worker_app']
+    print(f"worker saves {web['ms'] - worker['ms']:.1f}ms ({1 - worker['ms'] / web['ms']:.0%}) "
+          f"and {web['rss'] - worker['rss']:.1f}MB ({1 - worker['rss'] / web['rss']:.0%}) per process")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,221 @@
+"""Campaign send throughput against a local fake Graph API.
+
+    python benchmarks/bench_bulk_send.py --messages 2000 --latency-ms 80 --latency-p99-ms 400 \\
+        --throttle-mps 80 --save baseline.json
+    python benchmarks/bench_bulk_send.py --messages 2000 --latency-ms 80 --latency-p99-ms 400 \\
+        --throttle-mps 80 --compare baseline.json
+
+Drives POST /bulk-messages (in --batch-size recipient batches), POST /inbox/send-quick-message and
+POST /api/send-message through the real app. Each scenario runs in its own process, against a
+fresh SQLite database unless --database-uri is given. Reported per scenario:
+
+- messages/second, counted over the whole run;
+- p50/p99 request latency (for bulk, one request sends a whole batch);
+- SQL statements per message;
+- peak RSS of the scenario process.
+
+With --compare, the run exits 1 when throughput drops, or statements per message or peak RSS grow,
+by more than --tolerance compared with the saved baseline.
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.dirname(__file__))
+
+import fake_graph  # noqa: E402
+
+SCENARIOS = ('bulk', 'quick', 'api')
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def make_app(database_uri, graph_url):
+    from config import Config
+    import logging
+    Config.SQLALCHEMY_DATABASE_URI = database_uri
+    Config.WTF_CSRF_ENABLED = False
+    Config.GRAPH_API_HOST = graph_url
+    Config.LOG_FILE = None
+    Config.LOG_LEVEL = logging.ERROR
+    Config.QUERY_SLOW_MS = 10 ** 6
+    Config.API_ROUTES_ENABLED = True  # the api scenario posts to /api/send-message
+    from app import create_app, db
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+    return app
+
+
+def seed(app):
+    from werkzeug.security import generate_password_hash
+    from app import db
+    from app.models import User, Template
+    with app.app_context():
+        user = User(email='bench@example.com', password=generate_password_hash('bench'), onboarding_status='Verified',
+                    phone_number_id='100000000000001', waba_id='200000000000001', whatsapp_access_token='bench-token',
+                    message_limit=10 ** 9, messages_sent_this_month=0)
+        db.session.add(user)
+        db.session.commit()
+        template = Template(user_id=user.id, name='bench_hello', language='en_US', content='Hello there!',
+                            status='Approved')
+        db.session.add(template)
+        db.session.commit()
+        return template.id
+
+
+def logged_in_client(app):
+    client = app.test_client()
+    client.post('/login', data={'email': 'bench@example.com', 'password': 'bench'})
+    return client
+
+
+def recipients(start, count):
+    return [f"91{9000000000 + i}" for i in range(start, start + count)]
+
+
+def run_scenario(name, args, graph_url):
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+
+    app = make_app(args.database_uri, graph_url)
+    template_id = seed(app)
+    numbers = recipients(0, args.messages)
+
+    if name == 'bulk':
+        batches = [numbers[i:i + args.batch_size] for i in range(0, len(numbers), args.batch_size)]
+
+        def send(client, batch):
+            return client.post('/bulk-messages', data={'template': 'bench_hello', 'recipients_text': '\n'.join(batch)})
+        work = batches
+    elif name == 'quick':
+        def send(client, number):
+            return client.post('/inbox/send-quick-message', json={'phone_number': number, 'template_id': template_id})
+        work = numbers
+    else:
+        def send(client, number):
+            return client.post('/api/send-message', json={'template_id': template_id, 'recipient': number})
+        work = numbers
+
+    clients = [logged_in_client(app) for _ in range(args.concurrency)]
+    statements = [0]
+    event.listen(Engine, 'before_cursor_execute', lambda *a: statements.__setitem__(0, statements[0] + 1))
+
+    latencies = []
+
+    def timed(index_item):
+        index, item = index_item
+        started = time.perf_counter()
+        response = send(clients[index % len(clients)], item)
+        latencies.append(time.perf_counter() - started)
+        return response.status_code
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        statuses = list(pool.map(timed, enumerate(work)))
+    elapsed = time.perf_counter() - started
+    measured_statements = statements[0]
+
+    from app import db
+    from app.models import MessageHistory
+    with app.app_context():
+        sent = MessageHistory.query.filter_by(status='sent').count()
+        failed = MessageHistory.query.filter_by(status='failed').count()
+
+    return {
+        'scenario': name,
+        'messages': args.messages,
+        'requests': len(work),
+        'http_errors': sum(1 for status in statuses if status >= 500),
+        'sent': sent,
+        'failed': failed,
+        'seconds': round(elapsed, 3),
+        'messages_per_second': round(args.messages / elapsed, 1),
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 1),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 1),
+        'statements_per_message': round(measured_statements / args.messages, 2),
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    for name, result in results.items():
+        before = baseline.get(name)
+        if not before:
+            continue
+        if result['messages_per_second'] < before['messages_per_second'] * (1 - tolerance):
+            regressions.append(f"{name}: {result['messages_per_second']} msg/s vs {before['messages_per_second']}")
+        if result['statements_per_message'] > before['statements_per_message'] * (1 + tolerance):
+            regressions.append(f"{name}: {result['statements_per_message']} statements/msg "
+                               f"vs {before['statements_per_message']}")
+        if result['peak_rss_mb'] > before['peak_rss_mb'] * (1 + tolerance):
+            regressions.append(f"{name}: peak RSS {result['peak_rss_mb']}MB vs {before['peak_rss_mb']}MB")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--messages', type=int, default=1000)
+    parser.add_argument('--batch-size', type=int, default=200, help='recipients per /bulk-messages request')
+    parser.add_argument('--concurrency', type=int, default=1,
+                        help='parallel clients (use a MySQL --database-uri above 1; SQLite serializes writers)')
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS))
+    parser.add_argument('--database-uri', default=None, help='default: a fresh SQLite file per scenario')
+    parser.add_argument('--save', help='write results to this JSON file')
+    parser.add_argument('--compare', help='baseline JSON from an earlier --save')
+    parser.add_argument('--tolerance', type=float, default=0.10)
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    parser.add_argument('--graph-url', help=argparse.SUPPRESS)
+    fake_graph.add_arguments(parser)
+    args = parser.parse_args()
+
+    if args.child:
+        print('RESULT ' + json.dumps(run_scenario(args.child, args, args.graph_url)))
+        return
+
+    server, graph_url = fake_graph.serve(fake_graph.from_arguments(args))
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in args.scenarios.split(','):
+            database_uri = args.database_uri or f"sqlite:///{os.path.join(tmp, name + '.db')}"
+            command = [sys.executable, os.path.abspath(__file__), *sys.argv[1:],
+                       '--child', name, '--graph-url', graph_url, '--database-uri', database_uri]
+            output = subprocess.run(command, capture_output=True, text=True, cwd=tmp)
+            lines = [line for line in output.stdout.splitlines() if line.startswith('RESULT ')]
+            if output.returncode or not lines:
+                print(f"{name}: failed\n{output.stderr[-2000:]}", file=sys.stderr)
+                sys.exit(2)
+            results[name] = json.loads(lines[-1][len('RESULT '):])
+    server.shutdown()
+
+    print(f"{'scenario':<8} {'msg/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'stmts/msg':>10} {'RSS MB':>8} {'sent':>6} {'failed':>6}")
+    for name, r in results.items():
+        print(f"{name:<8} {r['messages_per_second']:>8} {r['p50_ms']:>8} {r['p99_ms']:>8} "
+              f"{r['statements_per_message']:>10} {r['peak_rss_mb']:>8} {r['sent']:>6} {r['failed']:>6}")
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
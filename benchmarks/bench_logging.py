@@ -0,0 +1,111 @@
+"""Per-request logging overhead: synchronous basicConfig handlers vs the queue-based pipeline.
+
+    python benchmarks/bench_logging.py [--requests 20000]
+
+Each variant serves the same trivial view through Flask's test client, with stdout pointed at
+/dev/null and the file handler writing to a temp file, so the difference is the logging cost.
+Reported numbers are the best of three rounds.
+"""
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from flask import Flask, request  # noqa: E402
+from app import logging_setup  # noqa: E402
+
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+
+def make_app():
+    app = Flask(__name__)
+
+    @app.route('/ping')
+    def ping():
+        return 'ok'
+
+    return app
+
+
+def reset_logging():
+    logging_setup.stop_logging()
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+        handler.close()
+
+
+def sync_app(log_path):
+    """What create_app used to do: basicConfig with blocking handlers and two f-strings per request"""
+    logging.basicConfig(level=logging.INFO, format=LOG_FORMAT, force=True,
+                        handlers=[logging.StreamHandler(sys.stdout), logging.FileHandler(log_path)])
+    app = make_app()
+
+    @app.before_request
+    def log_request_info():
+        app.logger.info(f"📥 {request.method} {request.url} - IP: {request.remote_addr}")
+
+    @app.after_request
+    def log_response_info(response):
+        app.logger.info(f"📤 Response: {response.status_code} for {request.method} {request.url}")
+        return response
+
+    return app
+
+
+def queued_app(log_path, sample_rate):
+    app = make_app()
+    config = SimpleNamespace(LOG_JSON=True, LOG_FILE=log_path, LOG_LEVEL=logging.INFO, LOG_FORMAT=LOG_FORMAT)
+    logging_setup.configure_logging(SimpleNamespace(config=vars(config)))
+    app.config.update(ACCESS_LOG_SAMPLE_RATE=sample_rate, ACCESS_LOG_SAMPLING={}, ACCESS_LOG_SLOW_MS=1000)
+    logging_setup.register_access_log(app)
+    return app
+
+
+def run(label, app, count, baseline=None):
+    client = app.test_client()
+    for _ in range(200):  # warm up
+        client.get('/ping')
+    rounds = []
+    for _ in range(3):  # best of three, the test client is noisy
+        started = time.perf_counter()
+        for _ in range(count):
+            client.get('/ping')
+        rounds.append(time.perf_counter() - started)
+    per_request = min(rounds) / count * 1e6
+    extra = f"  (+{per_request - baseline:6.1f} µs logging)" if baseline is not None else ''
+    print(f"{label:<28} {per_request:8.1f} µs/request{extra}", file=sys.__stderr__)
+    return per_request
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=20000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp, open(os.devnull, 'w') as devnull:
+        sys.stdout = devnull
+        try:
+            reset_logging()
+            logging.getLogger().setLevel(logging.CRITICAL)
+            baseline = run('no logging', make_app(), args.requests)
+
+            reset_logging()
+            run('sync basicConfig', sync_app(os.path.join(tmp, 'sync.log')), args.requests, baseline)
+
+            for rate in (1.0, 0.1, 0.0):
+                reset_logging()
+                run(f'queue + JSON, sample {rate:g}', queued_app(os.path.join(tmp, f'q{rate}.log'), rate),
+                    args.requests, baseline)
+            reset_logging()
+        finally:
+            sys.stdout = sys.__stdout__
+
+
+if __name__ == '__main__':
+    main()
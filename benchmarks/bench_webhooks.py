@@ -0,0 +1,297 @@
+"""Webhook firehose: replay synthetic Meta webhooks at a target rate and measure ingest.
+
+    python benchmarks/bench_webhooks.py --messages 5000 --rate 500 --save baseline.json
+    python benchmarks/bench_webhooks.py --messages 5000 --rate 500 --compare baseline.json
+
+Seeds --messages sent MessageHistory rows, then builds the webhook traffic a campaign produces:
+a `delivered` status for each row, `read` for --read-rate of them and `failed` for --failed-rate,
+--inbound-rate inbound text messages per row and --template-events template status updates.
+Statuses go out in shuffled order, --statuses-per-payload to a POST, the way Meta batches them.
+
+Each target (/webhook/meta and /api/webhook/meta) runs in its own process against a fresh
+SQLite database, unless --database-uri is given. Payloads go out on an open-loop schedule of
+--rate payloads per second. A payload's lag is the time from its scheduled send to the end of
+its response, so lag keeps growing once ingest falls behind. Reported per target:
+
+- events/second, counted over the whole run;
+- p50/p99/max lag;
+- write amplification: INSERT/UPDATE/DELETE statements, rows written and commits per event.
+
+With --compare, the run exits 1 when events/second drops, or p99 lag or writes per event grow,
+by more than --tolerance compared with the saved baseline.
+"""
+import argparse
+import json
+import os
+import queue
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.dirname(__file__))
+
+from bench_bulk_send import make_app, percentile  # noqa: E402
+
+TARGETS = {'webhook': '/webhook/meta', 'api': '/api/webhook/meta'}
+PHONE_NUMBER_ID = '100000000000001'
+WABA_ID = '200000000000001'
+WRITE_VERBS = ('INSERT', 'UPDATE', 'DELETE', 'REPLACE')
+
+
+def seed(app, messages, templates):
+    """One verified user, `templates` Pending templates and `messages` sent rows; returns wamids"""
+    from datetime import datetime, timedelta
+    from sqlalchemy import insert
+    from werkzeug.security import generate_password_hash
+    from app import db
+    from app.models import MessageHistory, Template, TemplateVersion, User
+    with app.app_context():
+        user = User(email='bench@example.com', password=generate_password_hash('bench'), onboarding_status='Verified',
+                    phone_number_id=PHONE_NUMBER_ID, waba_id=WABA_ID, whatsapp_access_token='bench-token')
+        db.session.add(user)
+        db.session.flush()
+        rows = [Template(user_id=user.id, name=f"bench_{i}", language='en_US', content='Hello there!',
+                         status='Pending', meta_template_id=f"9{i:014d}") for i in range(max(templates, 1))]
+        db.session.add_all(rows)
+        db.session.flush()
+        version_id = TemplateVersion.id_for(rows[0].id, rows[0].content)
+        created_at = datetime.now() - timedelta(minutes=5)
+        wamids = [f"wamid.bench{i:012d}" for i in range(messages)]
+        for start in range(0, messages, 1000):
+            db.session.execute(insert(MessageHistory), [
+                {'user_id': user.id, 'recipient': f"91{9000000000 + i}", 'template_id': rows[0].id,
+                 'template_version_id': version_id, 'meta_message_id': wamids[i], 'status': 'sent',
+                 'created_at': created_at}
+                for i in range(start, min(start + 1000, messages))])
+        db.session.commit()
+        return wamids, [row.meta_template_id for row in rows][:templates]
+
+
+def envelope(value, field='messages'):
+    return {'object': 'whatsapp_business_account',
+            'entry': [{'id': WABA_ID, 'changes': [{'value': value, 'field': field}]}]}
+
+
+def metadata():
+    return {'display_phone_number': '919999900000', 'phone_number_id': PHONE_NUMBER_ID}
+
+
+def status_event(wamid, recipient, status, timestamp):
+    event = {'id': wamid, 'status': status, 'timestamp': str(timestamp), 'recipient_id': recipient}
+    if status == 'failed':
+        event['errors'] = [{'code': 131026, 'title': 'Message undeliverable'}]
+    else:
+        event['conversation'] = {'id': 'c0ffee' + wamid[-12:], 'origin': {'type': 'marketing'}}
+        event['pricing'] = {'billable': True, 'pricing_model': 'CBP', 'category': 'marketing'}
+    return event
+
+
+def inbound_event(recipient, index, timestamp):
+    return ({'profile': {'name': f"Customer {index}"}, 'wa_id': recipient},
+            {'from': recipient, 'id': f"wamid.inbound{index:012d}", 'timestamp': str(timestamp),
+             'type': 'text', 'text': {'body': 'STOP' if index % 50 == 0 else 'Thanks!'}})
+
+
+def build_payloads(wamids, template_ids, args):
+    """Webhook bodies in replay order, each with the number of events it carries"""
+    rng = random.Random(args.seed)
+    now = int(time.time())
+    recipients = {wamid: f"91{9000000000 + i}" for i, wamid in enumerate(wamids)}
+
+    delivered, read, failed = [], [], []
+    for wamid in wamids:
+        if rng.random() < args.failed_rate:
+            failed.append(wamid)
+        else:
+            delivered.append(wamid)
+            if rng.random() < args.read_rate:
+                read.append(wamid)
+    rng.shuffle(delivered)
+    rng.shuffle(read)
+    # DLRs first, reads trickle in behind them; failures are spread through the delivery burst
+    statuses = [(wamid, 'delivered') for wamid in delivered]
+    for wamid in failed:
+        statuses.insert(rng.randrange(len(statuses) + 1), (wamid, 'failed'))
+    statuses += [(wamid, 'read') for wamid in read]
+
+    payloads = []
+    size = args.statuses_per_payload
+    for start in range(0, len(statuses), size):
+        batch = statuses[start:start + size]
+        value = {'messaging_product': 'whatsapp', 'metadata': metadata(),
+                 'statuses': [status_event(wamid, recipients[wamid], status, now) for wamid, status in batch]}
+        payloads.append((envelope(value), len(batch)))
+
+    inbound = int(len(wamids) * args.inbound_rate)
+    for index in range(inbound):
+        contact, message = inbound_event(recipients[wamids[index % len(wamids)]], index, now)
+        value = {'messaging_product': 'whatsapp', 'metadata': metadata(), 'contacts': [contact], 'messages': [message]}
+        payloads.insert(rng.randrange(len(payloads) + 1), (envelope(value), 1))
+
+    for index, meta_template_id in enumerate(template_ids):
+        value = {'event': 'REJECTED' if index % 5 == 4 else 'APPROVED', 'message_template_id': meta_template_id,
+                 'message_template_name': f"bench_{index}", 'message_template_language': 'en_US', 'reason': None}
+        payloads.insert(rng.randrange(len(payloads) + 1), (envelope(value, 'message_template_status_update'), 1))
+    return payloads
+
+
+def run_target(name, args):
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+
+    app = make_app(args.database_uri, 'http://127.0.0.1:9')  # webhooks never call Graph
+    wamids, template_ids = seed(app, args.messages, args.template_events)
+    payloads = [(json.dumps(body), events) for body, events in build_payloads(wamids, template_ids, args)]
+    path = TARGETS[name]
+
+    counts = {'statements': 0, 'writes': 0, 'rows': 0, 'commits': 0}
+    lock = threading.Lock()
+
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        with lock:
+            counts['statements'] += 1
+            if statement.lstrip()[:7].upper().startswith(WRITE_VERBS):
+                counts['writes'] += 1
+                counts['rows'] += max(cursor.rowcount, 0)
+
+    def commit(conn):
+        with lock:
+            counts['commits'] += 1
+
+    event.listen(Engine, 'after_cursor_execute', after_cursor_execute)
+    event.listen(Engine, 'commit', commit)
+
+    interval = 1.0 / args.rate if args.rate else 0.0
+    work = queue.Queue()
+    for index, payload in enumerate(payloads):
+        work.put((index, payload))
+    lags, statuses = [], []
+    started = time.perf_counter()
+
+    def worker():
+        client = app.test_client()
+        while True:
+            try:
+                index, (body, _) = work.get_nowait()
+            except queue.Empty:
+                return
+            scheduled = started + index * interval
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            response = client.post(path, data=body, content_type='application/json')
+            lags.append(time.perf_counter() - scheduled)
+            statuses.append(response.status_code)
+
+    threads = [threading.Thread(target=worker) for _ in range(args.concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    from app import db
+    from app.models import MessageHistory
+    with app.app_context():
+        by_status = dict(db.session.query(MessageHistory.status, db.func.count(MessageHistory.id))
+                         .group_by(MessageHistory.status).all())
+
+    events = sum(count for _, count in payloads)
+    return {
+        'target': name,
+        'path': path,
+        'payloads': len(payloads),
+        'events': events,
+        'target_rate': args.rate,
+        'http_errors': sum(1 for status in statuses if status >= 400),
+        'seconds': round(elapsed, 3),
+        'events_per_second': round(events / elapsed, 1),
+        'payloads_per_second': round(len(payloads) / elapsed, 1),
+        'lag_p50_ms': round(percentile(lags, 0.50) * 1000, 1),
+        'lag_p99_ms': round(percentile(lags, 0.99) * 1000, 1),
+        'lag_max_ms': round(max(lags) * 1000, 1),
+        'statements_per_event': round(counts['statements'] / events, 2),
+        'writes_per_event': round(counts['writes'] / events, 2),
+        'rows_per_event': round(counts['rows'] / events, 2),
+        'commits_per_event': round(counts['commits'] / events, 2),
+        'message_statuses': by_status,
+    }
+
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    for name, result in results.items():
+        before = baseline.get(name)
+        if not before:
+            continue
+        if result['events_per_second'] < before['events_per_second'] * (1 - tolerance):
+            regressions.append(f"{name}: {result['events_per_second']} events/s vs {before['events_per_second']}")
+        if result['lag_p99_ms'] > before['lag_p99_ms'] * (1 + tolerance):
+            regressions.append(f"{name}: p99 lag {result['lag_p99_ms']}ms vs {before['lag_p99_ms']}ms")
+        if result['writes_per_event'] > before['writes_per_event'] * (1 + tolerance):
+            regressions.append(f"{name}: {result['writes_per_event']} writes/event vs {before['writes_per_event']}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--messages', type=int, default=2000, help='seeded MessageHistory rows')
+    parser.add_argument('--rate', type=float, default=500.0, help='payloads per second (0: as fast as possible)')
+    parser.add_argument('--statuses-per-payload', type=int, default=1)
+    parser.add_argument('--read-rate', type=float, default=0.6)
+    parser.add_argument('--failed-rate', type=float, default=0.02)
+    parser.add_argument('--inbound-rate', type=float, default=0.05, help='inbound messages per seeded row')
+    parser.add_argument('--template-events', type=int, default=20)
+    parser.add_argument('--concurrency', type=int, default=1,
+                        help='parallel senders (use a MySQL --database-uri above 1; SQLite serializes writers)')
+    parser.add_argument('--targets', default=','.join(TARGETS))
+    parser.add_argument('--database-uri', default=None, help='default: a fresh SQLite file per target')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--save', help='write results to this JSON file')
+    parser.add_argument('--compare', help='baseline JSON from an earlier --save')
+    parser.add_argument('--tolerance', type=float, default=0.10)
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print('RESULT ' + json.dumps(run_target(args.child, args)))
+        return
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in args.targets.split(','):
+            database_uri = args.database_uri or f"sqlite:///{os.path.join(tmp, name + '.db')}"
+            command = [sys.executable, os.path.abspath(__file__), *sys.argv[1:],
+                       '--child', name, '--database-uri', database_uri]
+            output = subprocess.run(command, capture_output=True, text=True, cwd=tmp)
+            lines = [line for line in output.stdout.splitlines() if line.startswith('RESULT ')]
+            if output.returncode or not lines:
+                print(f"{name}: failed\n{output.stderr[-2000:]}", file=sys.stderr)
+                sys.exit(2)
+            results[name] = json.loads(lines[-1][len('RESULT '):])
+
+    print(f"{'target':<8} {'events':>7} {'ev/s':>8} {'lag p50':>8} {'lag p99':>8} {'lag max':>8} "
+          f"{'stmts/ev':>9} {'writes/ev':>10} {'rows/ev':>8} {'commits/ev':>11} {'errors':>7}")
+    for name, r in results.items():
+        print(f"{name:<8} {r['events']:>7} {r['events_per_second']:>8} {r['lag_p50_ms']:>8} {r['lag_p99_ms']:>8} "
+              f"{r['lag_max_ms']:>8} {r['statements_per_event']:>9} {r['writes_per_event']:>10} "
+              f"{r['rows_per_event']:>8} {r['commits_per_event']:>11} {r['http_errors']:>7}")
+    print(f"(target rate {args.rate:g} payloads/s; lag in ms)")
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
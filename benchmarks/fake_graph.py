@@ -0,0 +1,189 @@
+"""Local stand-in for the Meta Graph API, for benchmarks.
+
+    python benchmarks/fake_graph.py --port 8765 --latency-ms 120 --latency-p99-ms 600 \\
+        --error-rate 0.01 --throttle-mps 80
+
+Serves POST /{version}/{phone_number_id}/messages and /media, GET and POST
+/{version}/{waba_id}/message_templates and GET /{version}/{id}/phone_numbers. Point the app at it with GRAPH_API_HOST=http://127.0.0.1:8765.
+
+Latency is log-normal with the given median and p99. Errors come back as Graph error bodies:
+--error-rate returns 131026 (undeliverable) and --server-error-rate returns 500, and each phone
+number gets a token bucket of --throttle-mps sends per second. Over the limit, the server answers
+with 130429, the same code Meta uses for throughput throttling.
+"""
+import argparse
+import json
+import math
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+Z_99 = 2.3263  # standard normal 99th percentile
+
+
+class FakeGraph:
+    def __init__(self, latency_ms=100.0, latency_p99_ms=None, error_rate=0.0, server_error_rate=0.0,
+                 throttle_mps=None, templates_per_waba=20, page_size=100, seed=None):
+        self.median = latency_ms / 1000
+        p99 = (latency_p99_ms or latency_ms) / 1000
+        self.sigma = math.log(p99 / self.median) / Z_99 if p99 > self.median > 0 else 0.0
+        self.error_rate = error_rate
+        self.server_error_rate = server_error_rate
+        self.throttle_mps = throttle_mps
+        self.templates_per_waba = templates_per_waba
+        self.page_size = page_size
+        self.random = random.Random(seed)
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self.counts = {'messages': 0, 'throttled': 0, 'errors': 0, 'templates': 0}
+
+    def latency(self):
+        if self.median <= 0:
+            return 0.0
+        with self._lock:
+            return self.median * math.exp(self.sigma * self.random.gauss(0, 1))
+
+    def _take_token(self, phone_number_id):
+        """Token bucket per phone number: throttle_mps tokens per second, one second of burst"""
+        if not self.throttle_mps:
+            return True
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(phone_number_id, (self.throttle_mps, now))
+            tokens = min(self.throttle_mps, tokens + (now - updated) * self.throttle_mps)
+            if tokens < 1:
+                self._buckets[phone_number_id] = (tokens, now)
+                return False
+            self._buckets[phone_number_id] = (tokens - 1, now)
+            return True
+
+    def _count(self, key):
+        with self._lock:
+            self.counts[key] += 1
+
+    def send_message(self, phone_number_id, body):
+        self._count('messages')
+        if not self._take_token(phone_number_id):
+            self._count('throttled')
+            return 400, graph_error(130429, 'Rate limit hit', 2494055)
+        roll = self.random.random()
+        if roll < self.server_error_rate:
+            self._count('errors')
+            return 500, graph_error(131000, 'Something went wrong')
+        if roll < self.server_error_rate + self.error_rate:
+            self._count('errors')
+            return 400, graph_error(131026, 'Message undeliverable')
+        return 200, {
+            'messaging_product': 'whatsapp',
+            'contacts': [{'input': body.get('to'), 'wa_id': body.get('to')}],
+            'messages': [{'id': f"wamid.{uuid.uuid4().hex}"}],
+        }
+
+    def list_templates(self, waba_id, after, limit):
+        self._count('templates')
+        start = int(after or 0)
+        limit = min(int(limit or self.page_size), self.page_size)
+        end = min(start + limit, self.templates_per_waba)
+        data = [{'id': f"{waba_id}-{i}", 'name': f"template_{i}", 'language': 'en_US', 'status': 'APPROVED'}
+                for i in range(start, end)]
+        body = {'data': data, 'paging': {'cursors': {'before': str(start), 'after': str(end)}}}
+        if end < self.templates_per_waba:
+            body['paging']['next'] = f"/v19.0/{waba_id}/message_templates?limit={limit}&after={end}"
+        return 200, body
+
+
+def graph_error(code, message, subcode=None):
+    error = {'message': message, 'type': 'OAuthException', 'code': code, 'fbtrace_id': uuid.uuid4().hex[:16]}
+    if subcode:
+        error['error_subcode'] = subcode
+    return {'error': error}
+
+
+def make_handler(graph):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'  # keep-alive, like graph.facebook.com
+        disable_nagle_algorithm = True  # headers and body go out as separate writes
+
+        def log_message(self, format, *args):
+            pass
+
+        def _reply(self, status, body):
+            payload = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def _route(self, method):
+            url = urlsplit(self.path)
+            parts = [part for part in url.path.split('/') if part]
+            if parts and parts[0].startswith('v'):
+                parts = parts[1:]
+            length = int(self.headers.get('Content-Length') or 0)
+            raw = self.rfile.read(length) if length else b''
+            time.sleep(graph.latency())
+            if len(parts) == 2 and parts[1] == 'messages' and method == 'POST':
+                return self._reply(*graph.send_message(parts[0], json.loads(raw or b'{}')))
+            if len(parts) == 2 and parts[1] == 'message_templates':
+                if method == 'GET':
+                    query = parse_qs(url.query)
+                    return self._reply(*graph.list_templates(parts[0], query.get('after', [None])[0],
+                                                             query.get('limit', [None])[0]))
+                return self._reply(200, {'id': uuid.uuid4().hex[:15], 'status': 'PENDING', 'category': 'UTILITY'})
+            if len(parts) == 2 and parts[1] == 'media' and method == 'POST':
+                return self._reply(200, {'id': str(uuid.uuid4().int)[:16]})
+            if len(parts) == 2 and parts[1] == 'phone_numbers':
+                return self._reply(200, {'data': [{'id': f"{parts[0]}-phone", 'display_phone_number': '+91 99999 00000'}]})
+            return self._reply(404, graph_error(803, f"Unknown path {url.path}"))
+
+        def do_GET(self):
+            self._route('GET')
+
+        def do_POST(self):
+            self._route('POST')
+
+    return Handler
+
+
+def serve(graph, host='127.0.0.1', port=0):
+    """Start the fake server on a daemon thread; returns (server, base URL)"""
+    server = ThreadingHTTPServer((host, port), make_handler(graph))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def add_arguments(parser):
+    parser.add_argument('--latency-ms', type=float, default=100.0, help='median Graph latency')
+    parser.add_argument('--latency-p99-ms', type=float, default=None, help='p99 Graph latency (default: median)')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='share of sends rejected with 131026')
+    parser.add_argument('--server-error-rate', type=float, default=0.0, help='share of sends failing with 500')
+    parser.add_argument('--throttle-mps', type=float, default=None, help='per-phone sends/second before 130429')
+    parser.add_argument('--seed', type=int, default=None)
+
+
+def from_arguments(args):
+    return FakeGraph(latency_ms=args.latency_ms, latency_p99_ms=args.latency_p99_ms, error_rate=args.error_rate,
+                     server_error_rate=args.server_error_rate, throttle_mps=args.throttle_mps, seed=args.seed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    add_arguments(parser)
+    args = parser.parse_args()
+    server, url = serve(from_arguments(args), args.host, args.port)
+    print(f"Fake Graph API listening on {url} (Ctrl+C to stop)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
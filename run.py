@@ -1,16 +1,7 @@
 import logging
 from app import create_app
 
-# Simple logging setup
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(),
-        logging.FileHandler('app.log')
-    ]
-)
-
+# Logging is configured by create_app (queue-based, see app/logging_setup.py)
 app = create_app()
 
 if __name__ == "__main__":
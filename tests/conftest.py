@@ -0,0 +1,88 @@
+import json
+import logging
+import os
+import sys
+from unittest import mock
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+
+class GraphResponse:
+    def __init__(self, status_code, body):
+        self.status_code = status_code
+        self._body = body
+        self.text = json.dumps(body)
+
+    def json(self):
+        return self._body
+
+
+def pytest_configure(config):
+    config.addinivalue_line('markers', 'api_routes: register the /api blueprint (API_ROUTES_ENABLED)')
+
+
+@pytest.fixture
+def app(request, tmp_path, monkeypatch):
+    from config import Config
+    monkeypatch.setattr(Config, 'SQLALCHEMY_DATABASE_URI', f"sqlite:///{tmp_path / 'test.db'}")
+    monkeypatch.setattr(Config, 'WTF_CSRF_ENABLED', False, raising=False)
+    monkeypatch.setattr(Config, 'LOG_FILE', None)
+    monkeypatch.setattr(Config, 'LOG_LEVEL', logging.ERROR)
+    monkeypatch.setattr(Config, 'ARCHIVE_FOLDER', str(tmp_path / 'archive'))
+    monkeypatch.setattr(Config, 'ARCHIVE_BATCH_PAUSE', 0)
+    monkeypatch.setattr(Config, 'UPLOAD_FOLDER', str(tmp_path / 'uploads'))
+    monkeypatch.setattr(Config, 'API_ROUTES_ENABLED', request.node.get_closest_marker('api_routes') is not None)
+    from app import create_app, db
+    from app.models import TemplateVersion
+    monkeypatch.setattr(TemplateVersion, '_ids', {})
+    app = create_app()
+    app.config['TESTING'] = True
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+
+
+@pytest.fixture
+def user(app):
+    from werkzeug.security import generate_password_hash
+    from app import db
+    from app.models import User
+    user = User(email='owner@example.com', password=generate_password_hash('secret'), onboarding_status='Verified',
+                phone_number_id='100000000000001', waba_id='200000000000001', whatsapp_access_token='token',
+                message_limit=1000, messages_sent_this_month=0)
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+
+@pytest.fixture
+def template(user):
+    from app import db
+    from app.models import Template
+    template = Template(user_id=user.id, name='hello', language='en_US', content='Hi {{1}}', status='Approved')
+    db.session.add(template)
+    db.session.commit()
+    return template
+
+
+@pytest.fixture
+def client(app, user):
+    client = app.test_client()
+    client.post('/login', data={'email': 'owner@example.com', 'password': 'secret'})
+    return client
+
+
+@pytest.fixture
+def graph():
+    """Fake Graph API: every call succeeds; the calls made are kept in the returned list"""
+    calls = []
+
+    def request(session, method, url, **kwargs):
+        calls.append((method, url, kwargs))
+        return GraphResponse(200, {'messages': [{'id': f"wamid.{len(calls)}"}]})
+
+    with mock.patch('requests.Session.request', request):
+        yield calls
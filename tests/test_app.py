@@ -0,0 +1,17 @@
+import pytest
+
+
+def test_api_routes_are_off_by_default(app):
+    assert 'api' not in app.blueprints
+    assert app.test_client().get('/api/webhook/meta?hub.mode=subscribe&hub.verify_token=12345').status_code == 404
+
+
+@pytest.mark.api_routes
+def test_api_routes_can_be_enabled(app):
+    assert 'api' in app.blueprints
+
+
+def test_login_required_redirects_to_login_page(app):
+    response = app.test_client().get('/dashboard')
+    assert response.status_code == 302
+    assert response.headers['Location'].startswith('/login')
@@ -0,0 +1,151 @@
+import json
+import os
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import archive, db
+from app.models import MessageHistory, TemplateVersion
+
+
+@pytest.fixture
+def old_messages(user, template):
+    """Seven messages spread over three months, all well past ARCHIVE_AFTER_DAYS"""
+    version_id = TemplateVersion.id_for(template.id, template.content)
+    start = datetime.now().replace(microsecond=0) - timedelta(days=400)
+    messages = [MessageHistory(user_id=user.id, recipient=f"91900000000{i}", template_id=template.id,
+                               template_version_id=version_id, params=json.dumps([f"n{i}"]), status='sent',
+                               created_at=start + timedelta(days=i * 12))
+                for i in range(7)]
+    db.session.add_all(messages)
+    db.session.commit()
+    return [m.id for m in messages]
+
+
+class Crash(Exception):
+    pass
+
+
+def crash_after(monkeypatch, name, calls):
+    """Make archive.<name> raise Crash once it has run `calls` times"""
+    real = getattr(archive, name)
+    count = [0]
+
+    def wrapper(*args, **kwargs):
+        if count[0] == calls:
+            raise Crash()
+        count[0] += 1
+        return real(*args, **kwargs)
+
+    monkeypatch.setattr(archive, name, wrapper)
+    return lambda: monkeypatch.setattr(archive, name, real)
+
+
+def archived_ids(user_id):
+    return [record['id'] for record in archive.iter_archived_records(user_id)]
+
+
+def test_archive_moves_rows_to_monthly_files(app, user, old_messages):
+    archived, deleted = archive.archive_old_messages(batch_size=3)
+    assert (archived, deleted) == (7, 7)
+    assert MessageHistory.query.count() == 0
+    assert archived_ids(user.id) == old_messages
+    assert archive.archived_count(user.id) == 7
+    record = next(archive.iter_archived_records(user.id))
+    assert record['message_content'] == 'Hi n0'
+    assert record['recipient'] == '919000000000'
+
+
+@pytest.fixture
+def partitioned(monkeypatch):
+    """Pretend message_history is partitioned; dropping a partition deletes its rows"""
+    drops = []
+
+    def drop_partitions_before(cutoff):
+        drops.append(cutoff)
+        rows = MessageHistory.query.filter(MessageHistory.created_at < cutoff).delete()
+        db.session.commit()
+        return [], rows
+
+    monkeypatch.setattr(archive, 'is_partitioned', lambda: True)
+    monkeypatch.setattr(archive, 'drop_partitions_before', drop_partitions_before)
+    return drops
+
+
+def test_partitions_are_not_dropped_before_an_interrupted_run_completes(app, user, old_messages,
+                                                                       partitioned, monkeypatch):
+    restore = crash_after(monkeypatch, '_fetch_batch', 1)
+    with pytest.raises(Crash):
+        archive.archive_old_messages(batch_size=2)
+    restore()
+    assert partitioned == []
+    assert MessageHistory.query.count() == 7
+
+    archived, deleted = archive.archive_old_messages(batch_size=2)
+    assert archived == 5
+    assert len(partitioned) == 1
+    assert MessageHistory.query.count() == 0
+    assert archived_ids(user.id) == old_messages
+
+
+@pytest.mark.parametrize('name, calls', [
+    ('_append_month', 1),  # after the first month file of the batch
+    ('_write_json', 2),  # after the files and manifest, before the state advances
+])
+def test_interrupted_batch_is_not_archived_twice(app, user, old_messages, monkeypatch, name, calls):
+    restore = crash_after(monkeypatch, name, calls)
+    with pytest.raises(Crash):
+        archive.archive_old_messages(batch_size=10)
+    restore()
+
+    archive.archive_old_messages(batch_size=10)
+    assert archived_ids(user.id) == old_messages
+    assert archive.archived_count(user.id) == 7
+    state = json.load(open(os.path.join(app.config['ARCHIVE_FOLDER'], archive.STATE_FILE)))
+    assert 'pending' not in state and state['complete']
+
+
+def test_a_later_cutoff_archives_rows_an_earlier_run_passed_over(app, user, template):
+    """created_at doesn't follow id: a low-id row that was too new last time must be written out, not just deleted"""
+    version_id = TemplateVersion.id_for(template.id, template.content)
+    now = datetime.now().replace(microsecond=0)
+    rows = [MessageHistory(user_id=user.id, recipient=f"91900000000{i}", template_id=template.id,
+                           template_version_id=version_id, status='sent', created_at=now - timedelta(days=age))
+            for i, age in enumerate([50, 400, 390])]
+    db.session.add_all(rows)
+    db.session.commit()
+    straggler, *old = [row.id for row in rows]
+
+    assert archive.archive_old_messages(older_than_days=100) == (2, 2)
+    assert archive.archive_old_messages(older_than_days=10) == (1, 1)
+    assert MessageHistory.query.count() == 0
+    assert sorted(archived_ids(user.id)) == sorted(old + [straggler])
+
+
+def test_resumed_run_deletes_only_what_it_archived(app, user, old_messages, monkeypatch):
+    restore = crash_after(monkeypatch, '_delete_ids', 0)
+    with pytest.raises(Crash):
+        archive.archive_old_messages(batch_size=3)
+    restore()
+    assert MessageHistory.query.count() == 7
+
+    # The interrupted run is finished under its own cutoff before the new one runs
+    archived, deleted = archive.archive_old_messages(batch_size=3)
+    assert (archived, deleted) == (4, 7)
+    assert archived_ids(user.id) == old_messages
+
+
+def test_archived_pages_are_newest_first(app, user, old_messages):
+    archive.archive_old_messages(batch_size=3)
+    newest_first = old_messages[::-1]
+    for offset in range(0, 8):
+        for limit in (1, 2, 5):
+            page = archive._archived_page(user.id, offset, limit)
+            assert [item.id for item in page] == newest_first[offset:offset + limit]
+
+
+def test_message_history_pages_into_the_archive(app, client, user, old_messages):
+    archive.archive_old_messages(batch_size=3)
+    response = client.get('/message-history')
+    assert response.status_code == 200
+    assert b'919000000006' in response.data
@@ -0,0 +1,87 @@
+from app import db
+from app import cache as cache_module
+from app.cache import ANALYTICS, DASHBOARD, INBOX, CacheStats, LocalBackend, cache
+from app.models import Template
+from app.signals import message_sent, message_status_changed, template_status_changed
+from app.template_registry import template_registry
+
+
+class Loader:
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return {'call': self.calls}
+
+
+def test_local_backend_evicts_least_recently_used():
+    stats = CacheStats()
+    backend = LocalBackend(stats, max_entries=2)
+    backend.set('a', 1, 60)
+    backend.set('b', 2, 60)
+    assert backend.get('a') == (True, 1)  # 'a' is now the most recently used
+    backend.set('c', 3, 60)
+    assert backend.get('b') == (False, None)
+    assert backend.get('a') == (True, 1) and backend.get('c') == (True, 3)
+    assert stats.as_dict()['evictions'] == 1
+
+
+def test_local_backend_expires_entries(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache_module.time, 'monotonic', lambda: now[0])
+    stats = CacheStats()
+    backend = LocalBackend(stats)
+    backend.set('a', 1, 10)
+    now[0] += 9
+    assert backend.get('a') == (True, 1)
+    now[0] += 1
+    assert backend.get('a') == (False, None)
+    assert backend.size() == 0
+    assert stats.as_dict()['expirations'] == 1
+
+
+def test_get_or_load_computes_once_per_tenant(app):
+    loader = Loader()
+    before = cache.stats.as_dict()
+    assert cache.get_or_load(1, DASHBOARD, loader) == {'call': 1}
+    assert cache.get_or_load(1, DASHBOARD, loader) == {'call': 1}
+    assert cache.get_or_load(2, DASHBOARD, loader) == {'call': 2}
+    stats = cache.stats_dict()
+    assert (stats['hits'] - before['hits'], stats['misses'] - before['misses'], stats['entries']) == (1, 2, 2)
+
+
+def test_message_signals_drop_only_that_tenants_results(app):
+    for signal in (message_sent, message_status_changed):
+        cache.backend.clear()
+        loaders = {(user_id, name): Loader() for user_id in (1, 2) for name in (DASHBOARD, ANALYTICS, INBOX)}
+        for (user_id, name), loader in loaders.items():
+            cache.get_or_load(user_id, name, loader)
+
+        signal.send(user_id=1)
+        for (user_id, name), loader in loaders.items():
+            cache.get_or_load(user_id, name, loader)
+            assert loader.calls == (2 if user_id == 1 else 1), (signal.name, user_id, name)
+
+
+def test_template_status_changed_reloads_approved_templates(app, user):
+    pending = Template(user_id=user.id, name='promo', language='en_US', content='Sale', status='Pending')
+    db.session.add(pending)
+    db.session.commit()
+    assert len(template_registry.for_user(user.id)) == 0
+
+    pending.status = 'Approved'
+    db.session.commit()
+    assert len(template_registry.for_user(user.id)) == 0  # still cached
+    template_status_changed.send(user_id=user.id)
+    assert template_registry.for_user(user.id).find('promo').content == 'Sale'
+
+
+def test_dashboard_is_served_from_cache_until_a_send(app, client, graph, template):
+    assert b'919000000001' not in client.get('/dashboard').data
+    hits = cache.stats.as_dict()['hits']
+    client.get('/dashboard')
+    assert cache.stats.as_dict()['hits'] == hits + 1
+
+    client.post('/send-messages', data={'template': 'hello', 'recipient': '919000000001'})
+    assert b'919000000001' in client.get('/dashboard').data
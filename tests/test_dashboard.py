@@ -0,0 +1,19 @@
+from app.cache import snapshot
+from app.models import MessageHistory
+
+
+def test_snapshot_uses_attribute_names(app, client, graph, template):
+    client.post('/send-messages', data={'template': 'hello', 'recipient': '+91 90000 00001'})
+    message = MessageHistory.query.one()
+    copy = snapshot(message)
+    assert copy.recipient == '919000000001'
+    assert copy.status == 'sent'
+    assert not hasattr(copy, 'recipient_number')
+
+
+def test_dashboard_renders_message_history(app, client, graph, template):
+    client.post('/send-messages', data={'template': 'hello', 'recipient': '919000000001'})
+    assert MessageHistory.query.count() == 1
+    response = client.get('/dashboard')
+    assert response.status_code == 200
+    assert b'919000000001' in response.data
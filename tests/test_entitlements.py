@@ -0,0 +1,57 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import event
+from werkzeug.security import generate_password_hash
+
+from app import db
+from app.models import SubscriptionPlan, User, UserSubscription
+
+
+@pytest.fixture
+def lapsed(user):
+    """The user's paid subscription ended yesterday, before the sweep capped message_limit"""
+    plan = SubscriptionPlan(name='Pro', price=999, message_limit=1000)
+    db.session.add(plan)
+    db.session.flush()
+    subscription = UserSubscription(user_id=user.id, plan_id=plan.id, status='active',
+                                    end_date=datetime.now() - timedelta(days=1))
+    db.session.add(subscription)
+    db.session.flush()
+    user.subscription_id = subscription.id
+    db.session.commit()
+    return user
+
+
+@pytest.mark.parametrize('page, limit', [
+    ('/bulk-messages', b'text-primary mb-0">100</h5>'),
+    ('/subscription', b'0 / 100</small>'),
+])
+def test_pages_show_the_entitled_limit(app, client, template, lapsed, page, limit):
+    response = client.get(page)
+    assert response.status_code == 200
+    assert limit in response.data
+    assert b'1000<' not in response.data
+
+
+def test_admin_users_loads_plans_with_the_page(app, lapsed):
+    plan = SubscriptionPlan.query.one()
+    for i in range(5):
+        other = User(email=f"user{i}@example.com", password=generate_password_hash('x'), message_limit=1000)
+        db.session.add(other)
+        db.session.flush()
+        subscription = UserSubscription(user_id=other.id, plan_id=plan.id, status='active',
+                                        end_date=datetime.now() + timedelta(days=10))
+        db.session.add(subscription)
+        db.session.flush()
+        other.subscription_id = subscription.id
+    db.session.commit()
+    db.session.remove()
+
+    statements = []
+    event.listen(db.engine, 'before_cursor_execute', lambda *args: statements.append(args[2]))
+    response = app.test_client().get('/admin/users')
+    assert response.status_code == 200
+    assert response.data.count(b'badge bg-primary">Pro<') == 5
+    assert not any(statement.lstrip().startswith('SELECT') and 'FROM user_subscription' in statement
+                   for statement in statements)
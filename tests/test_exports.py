@@ -0,0 +1,55 @@
+import csv
+import io
+import shutil
+
+from sqlalchemy import create_engine
+
+from app import db
+from app.exports import csv_chunks
+from app.models import MessageHistory, Template, TemplateVersion
+
+
+def add_message(user, template, recipient, name=None, params=None):
+    db.session.add(MessageHistory(user_id=user.id, recipient=recipient, recipient_name=name,
+                                  template_id=template.id, status='sent', params=params,
+                                  template_version_id=TemplateVersion.id_for(template.id, template.content)))
+    db.session.commit()
+
+
+def export(client):
+    response = client.get('/message-history/export?format=csv')
+    assert response.status_code == 200
+    return list(csv.DictReader(io.StringIO(response.get_data(as_text=True))))
+
+
+def test_csv_cells_that_would_run_as_formulas_are_quoted(app, client, user):
+    template = Template(user_id=user.id, name='offer', language='en_US', content='{{1}} off today', status='Approved')
+    db.session.add(template)
+    db.session.commit()
+    add_message(user, template, '919000000001', name='=HYPERLINK("http://evil.example","x")', params='["+50%"]')
+    add_message(user, template, '919000000002', name='@SUM(A1)', params='["-10%"]')
+    add_message(user, template, '919000000003', name='Asha', params='["Half"]')
+
+    rows = export(client)
+    assert [row['recipient_name'] for row in rows] == ["'=HYPERLINK(\"http://evil.example\",\"x\")", "'@SUM(A1)", 'Asha']
+    assert [row['message_content'] for row in rows] == ["'+50% off today", "'-10% off today", 'Half off today']
+    assert rows[0]['recipient'] == '919000000001'
+
+
+def test_csv_leaves_numbers_and_dates_alone():
+    rows = list(csv.reader(io.StringIO(b''.join(csv_chunks([(-1, None, 'plain', '\tpadded')])).decode())))
+    assert rows[1][:4] == ['-1', '', 'plain', "'\tpadded"]
+
+
+def test_export_reads_from_the_replica(app, client, user, template, tmp_path):
+    app.config['READ_YOUR_WRITES_SECONDS'] = 0
+    add_message(user, template, '919000000001', params='["Asha"]')
+    shutil.copy(tmp_path / 'test.db', tmp_path / 'replica.db')
+    replica = create_engine(f"sqlite:///{tmp_path / 'replica.db'}")
+    app.extensions['read_replicas'] = [replica]
+    add_message(user, template, '919000000002', params='["Ravi"]')  # not on the replica yet
+    try:
+        assert [row['recipient'] for row in export(client)] == ['919000000001']
+    finally:
+        app.extensions['read_replicas'] = []
+        replica.dispose()
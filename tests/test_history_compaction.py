@@ -0,0 +1,91 @@
+import pytest
+from sqlalchemy import inspect, text
+
+from app import db
+from app.history_compaction import (INVALID_RECIPIENT, add_compact_columns, backfill_compact_columns,
+                                    drop_legacy_columns)
+from app.message_columns import STATUS_CODES
+from app.models import MessageHistory, TemplateVersion
+
+LEGACY_TABLE = '''CREATE TABLE message_history (
+    id INTEGER NOT NULL PRIMARY KEY,
+    user_id INTEGER NOT NULL,
+    recipient VARCHAR(32) NOT NULL,
+    recipient_name VARCHAR(100),
+    template_id INTEGER NOT NULL,
+    message_content TEXT,
+    message_type VARCHAR(8),
+    meta_message_id VARCHAR(128),
+    status VARCHAR(32),
+    scheduled_message_id INTEGER,
+    created_at DATETIME,
+    delivered_at DATETIME,
+    read_at DATETIME
+)'''
+
+
+@pytest.fixture
+def legacy_rows(app, user, template):
+    """message_history in the pre-compaction layout, with rows the old code would have written"""
+    db.session.execute(text('DROP TABLE message_history'))
+    TemplateVersion.__table__.drop(db.engine)
+    db.session.execute(text(LEGACY_TABLE))
+    rows = [
+        (1, '+91 90000 00001', 'Hi Asha', 'read'),
+        (2, '919000000002', 'Hi Ravi', 'delivered'),
+        (3, '919000000003', 'Hello there, old text', None),
+        (4, 'not-a-number', 'Hi Meera', 'something_new'),
+    ]
+    db.session.execute(text(
+        "INSERT INTO message_history (id, user_id, recipient, template_id, message_content, status) "
+        "VALUES (:id, :user_id, :recipient, :template_id, :content, :status)"),
+        [{'id': row_id, 'user_id': user.id, 'recipient': recipient, 'template_id': template.id,
+          'content': content, 'status': status} for row_id, recipient, content, status in rows])
+    db.session.commit()
+    return rows
+
+
+def columns():
+    return {column['name'] for column in inspect(db.engine).get_columns('message_history')}
+
+
+def test_backfill_fills_the_compact_columns(app, user, template, legacy_rows):
+    assert add_compact_columns() == ['recipient_number', 'status_code', 'template_version_id', 'params']
+    assert add_compact_columns() == []
+
+    assert backfill_compact_columns(chunk_size=2, pause=0) == (4, 1)
+    rows = db.session.execute(text('SELECT id, recipient_number, status_code, template_version_id, params '
+                                   'FROM message_history ORDER BY id')).all()
+    shared = TemplateVersion.id_for(template.id, template.content)
+    edited = TemplateVersion.id_for(template.id, 'Hello there, old text')
+    assert rows == [
+        (1, 919000000001, STATUS_CODES['read'], shared, '["Asha"]'),
+        (2, 919000000002, STATUS_CODES['delivered'], shared, '["Ravi"]'),
+        (3, 919000000003, STATUS_CODES['sent'], edited, None),
+        (4, INVALID_RECIPIENT, STATUS_CODES['unknown'], shared, '["Meera"]'),
+    ]
+    assert TemplateVersion.query.count() == 2
+
+    # Re-running only picks up rows that are still missing the new columns
+    db.session.execute(text("INSERT INTO message_history (id, user_id, recipient, template_id, message_content, "
+                            "status) VALUES (5, :user_id, '919000000005', :template_id, 'Hi Arjun', 'sent')"),
+                       {'user_id': user.id, 'template_id': template.id})
+    db.session.commit()
+    assert backfill_compact_columns(pause=0) == (1, 0)
+
+
+def test_drop_waits_for_the_backfill_then_the_model_reads_the_rows(app, legacy_rows):
+    add_compact_columns()
+    with pytest.raises(RuntimeError):
+        drop_legacy_columns()
+    assert columns() >= {'recipient', 'status', 'message_content'}
+
+    backfill_compact_columns(pause=0)
+    assert drop_legacy_columns() == ['recipient', 'status', 'message_content']
+    assert not columns() & {'recipient', 'status', 'message_content'}
+    assert backfill_compact_columns(pause=0) == (0, 0)
+
+    messages = MessageHistory.query.order_by(MessageHistory.id).all()
+    assert [message.message_content for message in messages] == [content for _, _, content, _ in legacy_rows]
+    assert [message.status for message in messages] == ['read', 'delivered', 'sent', 'unknown']
+    assert messages[0].recipient == '919000000001'
@@ -0,0 +1,114 @@
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import event
+
+from app import db
+from app.latency import DELIVER, LATENCY_SHARDS, READ, latency_summary, record_transition
+from app.models import LatencySketch, MessageHistory, TemplateVersion
+from app.sketches import LatencyHistogram
+
+
+def make_message(user, template, wamid, sent_at):
+    message = MessageHistory(user_id=user.id, recipient='919000000001', template_id=template.id,
+                             template_version_id=TemplateVersion.id_for(template.id, template.content),
+                             meta_message_id=wamid, status='sent', created_at=sent_at)
+    db.session.add(message)
+    db.session.commit()
+    return message
+
+
+def db_now():
+    """Now on the test database's clock: SQLite's now() is UTC"""
+    return datetime.now(timezone.utc).replace(tzinfo=None, microsecond=0)
+
+
+def status_payload(phone_number_id, wamid, status, at):
+    """A status webhook for `at`, a time on the database clock"""
+    return {'entry': [{'changes': [{'value': {
+        'messaging_product': 'whatsapp',
+        'metadata': {'phone_number_id': phone_number_id},
+        'statuses': [{'id': wamid, 'status': status, 'timestamp': str(int(at.replace(tzinfo=timezone.utc).timestamp()))}],
+    }}]}]}
+
+
+def test_webhook_statuses_record_latency_by_payload_phone_number(app, user, template):
+    sent_at = db_now() - timedelta(minutes=5)
+    make_message(user, template, 'wamid.1', sent_at)
+    client = app.test_client()
+    statements = []
+    event.listen(db.engine, 'before_cursor_execute', lambda *args: statements.append(args[2]))
+    client.post('/webhook/meta', json=status_payload('555', 'wamid.1', 'delivered', sent_at + timedelta(seconds=4)))
+    client.post('/webhook/meta', json=status_payload('555', 'wamid.1', 'read', sent_at + timedelta(seconds=64)))
+
+    assert not any('FROM "user"' in statement for statement in statements)
+    rows = {row.metric: row for row in LatencySketch.query}
+    assert set(rows) == {DELIVER, READ}
+    assert {row.phone_number_id for row in rows.values()} == {'555'}
+    summary = latency_summary(user.id)
+    assert summary[DELIVER]['count'] == summary[READ]['count'] == 1
+    assert 3 < summary[DELIVER]['p50'] < 5
+    assert 55 < summary[READ]['p50'] < 65
+
+
+@pytest.fixture
+def web_timezone(monkeypatch):
+    """Run the web process in a different time zone from the database (SQLite's now() is UTC)"""
+    monkeypatch.setenv('TZ', 'Asia/Kolkata')
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+
+def test_latency_uses_the_database_clock(app, client, graph, template, web_timezone):
+    client.post('/send-messages', data={'template': 'hello', 'recipient': '919000000001'})
+    delivered = db_now() + timedelta(seconds=4)
+    app.test_client().post('/webhook/meta', json=status_payload('555', 'wamid.1', 'delivered', delivered))
+    message = MessageHistory.query.one()
+    assert abs((message.delivered_at - message.created_at).total_seconds() - 4) < 2
+    assert 2 < latency_summary(message.user_id)[DELIVER]['p50'] < 6
+
+
+def test_samples_without_payload_phone_number_use_the_senders(app, user, template):
+    message = make_message(user, template, 'wamid.2', db_now() - timedelta(seconds=30))
+    record_transition(message, 'delivered', int(time.time()))
+    db.session.commit()
+    assert LatencySketch.query.one().phone_number_id == user.phone_number_id
+
+
+def test_first_sample_merges_into_a_row_added_concurrently(app, user, template):
+    """Another request creates the sketch row between our lookup and our INSERT"""
+    message = make_message(user, template, 'wamid.3', db_now() - timedelta(seconds=30))
+    other = LatencyHistogram()
+    other.add(10.0)
+    added = []
+
+    def add_first(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith('INSERT INTO latency_sketches') and not added:
+            cursor.execute('INSERT INTO latency_sketches (user_id, day, template_id, phone_number_id, metric, '
+                           'shard, count, sketch) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                           (user.id, message.created_at.date().isoformat(), template.id, '555', DELIVER,
+                            message.id % LATENCY_SHARDS, 1, other.to_bytes()))
+            added.append(True)
+
+    event.listen(db.engine, 'before_cursor_execute', add_first)
+    try:
+        record_transition(message, 'delivered', int(time.time()), '555')
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', add_first)
+    db.session.commit()
+    assert LatencySketch.query.one().count == 2
+
+
+def test_a_delivery_burst_spreads_over_shards_and_reads_back_merged(app, user, template):
+    sent_at = db_now() - timedelta(seconds=30)
+    messages = [make_message(user, template, f"wamid.burst{i}", sent_at) for i in range(LATENCY_SHARDS * 2)]
+    for message in messages:
+        record_transition(message, 'delivered', int(time.time()), '555')
+    db.session.commit()
+
+    assert LatencySketch.query.count() == LATENCY_SHARDS
+    assert sum(row.count for row in LatencySketch.query) == len(messages)
+    assert latency_summary(user.id)[DELIVER]['count'] == len(messages)
@@ -0,0 +1,64 @@
+from sqlalchemy import text
+
+from app import db
+from app.message_columns import STATUS_CODES, encode_params, normalize_e164, render_content
+from app.models import MessageHistory, TemplateVersion
+from app.template_params import match_body
+
+
+def test_normalize_e164():
+    assert normalize_e164('+91 90000-00001') == '919000000001'
+    assert normalize_e164('(1) 415.555.0100') == '14155550100'
+    assert normalize_e164('0919000000001') is None
+    assert normalize_e164('12345') is None
+    assert normalize_e164('phone') is None
+    assert normalize_e164(None) is None
+
+
+def test_recipient_and_status_round_trip_as_integers(app, user, template):
+    version_id = TemplateVersion.id_for(template.id, template.content)
+    db.session.add(MessageHistory(user_id=user.id, template_id=template.id, template_version_id=version_id,
+                                  recipient='+91 90000 00001', status='delivered', params=encode_params(['Asha'])))
+    db.session.commit()
+    db.session.expunge_all()
+
+    message = MessageHistory.query.one()
+    assert message.recipient == '919000000001'
+    assert message.status == 'delivered'
+    assert message.message_content == 'Hi Asha'
+    assert MessageHistory.query.filter_by(recipient='+919000000001').count() == 1
+    assert MessageHistory.query.filter_by(recipient='not a number').count() == 0
+
+    raw = db.session.execute(text('SELECT recipient_number, typeof(recipient_number), status_code '
+                                  'FROM message_history')).one()
+    assert raw == (919000000001, 'integer', STATUS_CODES['delivered'])
+
+
+def test_unlisted_statuses_read_back_as_unknown(app, user, template):
+    db.session.add(MessageHistory(user_id=user.id, template_id=template.id, recipient='919000000001',
+                                  status='something_new'))
+    db.session.commit()
+    db.session.execute(text('UPDATE message_history SET status_code = 99'))
+    db.session.commit()
+    db.session.expunge_all()
+    assert MessageHistory.query.one().status == 'unknown'
+
+
+def test_match_body_recovers_values():
+    body = 'Hi {{1}}, order {{2}} ships to {{1}}'
+    assert match_body(body, 'Hi Asha, order #42 ships to Asha') == ['Asha', '#42']
+    assert match_body(body, 'Hi Asha, order #42 ships to Ravi') is None
+    assert match_body('Plain text', 'Plain text') == []
+    assert match_body('Plain text', 'Other text') is None
+    assert match_body(None, 'Plain text') is None
+    assert match_body('Hi {{2}}', 'Hi Asha') == ['', 'Asha']
+
+
+def test_render_content_inverts_match_body():
+    body = 'Hi {{1}}, your code is {{2}}. {literal} braces stay'
+    rendered = 'Hi Meera, your code is 1234. {literal} braces stay'
+    values = match_body(body, rendered)
+    assert render_content(body, encode_params(values)) == rendered
+    assert render_content(body, None) == body
+    assert render_content('Hi {{1}}', encode_params(['अनु'])) == 'Hi अनु'
+    assert render_content(None, encode_params(['Asha'])) is None
@@ -0,0 +1,31 @@
+from datetime import datetime
+
+from werkzeug.security import generate_password_hash
+
+from app import db
+from app.models import Payment, SubscriptionPlan, User
+from app.platform_metrics import dashboard_metrics, refresh
+
+
+def test_incremental_refresh_recounts_totals_from_source(app, user):
+    long_ago = datetime(2020, 1, 15)
+    plan = SubscriptionPlan(name='Pro', price=999, message_limit=1000)
+    old_user = User(email='old@example.com', password=generate_password_hash('secret'), created_at=long_ago)
+    db.session.add_all([plan, old_user])
+    db.session.flush()
+    payment = Payment(user_id=user.id, plan_id=plan.id, amount=999, status='completed', created_at=long_ago)
+    db.session.add(payment)
+    db.session.commit()
+
+    refresh(full=True)
+    assert dashboard_metrics()['total_users'] == 2
+    assert dashboard_metrics()['total_revenue'] == 999
+
+    # A refund and a deletion in a month the incremental run no longer recomputes
+    payment.status = 'refunded'
+    db.session.delete(old_user)
+    db.session.commit()
+    refresh()
+    metrics = dashboard_metrics()
+    assert metrics['total_users'] == 1
+    assert metrics['total_revenue'] == 0
@@ -0,0 +1,74 @@
+from unittest import mock
+
+from flask import g
+from sqlalchemy import text
+
+from app import db
+from app.models import MessageHistory, Template
+from tests.conftest import GraphResponse
+
+
+def sent_this_month(user_id):
+    return db.session.execute(text('SELECT messages_sent_this_month FROM user WHERE id = :id'),
+                              {'id': user_id}).scalar()
+
+
+def as_another_request():
+    """The test shares its app context with the requests it makes; drop that context's session and
+    Flask-Login user so the next request loads its user through the user cache, as a new one would"""
+    db.session.remove()
+    g.pop('_login_user', None)
+
+
+def cache_user(client):
+    as_another_request()
+    client.get('/dashboard')
+
+
+def set_sent(user_id, count):
+    """What another worker's sends do to the row, behind this process's user cache"""
+    db.session.execute(text('UPDATE user SET messages_sent_this_month = :count WHERE id = :id'),
+                       {'count': count, 'id': user_id})
+    db.session.commit()
+    as_another_request()
+
+
+def quick_send(client, template_id, number='919000000001'):
+    return client.post('/inbox/send-quick-message', json={'phone_number': number, 'template_id': template_id})
+
+
+def test_quick_send_checks_the_row_not_the_cached_counter(app, client, graph, user, template):
+    user_id, template_id = user.id, template.id
+    cache_user(client)
+    set_sent(user_id, 1000)
+    response = quick_send(client, template_id)
+    assert response.status_code == 400
+    assert graph == []
+    assert sent_this_month(user_id) == 1000
+
+
+def test_failed_quick_send_gives_the_message_back(app, client, user, template):
+    with mock.patch('requests.Session.request', lambda *args, **kwargs: GraphResponse(400, {'error': 'bad'})):
+        assert quick_send(client, template.id).status_code == 400
+    assert sent_this_month(user.id) == 0
+
+
+def test_bulk_reserves_the_batch_and_returns_failures(app, client, user):
+    user_id = user.id
+    db.session.add(Template(user_id=user_id, name='plain', language='en_US', content='Plain', status='Approved'))
+    db.session.commit()
+    cache_user(client)
+    set_sent(user_id, 996)
+    response = client.post('/bulk-messages', data={'template': 'plain', 'recipients_text': '\n'.join(
+        f"91900000000{i}" for i in range(5))})
+    assert response.status_code == 302
+    assert MessageHistory.query.count() == 0
+    assert sent_this_month(user_id) == 996
+
+    responses = iter([GraphResponse(200, {'messages': [{'id': 'wamid.1'}]}), GraphResponse(500, {}),
+                      GraphResponse(200, {'messages': [{'id': 'wamid.3'}]})])
+    with mock.patch('requests.Session.request', lambda *args, **kwargs: next(responses)):
+        client.post('/bulk-messages', data={'template': 'plain', 'recipients_text': '\n'.join(
+            f"91900000000{i}" for i in range(3))})
+    assert MessageHistory.query.filter_by(status='sent').count() == 2
+    assert sent_this_month(user_id) == 998
@@ -0,0 +1,66 @@
+from datetime import date
+
+from sqlalchemy import event
+
+from app import db
+from app.models import PlatformRecipientSketch, RecipientSketch, Template
+from app.platform_metrics import dashboard_metrics, refresh
+from app.reach import platform_unique_recipients, record_recipients, unique_recipients
+from app.sketches import HyperLogLog
+
+
+def send(client, template, recipients):
+    return client.post('/bulk-messages', data={'template': template, 'recipients_text': '\n'.join(recipients)})
+
+
+def test_sends_update_user_and_platform_sketches(app, client, graph, user):
+    for name in ('first', 'second'):
+        db.session.add(Template(user_id=user.id, name=name, language='en_US', content='Plain', status='Approved'))
+    db.session.commit()
+    send(client, 'first', ['919000000001', '919000000002'])
+    send(client, 'second', ['919000000002', '919000000003'])
+
+    assert RecipientSketch.query.count() == 2
+    assert PlatformRecipientSketch.query.count() == 1
+    assert unique_recipients(user.id, start=date.today()) == 3
+    assert platform_unique_recipients(date.today()) == 3
+
+
+def test_first_send_merges_into_a_sketch_added_concurrently(app, user, template):
+    other = HyperLogLog()
+    other.add('919000000009')
+    added = []
+
+    def add_first(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith('INSERT INTO recipient_sketches') and not added:
+            cursor.execute('INSERT INTO recipient_sketches (user_id, day, template_id, sketch) VALUES (?, ?, ?, ?)',
+                           (user.id, date.today().isoformat(), template.id, other.to_bytes()))
+            added.append(True)
+
+    message = type('Message', (), {'user_id': user.id, 'template_id': template.id, 'status': 'sent',
+                                   'created_at': None, 'recipient': '919000000001'})()
+    event.listen(db.engine, 'before_cursor_execute', add_first)
+    try:
+        record_recipients([message])
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', add_first)
+    db.session.commit()
+    assert unique_recipients(user.id) == 2
+
+
+def test_refresh_reads_platform_sketches_and_full_rebuilds_them(app, client, graph, user, template):
+    db.session.add(Template(user_id=user.id, name='plain', language='en_US', content='Plain', status='Approved'))
+    db.session.commit()
+    send(client, 'plain', ['919000000001', '919000000002'])
+
+    statements = []
+    event.listen(db.engine, 'before_cursor_execute', lambda *args: statements.append(args[2]))
+    refresh()
+    assert not any('FROM recipient_sketches' in statement for statement in statements)
+    assert dashboard_metrics()['unique_recipients_30d'] == 2
+
+    PlatformRecipientSketch.query.delete()
+    db.session.commit()
+    refresh(full=True)
+    assert PlatformRecipientSketch.query.count() == 1
+    assert dashboard_metrics()['unique_recipients_30d'] == 2
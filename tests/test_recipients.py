@@ -0,0 +1,80 @@
+import io
+
+import pytest
+
+from app import db
+from app.message_columns import normalize_e164
+from app.models import MessageHistory, Template, User
+
+
+@pytest.fixture
+def plain_template(user):
+    template = Template(user_id=user.id, name='plain', language='en_US', content='Plain text', status='Approved')
+    db.session.add(template)
+    db.session.commit()
+    return template
+
+
+@pytest.mark.parametrize('value, digits', [
+    ('919876543210', '919876543210'),
+    ('+91 98765-43210', '919876543210'),
+    ('(1) 415.555.0100', '14155550100'),
+    ('0919876543210', None),
+    ('9198765432101234', None),
+    ('abc', None),
+    (None, None),
+])
+def test_normalize_e164(value, digits):
+    assert normalize_e164(value) == digits
+
+
+def test_bulk_skips_invalid_numbers_before_sending(client, graph, plain_template, user):
+    response = client.post('/bulk-messages', data={
+        'template': 'plain',
+        'recipients_text': '919000000001\n0919000000002\n9190000000031234\n+91 90000 00004\n',
+    })
+    assert response.status_code == 302
+    assert len(graph) == 2
+    assert sorted(m.recipient for m in MessageHistory.query) == ['919000000001', '919000000004']
+    assert db.session.get(User, user.id).messages_sent_this_month == 2
+
+
+def test_bulk_csv_skips_invalid_numbers(client, graph, template):
+    csv = b'phone,name\n919000000001,Asha\n0919000000002,Ravi\n919000000003,Meera\n'
+    response = client.post('/bulk-messages', data={
+        'template': 'hello', 'recipients_text': 'csv', 'csv_file': (io.BytesIO(csv), 'recipients.csv'),
+    }, content_type='multipart/form-data')
+    assert response.status_code == 302
+    assert len(graph) == 2
+    assert [m.message_content for m in MessageHistory.query.order_by(MessageHistory.id)] == ['Hi Asha', 'Hi Meera']
+
+
+def test_quick_send_rejects_invalid_number(client, graph, template):
+    response = client.post('/inbox/send-quick-message', json={'phone_number': '0919000000001',
+                                                               'template_id': template.id})
+    assert response.status_code == 400
+    assert graph == []
+    assert MessageHistory.query.count() == 0
+
+
+def test_quick_send_stores_normalized_number(client, graph, template):
+    response = client.post('/inbox/send-quick-message', json={'phone_number': '+91 90000 00001',
+                                                               'template_id': template.id})
+    assert response.status_code == 200
+    assert graph[0][2]['json']['to'] == '919000000001'
+    assert MessageHistory.query.one().recipient == '919000000001'
+
+
+def test_send_form_rejects_invalid_number(client, graph, template):
+    response = client.post('/send-messages', data={'template': 'hello', 'recipient': '+1 2345 6789 0123 4567'})
+    assert response.status_code == 200
+    assert b'country code' in response.data
+    assert graph == []
+
+
+@pytest.mark.api_routes
+def test_api_send_rejects_invalid_number(client, graph, template):
+    response = client.post('/api/send-message', json={'template_id': template.id, 'recipient': '0919000000001'})
+    assert response.status_code == 400
+    assert graph == []
+    assert MessageHistory.query.count() == 0
@@ -0,0 +1,67 @@
+from datetime import date, datetime, timedelta
+
+import pytest
+from sqlalchemy import func
+
+from app import db
+from app.archive import archive_old_messages
+from app.models import DailyMessageStat, MessageHistory
+from app.rollups import backfill
+
+
+def add_messages(user, template, *ages_in_days):
+    now = datetime.now().replace(microsecond=0)
+    db.session.add_all([MessageHistory(user_id=user.id, recipient=f"9190000000{i:02d}", template_id=template.id,
+                                       status='sent', created_at=now - timedelta(days=age))
+                        for i, age in enumerate(ages_in_days)])
+    db.session.commit()
+
+
+def rollup_total(since=None):
+    query = db.session.query(func.sum(DailyMessageStat.count))
+    if since:
+        query = query.filter(DailyMessageStat.day >= since)
+    return query.scalar() or 0
+
+
+def test_backfill_keeps_rollup_days_whose_rows_are_archived(app, user, template):
+    add_messages(user, template, 400, 380, 200, 3, 1)
+    backfill()
+    assert rollup_total() == 5
+
+    assert archive_old_messages(older_than_days=100)[1] == 3
+    assert MessageHistory.query.count() == 2
+    assert backfill() == 2
+    assert rollup_total() == 5
+
+    # A rebuild asked to start before the archive cutoff still leaves the archived days alone
+    backfill(user_id=user.id, since=date.today() - timedelta(days=500))
+    assert rollup_total() == 5
+    assert rollup_total(since=date.today() - timedelta(days=5)) == 2
+
+
+def test_backfill_leaves_a_user_with_no_hot_rows_alone(app, user, template):
+    add_messages(user, template, 400, 380)
+    backfill()
+    archive_old_messages(older_than_days=100)
+    assert backfill(user_id=user.id) == 0
+    assert rollup_total() == 2
+
+
+def rollup_buckets():
+    return {row.status: row.count for row in DailyMessageStat.query if row.count}
+
+
+@pytest.mark.parametrize('path', ['/webhook/meta', '/api/webhook/meta'])
+@pytest.mark.api_routes
+def test_webhook_statuses_land_in_the_buckets_a_backfill_rebuilds(app, client, graph, template, path):
+    client.post('/send-messages', data={'template': 'hello', 'recipient': '919000000001'})
+    statuses = [{'id': 'wamid.1', 'status': status} for status in ('accepted', 'pending', 'delivered')]
+    app.test_client().post(path, json={'entry': [{'changes': [{'value': {'statuses': statuses[:2]}}]}]})
+    assert MessageHistory.query.one().status == 'unknown'
+    assert rollup_buckets() == {'unknown': 1}
+
+    app.test_client().post(path, json={'entry': [{'changes': [{'value': {'statuses': statuses[2:]}}]}]})
+    assert rollup_buckets() == {'delivered': 1}
+    backfill()
+    assert rollup_buckets() == {'delivered': 1}
@@ -0,0 +1,28 @@
+from datetime import date
+
+from sqlalchemy import or_, text
+
+from app import db
+from app.models import User
+from app.subscription_sweeper import reset_monthly_counters
+
+
+def test_reset_runs_once_per_month(app, user):
+    user.messages_sent_this_month = 40
+    user.quota_period = date(2026, 9, 1)
+    db.session.commit()
+
+    assert reset_monthly_counters(today=date(2026, 10, 5), pause=0) == 1
+    assert reset_monthly_counters(today=date(2026, 10, 20), pause=0) == 0
+    db.session.expire_all()
+    assert db.session.get(User, user.id).messages_sent_this_month == 0
+    assert db.session.get(User, user.id).quota_period == date(2026, 10, 1)
+
+
+def test_pending_reset_probe_uses_the_quota_period_index(app, user):
+    probe = db.session.query(User.id).filter(
+        or_(User.quota_period.is_(None), User.quota_period < date(2026, 10, 1))).limit(1)
+    sql = str(probe.statement.compile(db.engine, compile_kwargs={'literal_binds': True}))
+    plan = ' '.join(row[3] for row in db.session.execute(text(f"EXPLAIN QUERY PLAN {sql}")))
+    assert 'ix_user_quota_period' in plan
+    assert 'SCAN user' not in plan
@@ -0,0 +1,88 @@
+import csv
+import io
+import json
+
+import pytest
+
+from app import db
+from app.models import Template
+from app.template_params import CompiledTemplate, MissingParameters, bind_columns, render_body, row_values
+
+
+def test_compiled_template_renders_header_then_body_values():
+    renderer = CompiledTemplate('Hi {{1}}, order {{2}} ships {today}', header_text='Order {{1}}')
+    assert renderer.param_count == 3
+    components, content = renderer.render(['#42', 'Asha', '#42'])
+    assert components == [
+        {'type': 'header', 'parameters': [{'type': 'text', 'text': '#42'}]},
+        {'type': 'body', 'parameters': [{'type': 'text', 'text': 'Asha'}, {'type': 'text', 'text': '#42'}]},
+    ]
+    assert content == 'Hi Asha, order #42 ships {today}'
+    assert renderer.body_values(['#42', 'Asha', '#42', 'extra']) == ['Asha', '#42']
+    with pytest.raises(MissingParameters):
+        renderer.render(['#42', 'Asha'])
+
+
+def test_compiled_template_without_placeholders():
+    assert CompiledTemplate('Plain {text}').render() == (None, 'Plain {text}')
+    assert render_body('Hi {{1}}', []) == 'Hi {{1}}'
+
+
+@pytest.mark.parametrize('header, expected', [
+    (None, [1, 2]),  # positional
+    (['phone', 'name', 'order'], [1, 2]),  # header without placeholder names
+    (['phone', '{{2}}', '{{1}}'], [2, 1]),  # fully named
+    (['phone', '2', ' {{ 1 }} '], [2, 1]),
+    (['phone', '{{2}}', 'name'], [2, 1]),  # {{1}} takes the column the header doesn't name
+    (['phone', 'name', '{{1}}'], [2, 1]),
+    (['phone', '{{2}}', '{{2}}', 'x'], [3, 1]),  # a repeated name keeps its first column
+])
+def test_bind_columns(header, expected):
+    assert bind_columns(header, 2) == expected
+
+
+def test_row_values():
+    assert row_values(['919000000001', ' Asha ', '#42'], [2, 1]) == ['#42', 'Asha']
+    with pytest.raises(MissingParameters):
+        row_values(['919000000001', 'Asha', ' '], [1, 2])
+    with pytest.raises(MissingParameters):
+        row_values(['919000000001'], [1])
+
+
+def send_csv(client, rows):
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    return client.post('/bulk-messages', content_type='multipart/form-data', data={
+        'template': 'order', 'recipients_text': 'csv',
+        'csv_file': (io.BytesIO(buffer.getvalue().encode()), 'recipients.csv'),
+    })
+
+
+def sent_values(graph):
+    return [[p['text'] for p in kwargs['json']['template']['components'][0]['parameters']]
+            for _, _, kwargs in graph]
+
+
+@pytest.fixture
+def order_template(user):
+    db.session.add(Template(user_id=user.id, name='order', language='en_US',
+                            content='Hi {{1}}, order {{2}} shipped', status='Approved'))
+    db.session.commit()
+
+
+@pytest.mark.parametrize('rows', [
+    [['919000000001', 'Asha', '#1'], ['919000000002', 'Ravi', '#2']],
+    [['phone', 'name', 'order'], ['919000000001', 'Asha', '#1'], ['919000000002', 'Ravi', '#2']],
+    [['phone', '{{2}}', '{{1}}'], ['919000000001', '#1', 'Asha'], ['919000000002', '#2', 'Ravi']],
+    [['phone', '{{2}}', 'name'], ['919000000001', '#1', 'Asha'], ['919000000002', '#2', 'Ravi']],
+])
+def test_bulk_csv_binds_named_and_positional_columns(app, client, graph, order_template, rows):
+    send_csv(client, rows)
+    assert sent_values(graph) == [['Asha', '#1'], ['Ravi', '#2']]
+
+
+def test_bulk_csv_skips_rows_missing_values_and_non_numbers(app, client, graph, order_template):
+    response = send_csv(client, [['phone', 'name', 'order'], ['919000000001', 'Asha', '#1'],
+                                 ['919000000002', 'Ravi'], ['12abc', 'X', 'Y']])
+    assert sent_values(graph) == [['Asha', '#1']]
+    assert response.status_code == 302
@@ -0,0 +1,34 @@
+from sqlalchemy import event
+
+from app import db
+from app.models import TemplateVersion
+
+
+def test_id_for_reuses_the_version_for_the_same_body(app, template):
+    first = TemplateVersion.id_for(template.id, 'Hi {{1}}')
+    db.session.commit()
+    assert TemplateVersion.id_for(template.id, 'Hi {{1}}') == first
+    assert TemplateVersion.id_for(template.id, 'Hello {{1}}') != first
+    assert TemplateVersion.query.count() == 2
+
+
+def test_id_for_returns_a_version_inserted_concurrently(app, template, monkeypatch):
+    """Another request inserts the same body between our lookup and our INSERT"""
+    content = 'Hi {{1}}'
+    content_hash = TemplateVersion.hash_content(content)
+    concurrent = []
+
+    def insert_first(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith('INSERT INTO template_version') and not concurrent:
+            cursor.execute('INSERT INTO template_version (template_id, content_hash, content) VALUES (?, ?, ?)',
+                           (template.id, content_hash, content))
+            concurrent.append(cursor.lastrowid)
+
+    event.listen(db.engine, 'before_cursor_execute', insert_first)
+    try:
+        version_id = TemplateVersion.id_for(template.id, content)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', insert_first)
+    db.session.commit()
+    assert version_id == concurrent[0]
+    assert TemplateVersion.query.count() == 1